@@ -0,0 +1,315 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from src.telemetry import OUTBOUND_ERRORS, OUTBOUND_SECONDS, get_logger
+
+logger = get_logger(__name__)
+
+OUTBOX_PATH = "data/alerts/outbox.db"
+ALERT_WORKERS = 2
+MAX_ATTEMPTS = 5
+BASE_RETRY_DELAY = 2  # Seconds before the first retry; doubles on each attempt
+MAX_RETRY_DELAY = 300
+RATE_LIMIT = 3  # Messages per recipient per RATE_WINDOW
+RATE_WINDOW = 600  # Seconds
+DEDUPE_WINDOW = 900  # Seconds an identical alert to the same recipient is suppressed
+SEND_TIMEOUT = 300  # Seconds after which an alert still being sent is presumed abandoned
+OUTBOX_ERROR_DELAY = 5  # Seconds a worker backs off after an outbox error
+
+
+class SMSProvider:
+    """Interface for outbound SMS. send() returns a provider message id or raises."""
+
+    @property
+    def configured(self):
+        """Whether the provider has what it needs to send."""
+        return True
+
+    def send(self, to, body):
+        raise NotImplementedError
+
+
+class TwilioProvider(SMSProvider):
+    """
+    Sends through Twilio. The SDK is imported and the client built on the
+    first send, so processes that never alert never load it.
+    """
+
+    def __init__(self, account_sid, auth_token, from_number):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def configured(self):
+        return bool(self.account_sid and self.auth_token and self.from_number)
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from twilio.rest import Client
+                self._client = Client(self.account_sid, self.auth_token)
+            return self._client
+
+    def send(self, to, body):
+        msg = self.client.messages.create(body=body, from_=self.from_number, to=to)
+        return msg.sid
+
+
+class FakeProvider(SMSProvider):
+    """
+    In-memory stand-in for tests and local runs. Fails the first `fail_times`
+    sends to exercise the retry path.
+    """
+
+    def __init__(self, fail_times=0, delay=0):
+        self.sent = []
+        self.fail_times = fail_times
+        self.delay = delay
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        time.sleep(self.delay)
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError("Simulated provider failure")
+            self.sent.append((to, body))
+            return f"FAKE{len(self.sent):06d}"
+
+
+def provider_from_env():
+    """
+    Build the SMS provider selected by ALERT_PROVIDER ("twilio" or "fake").
+
+    Returns:
+        SMSProvider: The configured provider.
+    """
+    if os.getenv("ALERT_PROVIDER", "twilio").lower() == "fake":
+        return FakeProvider()
+    return TwilioProvider(
+        os.getenv("TWILIO_ACCOUNT_SID"),
+        os.getenv("TWILIO_AUTH_TOKEN"),
+        os.getenv("TWILIO_PHONE_NUMBER")
+    )
+
+
+class AlertDispatcher:
+    """
+    Persistent outbox for SMS alerts.
+
+    enqueue() only records the alert in a SQLite outbox and wakes the worker
+    pool, so the ingest loop never waits on the provider. Workers send due
+    alerts, retry failures with exponential backoff, and hold back alerts
+    that would exceed a recipient's rate limit. An identical alert to the same
+    recipient within the dedupe window is recorded as suppressed.
+    """
+
+    def __init__(self, provider, path=OUTBOX_PATH, workers=ALERT_WORKERS,
+                 max_attempts=MAX_ATTEMPTS, base_delay=BASE_RETRY_DELAY,
+                 rate_limit=RATE_LIMIT, rate_window=RATE_WINDOW, dedupe_window=DEDUPE_WINDOW):
+        self.provider = provider
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.dedupe_window = dedupe_window
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._threads = []
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recipient TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    dedupe_key TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    sent_at REAL,
+                    sid TEXT,
+                    last_error TEXT,
+                    claimed_at REAL
+                )
+            """)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(outbox)")]
+            if "claimed_at" not in columns:  # Outboxes created before sends in flight were rate limited
+                self._db.execute("ALTER TABLE outbox ADD COLUMN claimed_at REAL")
+            self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS outbox_recipient ON outbox (recipient, created_at)")
+        return self._db
+
+    def start(self):
+        """Start the worker pool (idempotent)."""
+        with self._lock:
+            self._connect()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, recipient, body, dedupe_key=None):
+        """
+        Record an alert for delivery without waiting on the provider.
+
+        Args:
+            recipient (str): Destination phone number.
+            body (str): Message text.
+            dedupe_key (str | None): Alerts with the same key and recipient inside
+                the dedupe window are suppressed. Defaults to the body.
+
+        Returns:
+            dict: {"id": outbox id, "status": "pending" or "suppressed"}.
+        """
+        now = time.time()
+        dedupe_key = dedupe_key or body
+        with self._lock:
+            db = self._connect()
+            duplicate = db.execute(
+                "SELECT 1 FROM outbox WHERE recipient = ? AND dedupe_key = ? AND created_at >= ? "
+                "AND status IN ('pending', 'sending', 'sent') LIMIT 1",
+                (recipient, dedupe_key, now - self.dedupe_window)
+            ).fetchone()
+            status = "suppressed" if duplicate else "pending"
+            cursor = db.execute(
+                "INSERT INTO outbox (recipient, body, dedupe_key, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (recipient, body, dedupe_key, status, now, now)
+            )
+            self._wake.notify()
+        if status == "pending" and not any(t.is_alive() for t in self._threads):
+            self.start()
+        return {"id": cursor.lastrowid, "status": status}
+
+    def status(self, alert_id):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT status, attempts, sid, last_error FROM outbox WHERE id = ?", (alert_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("status", "attempts", "sid", "last_error"), row))
+
+    def _claim(self):
+        """
+        Atomically claim the next due alert, deferring it if its recipient is
+        rate limited. The rate check and the claim share one write
+        transaction, so workers (in this or another process) cannot both
+        pass the check for the last free slot.
+        """
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            result = self._claim_next(db, time.time())
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return result
+
+    def _claim_next(self, db, now):
+        # Alerts claimed by a worker that died mid-send go back in the queue. Only
+        # stale claims: another worker or process may still be sending the rest.
+        db.execute(
+            "UPDATE outbox SET status = 'pending' WHERE status = 'sending' "
+            "AND (claimed_at IS NULL OR claimed_at < ?)",
+            (now - SEND_TIMEOUT,)
+        )
+        row = db.execute(
+            "SELECT id, recipient, body, attempts FROM outbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at, id LIMIT 1",
+            (now,)
+        ).fetchone()
+        if row is None:
+            upcoming = db.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'"
+            ).fetchone()[0]
+            return None, upcoming
+
+        alert_id, recipient, body, attempts = row
+        # Alerts being sent count against the limit as well as delivered ones
+        recent = db.execute(
+            "SELECT COUNT(*), MIN(COALESCE(sent_at, claimed_at)) FROM outbox "
+            "WHERE recipient = ? AND status IN ('sending', 'sent') AND COALESCE(sent_at, claimed_at) >= ?",
+            (recipient, now - self.rate_window)
+        ).fetchone()
+        if recent[0] >= self.rate_limit:
+            db.execute(
+                "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                (recent[1] + self.rate_window, alert_id)
+            )
+            return None, now
+
+        db.execute("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?", (now, alert_id))
+        return (alert_id, recipient, body, attempts), None
+
+    def _run(self):
+        while True:
+            try:
+                with self._lock:
+                    job, upcoming = self._claim()
+                    if job is None:
+                        timeout = None if upcoming is None else max(upcoming - time.time(), 0)
+                        if timeout != 0:
+                            self._wake.wait(timeout if timeout is not None else 60)
+                        continue
+            except Exception as e:
+                # e.g. "database is locked" by another process; the worker must survive it
+                logger.error("❌ Outbox claim error: %s", e)
+                time.sleep(OUTBOX_ERROR_DELAY)
+                continue
+
+            alert_id, recipient, body, attempts = job
+            try:
+                with OUTBOUND_SECONDS.time(target="sms"):
+                    sid = self.provider.send(recipient, body)
+                logger.info("✅ Alert %s sent. SID: %s", alert_id, sid)
+                update = ("UPDATE outbox SET status = 'sent', sid = ?, sent_at = ?, attempts = ? WHERE id = ?",
+                          (sid, time.time(), attempts + 1, alert_id))
+            except Exception as e:
+                attempts += 1
+                OUTBOUND_ERRORS.inc(target="sms")
+                if attempts >= self.max_attempts:
+                    logger.error("❌ Alert %s failed after %s attempts: %s", alert_id, attempts, e)
+                    update = ("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                              (attempts, str(e), alert_id))
+                else:
+                    delay = min(self.base_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+                    delay *= random.uniform(0.8, 1.2)
+                    logger.warning("⚠️ Alert %s send failed (%s); retrying in %.1fs", alert_id, e, delay)
+                    update = ("UPDATE outbox SET status = 'pending', attempts = ?, last_error = ?, "
+                              "next_attempt_at = ? WHERE id = ?",
+                              (attempts, str(e), time.time() + delay, alert_id))
+
+            self._finish(alert_id, update)
+
+    def _finish(self, alert_id, update):
+        # Retries until the outcome is recorded, so a sent alert is not left
+        # 'sending' and sent again once its claim goes stale
+        while True:
+            try:
+                with self._lock:
+                    self._connect().execute(*update)
+                    self._wake.notify()
+                return
+            except Exception as e:
+                logger.error("❌ Could not record outcome of alert %s: %s", alert_id, e)
+                time.sleep(OUTBOX_ERROR_DELAY)
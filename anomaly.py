@@ -0,0 +1,354 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.rules import DEFAULT_STATION
+from src.sensor_buffer import SENSOR_FEATURES, BUFFER_CAPACITY, format_timestamp
+from src.telemetry import SENSOR_ANOMALIES
+
+EWMA_ALPHA = 0.02  # Weight of the newest reading; about 4 minutes of memory at one reading every 5s
+WARMUP_READINGS = 50  # Readings before a feature's baseline is trusted
+SPIKE_Z = 5.0  # |z| of a single reading against the EWMA baseline
+CUSUM_K = 0.5  # Slack in standard deviations before a shift accumulates
+CUSUM_H = 10.0  # Accumulated shift that flags drift
+FLATLINE_READINGS = 24  # Identical readings in a row (2 minutes) that flag a stuck sensor
+FLATLINE_TOLERANCE = 1e-9
+SIGMA_FLOOR = 1e-6  # Smallest standard deviation, relative to the baseline, used for z-scores
+BLOCK_ROWS = 256  # Rows per vectorized block; keeps the EWMA weights well inside float64
+
+ANOMALY_KINDS = ("spike", "drift", "flat")
+
+
+class AnomalyDetector:
+    """
+    Streaming per-feature anomaly and drift detector, with state per station.
+
+    For every feature it keeps an EWMA mean and variance, a two-sided CUSUM
+    of the z-scores against that baseline, and the length of the current run
+    of identical readings:
+
+    - spike: one reading more than SPIKE_Z standard deviations off the baseline
+    - drift: the CUSUM passed CUSUM_H (a sustained shift the EWMA lags behind)
+    - flat: FLATLINE_READINGS identical readings in a row (a stuck sensor)
+
+    State is a handful of arrays of length `features`, so memory and the cost
+    of a reading are constant. Batches are processed with closed-form NumPy
+    recurrences over the time axis, so replaying history in large batches
+    gives the same flags as feeding the readings one at a time.
+    """
+
+    def __init__(self, features=SENSOR_FEATURES, alpha=EWMA_ALPHA, warmup=WARMUP_READINGS,
+                 spike_z=SPIKE_Z, cusum_k=CUSUM_K, cusum_h=CUSUM_H, flat_readings=FLATLINE_READINGS):
+        if not 0 < alpha < 1:
+            raise ValueError("❌ alpha must be between 0 and 1")
+        self.features = list(features)
+        self.alpha = alpha
+        self.warmup = warmup
+        self.spike_z = spike_z
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.flat_readings = flat_readings
+        # Largest block whose inverse EWMA weights stay below 1e12
+        self.block_rows = int(min(BLOCK_ROWS, max(1, 12 * np.log(10) / -np.log(1 - alpha))))
+        self._states = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def initial_state(self):
+        n = len(self.features)
+        return {
+            "count": 0,
+            "mean": np.zeros(n),
+            "var": np.zeros(n),
+            "cusum_pos": np.zeros(n),
+            "cusum_neg": np.zeros(n),
+            "flat_run": np.zeros(n, dtype=np.int64),
+            "last": np.full(n, np.nan),
+        }
+
+    def _ewma(self, series, start):
+        # y_t = w * y_{t-1} + alpha * x_t, solved for a block as
+        # y_t = w^t * (y_0 + alpha * sum_i x_i / w^i)
+        w = 1 - self.alpha
+        powers = w ** np.arange(1, len(series) + 1)[:, None]
+        return powers * (start + self.alpha * np.cumsum(series / powers, axis=0))
+
+    def _cusum(self, steps, start):
+        # Lindley recursion S_t = max(0, S_{t-1} + d_t), solved as
+        # S_t = C_t - min(0, min_{j<=t} C_j) with C_t = S_0 + cumulative d
+        totals = start + np.cumsum(steps, axis=0)
+        return totals - np.minimum(np.minimum.accumulate(totals, axis=0), 0)
+
+    def _zscore(self, diff, var, mean):
+        # The floor keeps rounding noise on a constant feature from turning into huge z-scores
+        return diff / np.maximum(np.sqrt(var), SIGMA_FLOOR * np.maximum(np.abs(mean), 1.0))
+
+    def _step(self, values, state):
+        # One reading: the same recurrences as _block, written out directly
+        count = state["count"]
+        if count == 0:
+            state = dict(state, mean=values.copy(), last=values.copy())
+        diff = values - state["mean"]
+        var = state["var"]
+        z = self._zscore(diff, var, state["mean"])
+        warm = count >= self.warmup
+        cusum_pos, cusum_neg = state["cusum_pos"], state["cusum_neg"]
+        if warm:
+            bounded = np.clip(z, -self.spike_z, self.spike_z)
+            cusum_pos = np.maximum(cusum_pos + bounded - self.cusum_k, 0.0)
+            cusum_neg = np.maximum(cusum_neg - bounded - self.cusum_k, 0.0)
+        same = np.abs(values - state["last"]) <= FLATLINE_TOLERANCE
+        flat_run = np.where(same, state["flat_run"] + 1, 1) if count else np.ones_like(state["flat_run"])
+
+        result = {
+            "z": z[None],
+            "spike": (warm & (np.abs(z) > self.spike_z))[None],
+            "drift": (warm & (np.maximum(cusum_pos, cusum_neg) > self.cusum_h))[None],
+            "flat": (flat_run >= self.flat_readings)[None],
+        }
+        new_state = {
+            "count": count + 1,
+            "mean": state["mean"] + self.alpha * diff,
+            "var": (1 - self.alpha) * (var + self.alpha * diff ** 2),
+            "cusum_pos": cusum_pos,
+            "cusum_neg": cusum_neg,
+            "flat_run": flat_run,
+            "last": values,
+        }
+        return result, new_state
+
+    def _block(self, values, state):
+        rows = len(values)
+        count = state["count"]
+        if count == 0:
+            # Seed the baseline with the first reading
+            state = dict(state, mean=values[0].copy(), last=values[0].copy())
+
+        mean = self._ewma(values, state["mean"])
+        prev_mean = np.vstack([state["mean"], mean[:-1]])
+        diff = values - prev_mean
+        # EWMA variance: v_t = w * (v_{t-1} + alpha * d_t^2), i.e. an EWMA of w * d_t^2
+        var = self._ewma((1 - self.alpha) * diff ** 2, state["var"])
+        prev_var = np.vstack([state["var"], var[:-1]])
+
+        z = self._zscore(diff, prev_var, prev_mean)
+        warm = (count + np.arange(rows) >= self.warmup)[:, None]
+        bounded = np.clip(z, -self.spike_z, self.spike_z)
+        cusum_pos = self._cusum(np.where(warm, bounded - self.cusum_k, 0.0), state["cusum_pos"])
+        cusum_neg = self._cusum(np.where(warm, -bounded - self.cusum_k, 0.0), state["cusum_neg"])
+
+        # Flat-line run length = distance to the last reading that changed
+        same = np.abs(values - np.vstack([state["last"], values[:-1]])) <= FLATLINE_TOLERANCE
+        index = np.arange(rows)[:, None]
+        last_change = np.maximum.accumulate(np.where(same, -1, index), axis=0)
+        flat_run = np.where(last_change >= 0, index - last_change + 1, index + 1 + state["flat_run"])
+
+        result = {
+            "z": z,
+            "spike": warm & (np.abs(z) > self.spike_z),
+            "drift": warm & (np.maximum(cusum_pos, cusum_neg) > self.cusum_h),
+            "flat": flat_run >= self.flat_readings,
+        }
+        new_state = {
+            "count": count + rows,
+            "mean": mean[-1],
+            "var": var[-1],
+            "cusum_pos": cusum_pos[-1],
+            "cusum_neg": cusum_neg[-1],
+            "flat_run": flat_run[-1],
+            "last": values[-1],
+        }
+        return result, new_state
+
+    def detect(self, values, state):
+        """
+        Run the detector over a batch of readings from a given state.
+
+        Args:
+            values (np.ndarray): (rows, features) sensor values, oldest first.
+            state (dict): State from initial_state() or the previous batch.
+
+        Returns:
+            tuple: ({"z", "spike", "drift", "flat"} (rows, features) arrays, new state).
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.features))
+        if len(values) == 0:
+            empty = np.zeros((0, len(self.features)), dtype=bool)
+            return {"z": np.zeros(empty.shape), "spike": empty, "drift": empty, "flat": empty}, state
+
+        if len(values) == 1:
+            return self._step(values[0], state)
+
+        parts = []
+        for start in range(0, len(values), self.block_rows):
+            result, state = self._block(values[start:start + self.block_rows], state)
+            parts.append(result)
+        if len(parts) == 1:
+            return parts[0], state
+        return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}, state
+
+    def flags(self, result, row=-1):
+        """
+        Kinds of anomaly raised per feature for one row of a detect() result.
+
+        Returns:
+            dict: {feature: [kind, ...]} for flagged features only.
+        """
+        flagged = {}
+        for kind in ANOMALY_KINDS:
+            for i in np.flatnonzero(result[kind][row]):
+                flagged.setdefault(self.features[i], []).append(kind)
+        return flagged
+
+    def evaluate(self, values, station_id=DEFAULT_STATION):
+        """
+        Update a station's detector with its next batch of readings.
+
+        Batches of one station must be evaluated in order; different
+        stations can be evaluated from different threads.
+
+        Args:
+            values (np.ndarray): (rows, features) sensor values, oldest first.
+            station_id (str): Station the readings came from.
+
+        Returns:
+            dict: {"z", "spike", "drift", "flat"} arrays, one row per reading.
+        """
+        result, state = self.detect(values, self._states.get(station_id) or self.initial_state())
+        if len(result["z"]) == 0:
+            return result
+        for kind in ANOMALY_KINDS:
+            hits = result[kind].sum(axis=0)
+            for i in np.flatnonzero(hits):
+                SENSOR_ANOMALIES.inc(int(hits[i]), kind=kind, feature=self.features[i])
+        flagged = self.flags(result)
+        with self._lock:
+            self._states[station_id] = state
+            self._latest[station_id] = flagged
+        return result
+
+    def warm_start(self, store, station_id=DEFAULT_STATION, rows=BUFFER_CAPACITY):
+        """
+        Build a station's baseline from the tail of its SensorStore, so a
+        restart does not begin with a fresh warm-up period.
+
+        Args:
+            store (SensorStore): Store the station's readings are persisted to.
+            station_id (str): Station the store belongs to.
+            rows (int): Number of most recent readings to learn from.
+        """
+        _, values = store.read_rows(max(len(store) - rows, 0))
+        if len(values):
+            _, state = self.detect(values, self.initial_state())
+            with self._lock:
+                self._states[station_id] = state
+
+    def latest(self, station_id=DEFAULT_STATION):
+        """
+        Health of a station's most recent reading.
+
+        Returns:
+            dict: {"flagged": bool, "features": {feature: [kind, ...]},
+            "warming_up": bool}.
+        """
+        with self._lock:
+            state = self._states.get(station_id)
+            flagged = self._latest.get(station_id, {})
+        count = state["count"] if state else 0
+        return {"flagged": bool(flagged), "features": flagged, "warming_up": count < self.warmup}
+
+    def replay(self, values):
+        """
+        Run the detector over historical readings from a clean state,
+        without touching the live state.
+
+        Args:
+            values (np.ndarray): (rows, features) sensor values, oldest first.
+
+        Returns:
+            dict: {"z", "spike", "drift", "flat"} arrays, one row per reading.
+        """
+        return self.detect(values, self.initial_state())[0]
+
+    def reset(self, station_id=None):
+        """Forget the baseline of one station, or of every station."""
+        with self._lock:
+            if station_id is None:
+                self._states.clear()
+                self._latest.clear()
+            else:
+                self._states.pop(station_id, None)
+                self._latest.pop(station_id, None)
+
+
+def flagged_rows(detector, result, timestamps, values):
+    """
+    One row per flagged (reading, feature, kind), for writing replay results.
+
+    Returns:
+        pd.DataFrame: Timestamp, feature, kind, value and z columns.
+    """
+    import pandas as pd
+
+    frames = []
+    for kind in ANOMALY_KINDS:
+        rows, cols = np.nonzero(result[kind])
+        frames.append(pd.DataFrame({
+            "Timestamp": [format_timestamp(t) for t in timestamps[rows]],
+            "feature": np.asarray(detector.features, dtype=object)[cols],
+            "kind": kind,
+            "value": values[rows, cols],
+            "z": np.round(result["z"][rows, cols], 3),
+        }))
+    return pd.concat(frames, ignore_index=True).sort_values("Timestamp", kind="stable")
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.anomaly [--csv data/raw/sensor_data.csv] [--out flagged.csv]
+    import pandas as pd
+
+    from src.backfill import CHUNK_ROWS, iter_csv_chunks
+    from src.sensor_store import STORE_DIR, SensorStore
+
+    parser = argparse.ArgumentParser(description="Replay the anomaly detector over historical readings.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--store", default=STORE_DIR, help="SensorStore root to replay")
+    source.add_argument("--csv", help="Raw sensor CSV to replay instead of the store")
+    parser.add_argument("--out", help="Write every flagged reading to this CSV")
+    args = parser.parse_args()
+
+    if args.csv:
+        chunks = iter_csv_chunks(args.csv)
+    else:
+        store = SensorStore(args.store)
+        chunks = ((v, t) for t, v in (store.read_rows(s, s + CHUNK_ROWS) for s in range(0, len(store), CHUNK_ROWS)))
+
+    detector = AnomalyDetector()
+    state = detector.initial_state()
+    counts = {kind: np.zeros(len(detector.features), dtype=np.int64) for kind in ANOMALY_KINDS}
+    flagged, rows, elapsed = [], 0, 0.0
+    for values, timestamps in chunks:
+        start = time.perf_counter()
+        result, state = detector.detect(values, state)
+        elapsed += time.perf_counter() - start
+        rows += len(values)
+        for kind in ANOMALY_KINDS:
+            counts[kind] += result[kind].sum(axis=0)
+        if args.out:
+            flagged.append(flagged_rows(detector, result, timestamps, values))
+
+    print(f"🔁 Replayed {rows} readings in {elapsed:.3f}s "
+          f"({rows / elapsed if elapsed else float('inf'):,.0f} rows/s)")
+    for i, feature in enumerate(detector.features):
+        found = {kind: int(counts[kind][i]) for kind in ANOMALY_KINDS if counts[kind][i]}
+        if found:
+            print(f"  {feature}: {found}")
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        (pd.concat(flagged, ignore_index=True) if flagged else pd.DataFrame()).to_csv(args.out, index=False)
+        print(f"✅ Flagged readings saved at: {args.out}")
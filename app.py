@@ -1,5 +1,4 @@
-from flask import Flask, jsonify, render_template
-import pandas as pd
+from flask import Flask, jsonify, render_template, request
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -7,38 +6,55 @@ import numpy as np
 import threading
 import time
 from datetime import datetime
-from src.predict import predict_emissions
-import requests
-from twilio.rest import Client
+from src.predict import predict_emissions, predict_emissions_batch
+from src.sensor_buffer import parse_timestamp, sensor_buffer
+from src.sensor_store import Compactor, SensorStore, sensor_store, import_csv
+from src.rollups import rollups
+from src.suggestions import SUGGESTION_PENDING, SuggestionService
+from src.broadcast import Broadcaster, sse_response
+from src.alerts import AlertDispatcher, provider_from_env
+from src.retraining import RetrainScheduler
+from src.digital_twin import BASE_VALUES, hour_multiplier
+from src.stations import STATIONS_DIR, IngestRouter, parse_ingest_body
+from src.rules import DEFAULT_STATION, RuleEngine, SOS_RULE, SOS_THRESHOLD, SOS_CONSECUTIVE, signals_from
+from src.anomaly import AnomalyDetector
+from src.forecast import Forecaster
+from src.response_cache import ResponseCache
+from src.model_search import load_config
+from src.telemetry import INGEST_ROWS, INGEST_SECONDS, STAGE_SECONDS, get_logger, instrument_flask
 from dotenv import load_dotenv
 from collections import deque
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Twilio client
-twilio_client = Client(
-    os.getenv("TWILIO_ACCOUNT_SID"),
-    os.getenv("TWILIO_AUTH_TOKEN")
-)
+logger = get_logger(__name__)
 
 # Debug Twilio credentials
 TWILIO_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 INCHARGE_NUMBER = "+918248179868"
-print("Twilio FROM number:", TWILIO_NUMBER)
-print("Twilio TO number:", INCHARGE_NUMBER)
+logger.info("Twilio FROM number: %s", TWILIO_NUMBER)
+logger.info("Twilio TO number: %s", INCHARGE_NUMBER)
+
+# SMS alerts go through a persistent outbox drained by background workers
+alert_dispatcher = AlertDispatcher(provider_from_env())
 
 app = Flask(__name__)
+instrument_flask(app)  # Request timings, /metrics and (with ENABLE_PROFILER=1) /profile
 
 # Constants
 RAW_DATA_PATH = "data/raw/sensor_data.csv"
 CARBON_THRESHOLD = 40
-SOS_THRESHOLD = 45
 MAX_SOS_COUNT = 1
 
 # Ensure raw data folder exists
 os.makedirs(os.path.dirname(RAW_DATA_PATH), exist_ok=True)
 
+# Periodically refits the model on newly stored readings in a separate process
+retrainer = RetrainScheduler(sensor_store)
+
+config = load_config()
+
 expected_features = [
     "PM2.5 (ug/m3)", "PM10 (ug/m3)", "NO (ug/m3)", "NO2 (ug/m3)", "NOx (ppb)",
     "NH3 (ug/m3)", "SO2 (ug/m3)", "CO (mg/m3)", "Ozone (ug/m3)", "Benzene (ug/m3)",
@@ -46,131 +62,182 @@ expected_features = [
     "SR (W/mt2)", "BP (mmHg)", "VWS (m/s)", "Xylene (ug/m3)", "RF (mm)", "AT (degree C)"
 ]
 
-sos_counter = 0
+# SOS after SOS_CONSECUTIVE readings in a row at or over SOS_THRESHOLD; the run
+# restarts after each alert. config.yaml `rules` can override it per station.
+rule_engine = RuleEngine.from_config([SOS_RULE], config)
+
+# Flags spiking, drifting and stuck sensors per feature; the baseline is
+# rebuilt from the tail of the store at startup so a restart needs no warm-up
+anomaly_detector = AnomalyDetector(expected_features)
+
+# Lags, rolling means and slopes kept current per reading, scored 5, 15 and 60
+# minutes ahead in one model call; the history is rebuilt from the store at startup
+forecaster = Forecaster(expected_features)
 
-def get_tyres_suggestion(emission_value):
-    prompt = (
-        f"The predicted carbon emission is {emission_value:.2f}, which exceeds the threshold of {CARBON_THRESHOLD}. "
-        "Suggest a practical strategy for reducing emissions specifically in the tyre manufacturing industry."
+# Suggestions are generated in the background and served from cache
+suggestion_service = SuggestionService(CARBON_THRESHOLD)
+
+# Pushes each new reading and prediction to /stream subscribers
+broadcaster = Broadcaster()
+
+# /live-data bodies per station, rebuilt only after the ingest loop appends a reading
+live_cache = ResponseCache()
+
+def queue_station_sos(station_id, rule_name, value):
+    alert_msg = (
+        f"🚨 SOS ALERT: Station {station_id} triggered rule '{rule_name}'. "
+        f"Current value: {value:.2f}."
     )
+    queued = alert_dispatcher.enqueue(INCHARGE_NUMBER, alert_msg, dedupe_key=f"{rule_name}-{station_id}")
+    logger.info("📨 SOS alert %s for station %s %s.", queued["id"], station_id, queued["status"])
 
-    try:
-        response = requests.post(
-            "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.1",
-            json={"inputs": prompt},
-            timeout=30
-        )
+# Readings pushed by remote stations, sharded per station across a worker pool
+ingest_router = IngestRouter(
+    predict=predict_emissions_batch, on_alert=queue_station_sos, rule_engine=rule_engine,
+    anomaly_detector=anomaly_detector, forecaster=forecaster
+)
 
-        if response.status_code == 200:
-            result = response.json()
-            if isinstance(result, list):
-                return result[0]["generated_text"].split(prompt)[-1].strip()
-            return result.get("generated_text", "No suggestion found.")
-        else:
-            print("🛑 Hugging Face API error:", response.status_code, response.text)
-            return "No suggestion available at the moment."
+def stores_to_compact():
+    stations = sorted(os.listdir(STATIONS_DIR)) if os.path.isdir(STATIONS_DIR) else []
+    return [sensor_store] + [SensorStore(os.path.join(STATIONS_DIR, s)) for s in stations]
 
-    except Exception as e:
-        print(f"❌ Suggestion fetch error: {e}")
-        return "No suggestion available due to an error."
+# Archives closed store segments and applies the `retention` policy of config.yaml
+compactor = Compactor(stores_to_compact, config.get("retention"))
 
 def generate_sensor_data():
     current_hour = datetime.now().hour
-    base_values = {
-        "PM2.5 (ug/m3)": (30, 10),
-        "PM10 (ug/m3)": (70, 20),
-        "NO (ug/m3)": (20, 5),
-        "NO2 (ug/m3)": (15, 4),
-        "NOx (ppb)": (25, 8),
-        "NH3 (ug/m3)": (5, 1.5),
-        "SO2 (ug/m3)": (30, 6),
-        "CO (mg/m3)": (2.5, 0.5),
-        "Ozone (ug/m3)": (25, 5),
-        "Benzene (ug/m3)": (0.2, 0.05),
-        "Toluene (ug/m3)": (0.3, 0.07),
-        "Temp (degree C)": (32, 2),
-        "RH (%)": (60, 5),
-        "WS (m/s)": (3, 0.5),
-        "WD (deg)": (270, 10),
-        "SR (W/mt2)": (150, 20),
-        "BP (mmHg)": (1015, 10),
-        "VWS (m/s)": (2, 0.5),
-        "Xylene (ug/m3)": (0.4, 0.1),
-        "RF (mm)": (1, 0.2),
-        "AT (degree C)": (33, 2),
-    }
-
-    if 6 <= current_hour < 10:
-        multiplier = 1.3
-    elif 10 <= current_hour < 16:
-        multiplier = 0.8
-    elif 16 <= current_hour < 20:
-        multiplier = 1.5
-    else:
-        multiplier = 0.7
+    multiplier = hour_multiplier(current_hour)
 
     sensor_data = {
         key: max(0, np.random.normal(mu * multiplier, sigma))
-        for key, (mu, sigma) in base_values.items()
+        for key, (mu, sigma) in BASE_VALUES.items()
     }
     sensor_data["Timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     sensor_data["From Date"] = datetime.now().strftime("%Y-%m-%d")
     return sensor_data
 
+def ingest_reading(data):
+    """
+    Persist one reading, update its forecast features, score it, check the
+    SOS rule, update rollups and publish it to /stream subscribers.
+
+    Args:
+        data (dict): Sensor values keyed by feature name, plus "Timestamp".
+
+    Returns:
+        float | None: Predicted emission, or None if prediction failed.
+    """
+    started = time.perf_counter()
+    missing_keys = [f for f in expected_features if f not in data]
+    if missing_keys:
+        logger.warning("⚠️ Filling missing features with default 0: %s", missing_keys)
+        for key in missing_keys:
+            data[key] = 0
+
+    sensor_store.append(data)
+    row = [[data[f] for f in expected_features]]
+
+    try:
+        anomaly_detector.evaluate(row)
+    except Exception as ae:
+        logger.error("❌ Anomaly detector error: %s", ae)
+
+    try:
+        forecaster.update(row, [parse_timestamp(data.get("Timestamp", datetime.now()))])
+    except Exception as fe:
+        logger.error("❌ Forecast feature error: %s", fe)
+
+    # Appending bumps the /live-data cache version, so it goes after the
+    # anomaly and forecast state that response is built from
+    sensor_buffer.append(data)
+
+    predicted_emission = None
+    try:
+        predicted_emission = predict_emissions(data)
+        logger.debug("🌿 Predicted Emission: %.2f", predicted_emission)
+
+        sos = rule_engine.evaluate(
+            signals_from(row, [predicted_emission], expected_features)
+        )["sos"]
+        if sos["exceeded"][-1]:
+            logger.debug("⚠️ Emission above threshold. Rule value: %g", sos["value"][-1])
+        if sos["fired"][-1]:
+            logger.warning("🚨 SOS rule fired. Queueing SOS SMS...")
+            if alert_dispatcher.provider.configured and INCHARGE_NUMBER:
+                alert_msg = (
+                    f"🚨 SOS ALERT: Emissions exceeded {SOS_THRESHOLD} ppm {SOS_CONSECUTIVE} times in a row. "
+                    f"Current emission: {predicted_emission:.2f} ppm."
+                )
+                queued = alert_dispatcher.enqueue(INCHARGE_NUMBER, alert_msg, dedupe_key="sos-auto")
+                logger.info("📨 SOS alert %s %s.", queued["id"], queued["status"])
+
+    except Exception as pe:
+        logger.error("❌ Prediction error: %s", pe)
+
+    rollups.add(data, predicted_emission)
+    broadcaster.publish({
+        "latest_sensor_data": data,
+        "predicted_carbon": None if predicted_emission is None else round(predicted_emission, 2),
+        "threshold": CARBON_THRESHOLD,
+    })
+    INGEST_SECONDS.observe(time.perf_counter() - started, source="app")
+    INGEST_ROWS.inc(source="app")
+    return predicted_emission
+
+def catch_up_rollups():
+    # Scores the stored history not yet rolled up (first run or restart) in the
+    # background; live readings wait for it in save_sensor_data
+    try:
+        rollups.catch_up(sensor_store, predict_emissions_batch)
+    except Exception as e:
+        logger.error("❌ Rollup catch-up error: %s", e)
+    finally:
+        rollups_caught_up.set()
+
+rollups_caught_up = threading.Event()
+startup_lock = threading.Lock()
+started_up = False
+
+def startup():
+    """
+    Load state from the store: migrate the legacy CSV log, warm-start the
+    buffer and the anomaly and forecast baselines, and catch the rollups up
+    in the background.
+
+    Nothing here runs at import. It is called from __main__, or by the
+    first request when another server imports the app; later calls return
+    immediately.
+    """
+    global started_up
+    with startup_lock:
+        if started_up:
+            return
+        # One-shot migration of the legacy CSV log into the columnar store
+        if len(sensor_store) == 0 and os.path.exists(RAW_DATA_PATH):
+            result = import_csv(RAW_DATA_PATH, sensor_store)
+            logger.info("📦 Imported %s rows from %s (%s skipped, %s clamped)",
+                        result["imported"], RAW_DATA_PATH, result["skipped"], result["clamped"])
+        sensor_buffer.warm_start(sensor_store)
+        anomaly_detector.warm_start(sensor_store)
+        forecaster.warm_start(sensor_store)
+        threading.Thread(target=catch_up_rollups, daemon=True).start()
+        started_up = True
+
+@app.before_request
+def ensure_started():
+    if not started_up:
+        startup()
+
 def save_sensor_data():
-    print("📡 Starting sensor data simulation...")
+    rollups_caught_up.wait()
+    logger.info("📡 Starting sensor data simulation...")
     while True:
         try:
-            data = generate_sensor_data()
-            missing_keys = [f for f in expected_features if f not in data]
-            if missing_keys:
-                print(f"⚠️ Filling missing features with default 0: {missing_keys}")
-                for key in missing_keys:
-                    data[key] = 0
-
-            df = pd.DataFrame([data])
-            df.to_csv(RAW_DATA_PATH, mode="a", header=not os.path.exists(RAW_DATA_PATH), index=False)
-
-            try:
-                predicted_emission = predict_emissions(data)
-                print(f"🌿 Predicted Emission: {predicted_emission:.2f}")
-
-                global sos_counter
-                if predicted_emission >= SOS_THRESHOLD:
-                    sos_counter += 1
-                    print(f"⚠️ Emission above threshold. Consecutive count: {sos_counter}")
-                    if sos_counter >= 5:
-                        print("🚨 Emission exceeded threshold 5 times. Sending SOS SMS...")
-                        if TWILIO_NUMBER and INCHARGE_NUMBER:
-                            alert_msg = (
-                                f"🚨 SOS ALERT: Emissions exceeded {SOS_THRESHOLD} ppm 5 times in a row. "
-                                f"Current emission: {predicted_emission:.2f} ppm."
-                            )
-                            try:
-                                msg = twilio_client.messages.create(
-                                    body=alert_msg,
-                                    from_=TWILIO_NUMBER,
-                                    to=INCHARGE_NUMBER
-                                )
-                                print("✅ SOS alert sent. SID:", msg.sid)
-                                if msg.sid:
-                                    print("📨 SMS successfully delivered.")
-                                else:
-                                    print("⚠️ SMS delivery status unknown.")
-                            except Exception as sms_error:
-                                print("❌ Twilio SMS send failed:", sms_error)
-                                print("📨 SMS failed to send.")
-                        sos_counter = 0
-                else:
-                    sos_counter = 0
-
-            except Exception as pe:
-                print(f"❌ Prediction error: {pe}")
-
+            ingest_reading(generate_sensor_data())
             time.sleep(5)
 
         except Exception as e:
-            print(f"❌ Sensor save error: {e}")
+            logger.error("❌ Sensor save error: %s", e)
 
 @app.route("/")
 def dashboard():
@@ -179,51 +246,108 @@ def dashboard():
 @app.route("/live-data", methods=["GET"])
 def get_live_data():
     try:
-        if not os.path.exists(RAW_DATA_PATH):
+        station_id = request.args.get("station_id")
+        if station_id:
+            shard = ingest_router.shard(station_id)
+            if shard is None:
+                return jsonify({"status": "error", "message": f"Unknown station '{station_id}'."}), 404
+            buffer = shard.buffer
+        else:
+            buffer = sensor_buffer
+        if len(buffer) == 0:
             return jsonify({"status": "error", "message": "No data available."}), 404
 
-        df = pd.read_csv(RAW_DATA_PATH, on_bad_lines='skip').dropna()
-        if df.empty:
-            return jsonify({"status": "error", "message": "No valid data."}), 404
-
-        latest = df.iloc[-1].to_dict()
-
-        missing = [f for f in expected_features if f not in latest]
-        if missing:
-            raise ValueError(f"❌ Missing features: {missing}")
-
-        predicted_carbon = predict_emissions(latest)
-        suggestion = get_tyres_suggestion(predicted_carbon) if predicted_carbon > CARBON_THRESHOLD else None
+        def build():
+            with STAGE_SECONDS.time(route="live_data", stage="read"):
+                latest = buffer.latest()
+            missing = [f for f in expected_features if f not in latest]
+            if missing:
+                raise ValueError(f"❌ Missing features: {missing}")
+
+            with STAGE_SECONDS.time(route="live_data", stage="predict"):
+                predicted_carbon = predict_emissions(latest)
+            with STAGE_SECONDS.time(route="live_data", stage="suggestion"):
+                suggestion, suggestion_status = (
+                    suggestion_service.get(predicted_carbon) if predicted_carbon > CARBON_THRESHOLD else (None, None)
+                )
+            with STAGE_SECONDS.time(route="live_data", stage="forecast"):
+                forecast = forecaster.latest(station_id or DEFAULT_STATION)
+
+            return {
+                "status": "success",
+                "latest_sensor_data": latest,
+                "predicted_carbon": round(predicted_carbon, 2),
+                "threshold": CARBON_THRESHOLD,
+                "suggestion": suggestion,
+                "suggestion_status": suggestion_status,
+                "sensor_health": anomaly_detector.latest(station_id or DEFAULT_STATION),
+                "forecast": forecast,
+            }
+
+        # The version is read before building, so a reading that lands mid-build
+        # is picked up on the next poll. Pending suggestions are not cached.
+        return live_cache.respond(
+            station_id or DEFAULT_STATION, buffer.version, build,
+            cacheable=lambda payload: payload["suggestion_status"] != SUGGESTION_PENDING,
+        )
 
-        response = {
-            "status": "success",
-            "latest_sensor_data": latest,
-            "predicted_carbon": round(predicted_carbon, 2),
-            "threshold": CARBON_THRESHOLD,
-            "suggestion": suggestion,
-        }
+    except Exception as e:
+        logger.error("🔥 Error in /live-data: %s", e)
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        return jsonify(response)
+@app.route("/stream", methods=["GET"])
+def stream():
+    return sse_response(broadcaster)
 
+@app.route("/rollups", methods=["GET"])
+def get_rollups():
+    try:
+        feature = request.args.get("feature", "emission")
+        bucket = request.args.get("bucket", "1h")
+        points = rollups.query(feature, bucket, request.args.get("from"), request.args.get("to"))
+        return jsonify({"status": "success", "feature": feature, "bucket": bucket, "points": points})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
-        print(f"🔥 Error in /live-data: {e}")
+        logger.error("🔥 Error in /rollups: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/ingest", methods=["POST"])
+def ingest():
+    try:
+        batches = parse_ingest_body(
+            request.get_data(), request.content_type or "", request.args.get("station_id")
+        )
+        accepted, rejected = ingest_router.submit_batches(batches)
+        if rejected:
+            # Accepted stations are already queued; the client retries only the rejected ones
+            return jsonify({"status": "error", "message": "Ingest queue full for some stations, retry them later.",
+                            "rows": sum(accepted.values()), "stations": accepted, "rejected": rejected}), 503
+        return jsonify({"status": "accepted", "rows": sum(accepted.values()), "stations": accepted}), 202
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route("/stations", methods=["GET"])
+def get_stations():
+    return jsonify({"status": "success", "pending_batches": ingest_router.pending(),
+                    "stations": ingest_router.stations()})
+
 @app.route("/trigger-sos", methods=["POST"])
 def trigger_sos():
     try:
         alert_msg = "🚨 SOS ALERT: Emission exceeded the safe limit 5 times in a row!"
-        msg = twilio_client.messages.create(
-            body=alert_msg,
-            from_=TWILIO_NUMBER,
-            to=INCHARGE_NUMBER
-        )
-        print("✅ SOS SMS triggered manually. SID:", msg.sid)
-        return jsonify({"status": "success", "sid": msg.sid})
+        queued = alert_dispatcher.enqueue(INCHARGE_NUMBER, alert_msg, dedupe_key="sos-manual")
+        logger.info("✅ SOS SMS queued manually. Alert: %s (%s)", queued["id"], queued["status"])
+        return jsonify({"status": "success", "alert_id": queued["id"], "alert_status": queued["status"]})
     except Exception as e:
-        print(f"❌ Error sending manual SOS SMS: {e}")
+        logger.error("❌ Error queueing manual SOS SMS: %s", e)
         return jsonify({"status": "error", "message": str(e)}), 500
 
 if __name__ == "__main__":
+    startup()
+    alert_dispatcher.start()
+    retrainer.start()
+    compactor.start()
+    ingest_router.start()
     threading.Thread(target=save_sensor_data, daemon=True).start()
     app.run(host="0.0.0.0", port=5002, debug=True)
\ No newline at end of file
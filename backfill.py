@@ -0,0 +1,298 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.flat_forest import FLAT_MODEL_PATH
+from src.model_registry import MODEL_PATH
+from src.rules import GOV_LIMIT_RULES, SOS_RULE, RuleEngine, signals_from
+from src.sensor_buffer import utc_offset
+from src.sensor_store import STORE_DIR, SensorStore, parse_csv_line
+
+BACKFILL_DIR = "data/backfill"
+CHUNK_ROWS = 100000
+OUTPUT_NAME = "predictions.csv"
+IN_FLIGHT_PER_WORKER = 2  # Chunks submitted ahead per worker; bounds the CSV chunks held in memory
+
+
+def model_version():
+    """Modification time of the newest model file, used to detect retrains between runs."""
+    mtimes = [os.path.getmtime(p) for p in (MODEL_PATH, FLAT_MODEL_PATH) if os.path.exists(p)]
+    return max(mtimes) if mtimes else None
+
+
+def iter_csv_chunks(csv_path, chunk_rows=CHUNK_ROWS):
+    """
+    Stream the raw sensor CSV as (values, timestamps) chunks in file order.
+
+    Lines that do not match the current feature layout are skipped, as in
+    import_csv.
+
+    Args:
+        csv_path (str): Path of the raw sensor CSV.
+        chunk_rows (int): Valid rows per chunk.
+
+    Yields:
+        tuple: ((rows, features) float64 values, (rows,) int64 epoch seconds).
+    """
+    values, timestamps = [], []
+    with open(csv_path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            parsed = parse_csv_line(line)
+            if parsed:
+                values.append(parsed[0])
+                timestamps.append(parsed[1])
+                if len(values) == chunk_rows:
+                    yield np.array(values, dtype=np.float64), np.array(timestamps, dtype=np.int64)
+                    values, timestamps = [], []
+    if values:
+        yield np.array(values, dtype=np.float64), np.array(timestamps, dtype=np.int64)
+
+
+def _part_path(out_dir, index):
+    return os.path.join(out_dir, "parts", f"part_{index:06d}.npz")
+
+
+def score_chunk(out_dir, index, store_root=None, start=None, stop=None, values=None, timestamps=None):
+    """
+    Score one chunk with batched inference and write it as a part file.
+
+    Runs in a worker process. Store chunks are read by row range inside the
+    worker, so only CSV chunks are shipped between processes.
+
+    Args:
+        out_dir (str): Backfill output directory.
+        index (int): Chunk number.
+        store_root (str | None): Store to read rows start..stop from.
+        values (np.ndarray | None): Chunk values when reading from a CSV.
+        timestamps (np.ndarray | None): Chunk timestamps when reading from a CSV.
+
+    Returns:
+        tuple: (chunk number, rows scored).
+    """
+    from src.predict import predict_emissions_batch
+
+    if store_root is not None:
+        timestamps, values = SensorStore(store_root).read_rows(start, stop)
+    emissions = predict_emissions_batch(np.column_stack([np.zeros(len(values)), values]))
+
+    path = _part_path(out_dir, index)
+    tmp_path = f"{path[:-4]}.tmp{os.getpid()}.npz"
+    np.savez(tmp_path, timestamps=timestamps, values=values, emissions=np.asarray(emissions, dtype=np.float64))
+    os.replace(tmp_path, path)  # A part either exists completely or not at all
+    return index, len(values)
+
+
+def _write_manifest(out_dir, manifest):
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+
+def _prepare(out_dir, manifest, restart):
+    manifest_path = os.path.join(out_dir, "manifest.json")
+    if restart and os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        if {k: previous.get(k) for k in manifest} != manifest:
+            raise ValueError(
+                f"❌ {out_dir} holds a backfill with different settings or an older model. "
+                "Pass --restart to discard it."
+            )
+        # A partial last chunk is scored again, since the source may have grown since
+        rows, last_chunk_rows = previous.get("rows"), previous.get("last_chunk_rows")
+        if rows and last_chunk_rows is not None and last_chunk_rows < manifest["chunk_rows"]:
+            last_part = _part_path(out_dir, (rows - 1) // manifest["chunk_rows"])
+            if os.path.exists(last_part):
+                os.remove(last_part)
+    os.makedirs(os.path.join(out_dir, "parts"), exist_ok=True)
+    _write_manifest(out_dir, manifest)
+
+
+def _tasks(out_dir, store_root, csv_path, chunk_rows):
+    """
+    Yield (chunk number, rows, score_chunk kwargs) for every chunk of the
+    source; kwargs is None for chunks already written.
+    """
+    if csv_path:
+        for index, (values, timestamps) in enumerate(iter_csv_chunks(csv_path, chunk_rows)):
+            done = os.path.exists(_part_path(out_dir, index))
+            yield index, len(values), None if done else {"values": values, "timestamps": timestamps}
+    else:
+        total = len(SensorStore(store_root))
+        for index, start in enumerate(range(0, total, chunk_rows)):
+            stop = min(start + chunk_rows, total)
+            done = os.path.exists(_part_path(out_dir, index))
+            yield index, stop - start, None if done else {"store_root": store_root, "start": start, "stop": stop}
+
+
+def _format_timestamps(timestamps):
+    local = pd.to_datetime(timestamps + utc_offset(timestamps), unit="s")
+    return local.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def write_output(out_dir, engine):
+    """
+    Evaluate the limit rules over every part in order and write the output CSV.
+
+    Rule state carries across parts, so runs spanning chunk boundaries are
+    counted exactly as the live engine would count them.
+
+    Args:
+        out_dir (str): Backfill output directory.
+        engine (RuleEngine): Rules to evaluate.
+
+    Returns:
+        tuple: (rows written, {rule name: times fired}).
+    """
+    parts = sorted(name for name in os.listdir(os.path.join(out_dir, "parts")) if name.endswith(".npz")
+                   and ".tmp" not in name)
+    output_path = os.path.join(out_dir, OUTPUT_NAME)
+    tmp_path = f"{output_path}.tmp"
+    fired_counts = {}
+    rows = 0
+    for i, name in enumerate(parts):
+        with np.load(os.path.join(out_dir, "parts", name)) as part:
+            timestamps, values, emissions = part["timestamps"], part["values"], part["emissions"]
+
+        violations = np.full(len(timestamps), "", dtype=object)
+        for rule_name, result in engine.evaluate(signals_from(values, emissions)).items():
+            fired_counts[rule_name] = fired_counts.get(rule_name, 0) + int(result["fired"].sum())
+            violations[result["fired"]] += rule_name + ";"
+
+        frame = pd.DataFrame({
+            "Timestamp": _format_timestamps(timestamps),
+            "emission": np.round(emissions, 4),
+            "violations": [v.rstrip(";") for v in violations],
+        })
+        frame.to_csv(tmp_path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        rows += len(frame)
+    if parts:
+        os.replace(tmp_path, output_path)
+    return rows, fired_counts
+
+
+def run_backfill(store_root=STORE_DIR, csv_path=None, out_dir=BACKFILL_DIR, chunk_rows=CHUNK_ROWS,
+                 workers=None, restart=False, engine=None):
+    """
+    Re-score the whole sensor history with the current model in a process pool.
+
+    Chunks already scored by an interrupted run with the same source, chunk
+    size and model are skipped, except a partial last chunk, which is scored
+    again with any rows added since. At most IN_FLIGHT_PER_WORKER chunks per
+    worker are submitted ahead, so a CSV source is never held in memory
+    whole. Progress is printed as chunks complete.
+
+    Args:
+        store_root (str): SensorStore to re-score (ignored when csv_path is set).
+        csv_path (str | None): Raw sensor CSV to re-score instead of the store.
+        out_dir (str): Output directory for parts, manifest and predictions.csv.
+        chunk_rows (int): Rows per chunk.
+        workers (int | None): Worker processes (default: all cores).
+        restart (bool): Discard any previous run in out_dir.
+        engine (RuleEngine | None): Limit rules (default: SOS and GOV_LIMITS).
+
+    Returns:
+        dict: Summary with row counts, timings and rule firing counts.
+    """
+    manifest = {
+        "source": os.path.abspath(csv_path or store_root),
+        "chunk_rows": chunk_rows,
+        "model_version": model_version(),
+    }
+    _prepare(out_dir, manifest, restart)
+
+    workers = workers or os.cpu_count()
+    started = time.perf_counter()
+    scored = queued = source_rows = last_chunk_rows = 0
+    print(f"📦 Scoring with {workers} workers (chunks already done are skipped)")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = _tasks(out_dir, store_root, csv_path, chunk_rows)
+        pending = {}
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < IN_FLIGHT_PER_WORKER * workers:
+                task = next(tasks, None)
+                if task is None:
+                    exhausted = True
+                    # Recorded once the whole source is known, so a resume can find a partial last chunk
+                    _write_manifest(out_dir, dict(manifest, rows=source_rows, last_chunk_rows=last_chunk_rows))
+                    break
+                index, rows, kwargs = task
+                source_rows += rows
+                last_chunk_rows = rows
+                if kwargs is not None:
+                    pending[pool.submit(score_chunk, out_dir, index, **kwargs)] = rows
+                    queued += rows
+            if not pending:
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                index, rows = future.result()
+                scored += rows
+                elapsed = time.perf_counter() - started
+                rate = scored / elapsed if elapsed else 0
+                if exhausted:
+                    eta = (queued - scored) / rate if rate else 0
+                    print(f"⚡ {scored}/{queued} rows ({rate:,.0f} rows/s, ETA {eta:.0f}s)")
+                else:
+                    print(f"⚡ {scored} rows ({rate:,.0f} rows/s)")
+    score_seconds = time.perf_counter() - started
+
+    rules_started = time.perf_counter()
+    rows, fired = write_output(out_dir, engine or RuleEngine([SOS_RULE, *GOV_LIMIT_RULES]))
+    rules_seconds = time.perf_counter() - rules_started
+
+    summary = {
+        "rows": rows,
+        "scored_rows": scored,
+        "score_seconds": round(score_seconds, 2),
+        "score_rows_per_second": round(scored / score_seconds) if score_seconds and scored else None,
+        "output_seconds": round(rules_seconds, 2),
+        "fired": fired,
+        "output": os.path.join(out_dir, OUTPUT_NAME),
+    }
+    with open(os.path.join(out_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    from src.model_search import load_config
+
+    parser = argparse.ArgumentParser(description="Re-score the sensor history with the current model.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--store", default=STORE_DIR, help="SensorStore root to re-score")
+    source.add_argument("--csv", help="Raw sensor CSV to re-score instead of the store")
+    parser.add_argument("--out", default=BACKFILL_DIR)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--restart", action="store_true", help="Discard a previous run instead of resuming it")
+    args = parser.parse_args()
+
+    try:
+        summary = run_backfill(
+            args.store, args.csv, args.out, args.chunk_rows, args.workers, args.restart,
+            RuleEngine.from_config([SOS_RULE, *GOV_LIMIT_RULES], load_config()),
+        )
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    print(f"✅ Wrote {summary['rows']} predictions to {summary['output']}")
+    if summary["score_rows_per_second"]:
+        print(f"⚡ Scoring: {summary['score_rows_per_second']:,} rows/s; "
+              f"rules and output: {summary['output_seconds']}s")
+    for name, count in summary["fired"].items():
+        print(f"  {name}: fired {count} times")
@@ -0,0 +1,429 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BENCHMARK_DIR = "data/benchmarks"
+REGRESSION_TOLERANCE = 0.10  # Metrics more than 10% worse than the baseline are flagged
+
+FULL = {"readings": 2000, "batch_sizes": [1, 100, 1000, 10000], "batch_repeats": 5,
+        "ingest_readings": 2000, "clients": [1, 8, 32], "requests_per_client": 200}
+QUICK = {"readings": 200, "batch_sizes": [1, 100, 1000], "batch_repeats": 3,
+         "ingest_readings": 200, "clients": [1, 8], "requests_per_client": 50}
+
+# Cold import budget per server with a populated store, in milliseconds, checked by --imports
+SERVERS = ("app", "dashboard", "http_server")
+IMPORT_BUDGET_MS = {"app": 500, "dashboard": 700, "http_server": 500}
+IMPORT_REPEATS = 3  # Best of this many fresh interpreters
+IMPORT_TOP = 12  # Most expensive packages reported per server
+SEED_STORE_ROWS = 20000  # Synthetic readings in the scratch store for the import checks
+
+
+def summarize(seconds):
+    """
+    Latency statistics in milliseconds.
+
+    Args:
+        seconds (list[float]): Individual timings in seconds.
+
+    Returns:
+        dict: n, mean, p50, p99 and max in milliseconds.
+    """
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    return {
+        "n": int(len(ms)),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def synthetic_readings(app_module, n, seed):
+    """Reproducible readings from app.generate_sensor_data."""
+    np.random.seed(seed)
+    random.seed(seed)
+    return [app_module.generate_sensor_data() for _ in range(n)]
+
+
+def bench_model_load():
+    """Cold load time of each model format and of the registry's first get()."""
+    import joblib
+    from src.flat_forest import FLAT_MODEL_PATH, load_flat_forest
+    from src.model_registry import MODEL_PATH, ModelRegistry
+
+    results = {}
+    loaders = {
+        "flat_mmap": (FLAT_MODEL_PATH, lambda p: load_flat_forest(p, mmap_mode="r")),
+        "flat_in_memory": (FLAT_MODEL_PATH, load_flat_forest),
+        "pickle": (MODEL_PATH, joblib.load),
+        "pickle_mmap": (MODEL_PATH, lambda p: joblib.load(p, mmap_mode="r")),
+    }
+    for name, (path, load) in loaders.items():
+        if os.path.exists(path):
+            start = time.perf_counter()
+            load(path)
+            results[f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 4)
+
+    start = time.perf_counter()
+    ModelRegistry().get()
+    results["registry_first_get_ms"] = round((time.perf_counter() - start) * 1000, 4)
+    return results
+
+
+def bench_predict(readings, batch_sizes, repeats):
+    """Single-row predict_emissions latency and predict_emissions_batch throughput."""
+    from src.predict import predict_emissions, predict_emissions_batch
+
+    predict_emissions(dict(readings[0]))  # Load the model outside the timings
+    timings = []
+    for reading in readings:
+        reading = dict(reading)
+        start = time.perf_counter()
+        predict_emissions(reading)
+        timings.append(time.perf_counter() - start)
+    results = {"single_row": summarize(timings), "batch": {}}
+
+    frame = pd.DataFrame(readings)
+    for size in batch_sizes:
+        batch = frame.iloc[np.arange(size) % len(frame)].reset_index(drop=True)
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            predict_emissions_batch(batch)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results["batch"][str(size)] = {
+            "best_ms": round(best * 1000, 4),
+            "rows_per_second": round(size / best),
+        }
+    return results
+
+
+def bench_ingest(app_module, readings):
+    """Per-reading latency and throughput of the ingest path behind save_sensor_data."""
+    timings = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        start_all = time.perf_counter()
+        for reading in readings:
+            start = time.perf_counter()
+            app_module.ingest_reading(dict(reading))
+            timings.append(time.perf_counter() - start)
+        total = time.perf_counter() - start_all
+    results = summarize(timings)
+    results["readings_per_second"] = round(len(readings) / total)
+    return results
+
+
+def bench_endpoint(flask_app, path, clients, requests_per_client):
+    """
+    Latency of one GET endpoint under concurrent clients.
+
+    Each client thread has its own Flask test client and issues requests
+    back to back.
+
+    Returns:
+        dict: Latency statistics plus overall requests per second and errors.
+    """
+    def run_client(_):
+        client = flask_app.test_client()
+        timings, errors = [], 0
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = client.get(path)
+            timings.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+        return timings, errors
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            outcomes = list(pool.map(run_client, range(clients)))
+        wall = time.perf_counter() - start
+
+    timings = [t for client_timings, _ in outcomes for t in client_timings]
+    results = summarize(timings)
+    results["requests_per_second"] = round(len(timings) / wall)
+    results["errors"] = int(sum(errors for _, errors in outcomes))
+    return results
+
+
+def import_profile(module):
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Args:
+        module (str): Dotted module name, e.g. "src.app".
+
+    Returns:
+        dict: total_ms for the import plus self time per top-level package
+        in "packages" (modules of this project are listed one by one, and
+        their time includes running the module body).
+    """
+    package_parent = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_parent, os.getenv("PYTHONPATH")])))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    packages, total = {}, 0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        if name == module:
+            total = int(cumulative_us)
+        key = name if name.startswith("src.") else name.split(".")[0]
+        packages[key] = packages.get(key, 0) + int(self_us)
+    top = sorted(packages.items(), key=lambda item: -item[1])[:IMPORT_TOP]
+    return {"total_ms": round(total / 1000, 2), "packages": {k: round(us / 1000, 2) for k, us in top}}
+
+
+def bench_imports(servers=SERVERS, repeats=IMPORT_REPEATS):
+    """Cold import cost of each server, best of `repeats` fresh interpreters."""
+    return {
+        server: min((import_profile(f"src.{server}") for _ in range(repeats)), key=lambda r: r["total_ms"])
+        for server in servers
+    }
+
+
+def check_import_budget(imports, budget=IMPORT_BUDGET_MS):
+    """
+    Returns:
+        list[tuple]: (server, import ms, budget ms) for every server over budget.
+    """
+    return [(server, result["total_ms"], budget[server]) for server, result in imports.items()
+            if server in budget and result["total_ms"] > budget[server]]
+
+
+def check_import_without_model(servers=SERVERS):
+    """
+    Import every server in a fresh interpreter with a populated store and no
+    trained model. Nothing may load the model or predict at import time.
+
+    Returns:
+        list[tuple]: (server, error) for every server whose import failed.
+    """
+    failures = []
+    with scratch_workdir(share_models=False):
+        seed_store()
+        for server in servers:
+            try:
+                import_profile(f"src.{server}")
+            except RuntimeError as e:
+                failures.append((server, str(e)))
+    return failures
+
+
+def seed_store(rows=SEED_STORE_ROWS, seed=0):
+    """Fill the store of the working directory with synthetic readings ending now."""
+    from src.sensor_buffer import SENSOR_FEATURES
+    from src.sensor_store import SensorStore
+
+    rng = np.random.default_rng(seed)
+    store = SensorStore()
+    values = np.abs(rng.normal(30, 10, size=(rows, len(SENSOR_FEATURES))))
+    store.extend(values, int(time.time()) - 5 * rows + 5 * np.arange(rows))
+    store.close()
+
+
+@contextlib.contextmanager
+def scratch_workdir(share_models=True):
+    """
+    Run inside a temporary working directory that only shares models/ with
+    the real one (or nothing, without `share_models`), so benchmarks never
+    touch the live store, rollups or outbox.
+    """
+    original = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    if share_models and os.path.isdir("models"):
+        os.symlink(os.path.abspath("models"), os.path.join(workdir, "models"))
+    os.chdir(workdir)
+    try:
+        yield workdir
+    finally:
+        os.chdir(original)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_benchmarks(quick=False, seed=42):
+    """
+    Run the whole suite against synthetic readings.
+
+    Args:
+        quick (bool): Use the smaller QUICK sizes.
+        seed (int): Seed for the synthetic readings.
+
+    Returns:
+        dict: Environment description plus results per benchmark.
+    """
+    sizes = QUICK if quick else FULL
+    os.environ.setdefault("ALERT_PROVIDER", "fake")
+    os.environ.setdefault("SUGGESTION_API_URL", "http://127.0.0.1:9/")  # Fails fast, never leaves the host
+
+    report = {
+        "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "quick": quick,
+        "seed": seed,
+        "sizes": sizes,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": {},
+    }
+    results = report["results"]
+
+    with scratch_workdir():
+        seed_store()  # Import and startup costs are measured against a populated store
+        print("⏱️ Server import time...")
+        results["imports"] = {server: {"total_ms": r["total_ms"]} for server, r in bench_imports().items()}
+        results["model_load"] = bench_model_load()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            from src import app as app_module
+            from src import http_server
+            app_module.startup()
+            app_module.rollups_caught_up.wait()
+        readings = synthetic_readings(app_module, sizes["readings"], seed)
+
+        print("⏱️ Prediction latency...")
+        results["predict"] = bench_predict(readings, sizes["batch_sizes"], sizes["batch_repeats"])
+
+        print("⏱️ Ingest throughput...")
+        ingest_readings = synthetic_readings(app_module, sizes["ingest_readings"], seed + 1)
+        results["ingest"] = bench_ingest(app_module, ingest_readings)
+
+        # http_server serves whatever its generator thread last produced
+        latest = dict(readings[-1])
+        latest["Predicted Emissions"] = round(float(app_module.predict_emissions(dict(latest))), 2)
+        http_server.latest_data = latest
+
+        for name, module in (("app", app_module), ("http_server", http_server)):
+            print(f"⏱️ /live-data on {name}.py...")
+            results[f"live_data_{name}"] = {
+                f"{clients}_clients": bench_endpoint(module.app, "/live-data", clients, sizes["requests_per_client"])
+                for clients in sizes["clients"]
+            }
+
+    return report
+
+
+def _metrics(results, prefix=""):
+    """Flatten results into {dotted name: (value, higher_is_better)} for comparable metrics."""
+    metrics = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            metrics.update(_metrics(value, f"{name}."))
+        elif key.endswith("_ms") and key != "max_ms":  # Single worst samples are too noisy to compare
+            metrics[name] = (value, False)
+        elif key.endswith("per_second"):
+            metrics[name] = (value, True)
+    return metrics
+
+
+def compare(report, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compare a report with a baseline report.
+
+    Args:
+        report (dict): Current results.
+        baseline (dict): Earlier results.
+        tolerance (float): Relative change treated as noise.
+
+    Returns:
+        list[tuple]: (metric, baseline, current, relative change) for every regression.
+    """
+    current = _metrics(report["results"])
+    regressions = []
+    for name, (old, higher_is_better) in _metrics(baseline["results"]).items():
+        if name not in current or not old:
+            continue
+        new = current[name][0]
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        if worse > tolerance:
+            regressions.append((name, old, new, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark prediction, ingest and HTTP endpoints.")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast check")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="Result file (default: data/benchmarks/bench_<time>.json)")
+    parser.add_argument("--compare", help="Baseline result file to check for regressions")
+    parser.add_argument("--imports", action="store_true",
+                        help="Only report per-package import cost of each server, check IMPORT_BUDGET_MS "
+                             "and check that every server imports with stored data and no model")
+    args = parser.parse_args()
+
+    if args.imports:
+        os.environ.setdefault("ALERT_PROVIDER", "fake")
+        with scratch_workdir():
+            seed_store()
+            imports = bench_imports()
+        for server, result in imports.items():
+            print(f"📊 {server}: {result['total_ms']} ms (budget {IMPORT_BUDGET_MS[server]} ms)")
+            for package, ms in result["packages"].items():
+                print(f"  {package}: {ms} ms")
+        over = check_import_budget(imports)
+        for server, ms, budget in over:
+            print(f"⚠️ {server} imports in {ms} ms, over its {budget} ms budget")
+        failed = check_import_without_model()
+        for server, error in failed:
+            print(f"❌ {server} fails to import with stored data and no model: {error}")
+        if over or failed:
+            sys.exit(1)
+        print("✅ Every server imports within budget, and without a model")
+        sys.exit(0)
+
+    report = run_benchmarks(args.quick, args.seed)
+    out = args.out or os.path.join(BENCHMARK_DIR, f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    results = report["results"]
+    print(f"📊 predict single row: p50 {results['predict']['single_row']['p50_ms']} ms, "
+          f"p99 {results['predict']['single_row']['p99_ms']} ms")
+    for size, batch in results["predict"]["batch"].items():
+        print(f"📊 predict batch of {size}: {batch['rows_per_second']:,} rows/s")
+    print(f"📊 ingest: {results['ingest']['readings_per_second']:,} readings/s")
+    for name in ("live_data_app", "live_data_http_server"):
+        for clients, stats in results[name].items():
+            print(f"📊 {name} with {clients}: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms, "
+                  f"{stats['requests_per_second']:,} req/s")
+    print(f"✅ Results saved at: {out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f))
+        for name, old, new, change in regressions:
+            print(f"⚠️ Regression in {name}: {old} -> {new} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against the baseline")
@@ -0,0 +1,120 @@
+import json
+import threading
+from collections import deque
+
+from flask import Response
+
+STREAM_QUEUE_SIZE = 4  # Frames buffered per client before the oldest are dropped
+HEARTBEAT_INTERVAL = 15  # Seconds between keep-alive comments on an idle stream
+
+
+class Subscriber:
+    """
+    One connected client. Frames wait in a short bounded deque; when a slow
+    client falls behind, the oldest (stale) frames are dropped instead of
+    blocking the producer or growing memory.
+    """
+
+    def __init__(self, queue_size=STREAM_QUEUE_SIZE):
+        self.frames = deque(maxlen=queue_size)
+        self.dropped = 0
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+
+    def push(self, frame):
+        with self._lock:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped += 1
+            self.frames.append(frame)
+        self._event.set()
+
+    def drain(self, timeout):
+        """Wait up to `timeout` seconds for frames and return all that are queued."""
+        self._event.wait(timeout)
+        with self._lock:
+            self._event.clear()
+            frames = list(self.frames)
+            self.frames.clear()
+        return frames
+
+
+class Broadcaster:
+    """
+    Fan-out of producer updates to every /stream subscriber. Each update is
+    serialized once, however many clients are connected.
+    """
+
+    def __init__(self, queue_size=STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._last_frame = None
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def publish(self, payload):
+        """
+        Serialize a payload once as a Server-Sent Events frame and queue it for
+        every subscriber.
+
+        Args:
+            payload (dict): JSON-serializable update.
+        """
+        with self._lock:
+            self._sequence += 1
+            frame = f"id: {self._sequence}\ndata: {json.dumps(payload, default=float)}\n\n"
+            self._last_frame = frame
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(frame)
+
+    def subscribe(self):
+        subscriber = Subscriber(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._last_frame:
+                subscriber.push(self._last_frame)  # New clients start from the latest state
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stream(self, heartbeat=HEARTBEAT_INTERVAL):
+        """
+        Generator of Server-Sent Events for one client, suitable for a Flask
+        streaming response.
+
+        Args:
+            heartbeat (int): Seconds between keep-alive comments when idle.
+        """
+        subscriber = self.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                frames = subscriber.drain(heartbeat)
+                if frames:
+                    yield "".join(frames)
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def sse_response(broadcaster):
+    """
+    Build the Flask response for a /stream endpoint.
+
+    Args:
+        broadcaster (Broadcaster): Source of frames.
+
+    Returns:
+        flask.Response: A text/event-stream response.
+    """
+    return Response(
+        broadcaster.stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
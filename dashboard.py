@@ -1,21 +1,55 @@
-from flask import Flask, render_template_string, jsonify
-import pandas as pd
+from flask import Flask, render_template_string, jsonify, request
 import os
-import plotly.graph_objs as go
+import threading
+from collections import deque
 from datetime import datetime
-from src.predict import predict_emissions
+from functools import lru_cache
+from src.predict import predict_emissions, predict_emissions_batch
+from src.sensor_buffer import sensor_buffer
+from src.sensor_store import sensor_store
+from src.rules import GOV_LIMITS, GOV_LIMIT_RULES, RuleEngine
+from src.telemetry import instrument_flask
+from src.response_cache import ResponseCache
 
 app = Flask(__name__)
+instrument_flask(app)
 
-GOV_LIMITS = {
-    "PM2.5 (ug/m3)": 60,
-    "PM10 (ug/m3)": 100,
-    "NOx (ppb)": 40,
-    "SO2 (ug/m3)": 50,
-    "CO (mg/m3)": 4
-}
+# A gas triggers its suggestion after 5 readings in a row over its limit
+gov_rules = RuleEngine(GOV_LIMIT_RULES)
+gov_status = {gas: {"exceeded": False, "fired": False} for gas in GOV_LIMITS}
+gov_version = 0
+gov_lock = threading.Lock()
+
+startup_lock = threading.Lock()
+started_up = False
+
+def startup():
+    """
+    Warm-start the buffer from the tail of the store; new rows are then
+    picked up incrementally. Called by the first request rather than at
+    import, so importing the dashboard does not read the store.
+    """
+    global started_up
+    with startup_lock:
+        if started_up:
+            return
+        sensor_buffer.warm_start(sensor_store)
+        started_up = True
 
-warning_counter = {gas: 0 for gas in GOV_LIMITS}
+@app.before_request
+def ensure_started():
+    if not started_up:
+        startup()
+
+def update_gov_status():
+    # Evaluate only the readings that arrived since the last check
+    global gov_version
+    with gov_lock:
+        new_rows, gov_version = sensor_buffer.since(gov_version, limit=sensor_buffer.capacity)
+        if len(new_rows):
+            for gas, result in gov_rules.evaluate(new_rows).items():
+                gov_status[gas] = {"exceeded": bool(result["exceeded"][-1]), "fired": bool(result["fired"][-1])}
+        return dict(gov_status)
 
 suggestions = {
     "PM2.5 (ug/m3)": "Improve dust collection filters",
@@ -27,47 +61,50 @@ suggestions = {
 
 def load_sensor_data():
     try:
-        sensor_data = pd.read_csv("data/raw/sensor_data.csv")
-        return sensor_data.tail(10)
+        sensor_buffer.refresh(sensor_store)
+        return sensor_buffer.tail(10)
     except Exception as e:
         return str(e)
 
+DEFAULT_VALUES = {
+    "NO (ug/m3)": 20, "NO2 (ug/m3)": 15, "NH3 (ug/m3)": 5,
+    "Ozone (ug/m3)": 25, "Benzene (ug/m3)": 0.2, "Toluene (ug/m3)": 0.3,
+    "Temp (degree C)": 32, "RH (%)": 60, "WS (m/s)": 3, "WD (deg)": 270,
+    "SR (W/mt2)": 150, "BP (mmHg)": 1015, "VWS (m/s)": 2, "Xylene (ug/m3)": 0.4,
+    "RF (mm)": 1, "AT (degree C)": 33
+}
+
 def generate_full_input(row):
-    default_values = {
-        "NO (ug/m3)": 20, "NO2 (ug/m3)": 15, "NH3 (ug/m3)": 5,
-        "Ozone (ug/m3)": 25, "Benzene (ug/m3)": 0.2, "Toluene (ug/m3)": 0.3,
-        "Temp (degree C)": 32, "RH (%)": 60, "WS (m/s)": 3, "WD (deg)": 270,
-        "SR (W/mt2)": 150, "BP (mmHg)": 1015, "VWS (m/s)": 2, "Xylene (ug/m3)": 0.4,
-        "RF (mm)": 1, "AT (degree C)": 33
-    }
+    import pandas as pd  # Deferred: pandas is only loaded once a frame is built
+
     row = row.copy()
-    for k, v in default_values.items():
+    for k, v in DEFAULT_VALUES.items():
         if k not in row or pd.isnull(row[k]):
             row[k] = v
     if "From Date" not in row or pd.isnull(row["From Date"]):
         row["From Date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     return row
 
+def generate_full_frame(df):
+    df = df.copy()
+    for k, v in DEFAULT_VALUES.items():
+        df[k] = df[k].fillna(v) if k in df.columns else v
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    df["From Date"] = df["From Date"].fillna(now) if "From Date" in df.columns else now
+    return df
+
 def predict_from_sensor():
+    import pandas as pd
+
     try:
-        df = pd.read_csv("data/raw/sensor_data.csv")
-        latest_row = df.iloc[-1]
+        sensor_buffer.refresh(sensor_store)
+        latest_row = pd.Series(sensor_buffer.latest())
         input_data = generate_full_input(latest_row)
         emission_value = predict_emissions(input_data)
 
-        exceeded = {}
-        suggestions_triggered = []
-
-        for gas in GOV_LIMITS:
-            value = latest_row.get(gas)
-            if pd.notnull(value) and value > GOV_LIMITS[gas]:
-                warning_counter[gas] += 1
-                exceeded[gas] = value
-
-                if warning_counter[gas] >= 5:
-                    suggestions_triggered.append((gas, suggestions[gas]))
-            else:
-                warning_counter[gas] = 0
+        status = update_gov_status()
+        exceeded = {gas: latest_row[gas] for gas in GOV_LIMITS if status[gas]["exceeded"]}
+        suggestions_triggered = [(gas, suggestions[gas]) for gas in GOV_LIMITS if status[gas]["fired"]]
 
         return {
             "predicted_emission": round(emission_value, 2),
@@ -80,7 +117,14 @@ def predict_from_sensor():
 def generate_bar_chart(values_dict):
     if not values_dict:
         return "<p>No gases exceeded the limits.</p>"
-    bars = go.Bar(x=list(values_dict.keys()), y=list(values_dict.values()), marker_color='indianred')
+    return _bar_chart_html(tuple(values_dict.items()))
+
+@lru_cache(maxsize=32)
+def _bar_chart_html(items):
+    # Same exceeded values -> same figure, so the HTML is rendered once per distinct set
+    import plotly.graph_objs as go  # Deferred: Plotly is only loaded once a chart is drawn
+
+    bars = go.Bar(x=[k for k, _ in items], y=[v for _, v in items], marker_color='indianred')
     layout = go.Layout(
         title='Exceeded Gases vs Limits',
         xaxis=dict(title='Gas'),
@@ -90,34 +134,124 @@ def generate_bar_chart(values_dict):
     fig = go.Figure(data=[bars], layout=layout)
     return fig.to_html(full_html=False)
 
+TREND_POINTS = 20
+
+class TrendCache:
+    """
+    Predicted emission trend, updated incrementally from the sensor buffer.
+
+    Only readings appended since the last update are predicted. Points are
+    tagged with the buffer version they arrived at, so clients can ask for
+    the points after the version they already have (a JSON delta) instead
+    of the whole figure. The figure HTML is rendered at most once per version.
+    """
+
+    def __init__(self, buffer, points=TREND_POINTS):
+        self.buffer = buffer
+        self.points = deque(maxlen=points)  # (version, timestamp, emission)
+        self.version = 0
+        self._html = None
+        self._html_version = None
+        self._lock = threading.Lock()
+
+    def update(self):
+        """Predict readings appended since the last update; returns the current version."""
+        with self._lock:
+            if self.buffer.version == self.version:
+                return self.version
+            new_rows, version = self.buffer.since(self.version, limit=self.points.maxlen)
+            if len(new_rows):
+                emissions = predict_emissions_batch(generate_full_frame(new_rows))
+                first = version - len(new_rows) + 1
+                for i, (stamp, emission) in enumerate(zip(new_rows["Timestamp"], emissions)):
+                    self.points.append((first + i, stamp, round(float(emission), 2)))
+            self.version = version
+            return version
+
+    def delta(self, since=None):
+        """
+        Points appended after version `since`.
+
+        Args:
+            since (int | None): Version the client already has.
+
+        Returns:
+            dict: {"version", "reset", "x", "y"}. "reset" means the client is
+            too far behind (or new) and should replace its series.
+        """
+        self.update()
+        with self._lock:
+            points = list(self.points)
+            version = self.version
+        oldest = points[0][0] if points else version + 1
+        reset = since is None or since < oldest - 1 or since > version
+        if not reset:
+            points = [p for p in points if p[0] > since]
+        return {
+            "version": version,
+            "reset": reset,
+            "x": [p[1] for p in points],
+            "y": [p[2] for p in points],
+        }
+
+    def html(self):
+        """Full figure HTML, re-rendered only when new points arrived."""
+        version = self.update()
+        with self._lock:
+            if self._html_version != version:
+                import plotly.graph_objs as go
+
+                line = go.Scatter(
+                    x=[p[1] for p in self.points], y=[p[2] for p in self.points],
+                    mode='lines+markers', name='Emission Trend'
+                )
+                layout = go.Layout(title='Predicted Emission Trend', xaxis_title='Time', yaxis_title='Emission Value')
+                self._html = go.Figure(data=[line], layout=layout).to_html(full_html=False)
+                self._html_version = version
+            return self._html
+
+trend_cache = TrendCache(sensor_buffer)
+
 def generate_trend_chart():
     try:
-        df = pd.read_csv("data/raw/sensor_data.csv")
-        recent = df.tail(20)
-        emissions = []
-        timestamps = []
-
-        for _, row in recent.iterrows():
-            input_data = generate_full_input(row)
-            pred = predict_emissions(input_data)
-            emissions.append(round(pred, 2))
-            timestamps.append(row.get("From Date", datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-
-        line = go.Scatter(x=timestamps, y=emissions, mode='lines+markers', name='Emission Trend')
-        layout = go.Layout(title='Predicted Emission Trend', xaxis_title='Time', yaxis_title='Emission Value')
-        fig = go.Figure(data=[line], layout=layout)
-        return fig.to_html(full_html=False)
+        sensor_buffer.refresh(sensor_store)
+        return trend_cache.html()
     except Exception as e:
         return f"<p>Trend chart error: {e}</p>"
 
+# Rebuilt only when the buffer picked up new readings from the store
+index_cache = ResponseCache()
+
 @app.route('/')
 def index():
-    sensor_data = load_sensor_data()
-    prediction = predict_from_sensor()
-    return jsonify(
-        sensor_data=sensor_data.to_dict(orient='records') if isinstance(sensor_data, pd.DataFrame) else sensor_data,
-        prediction=prediction
-    )
+    def build():
+        import pandas as pd
+
+        sensor_data = load_sensor_data()
+        prediction = predict_from_sensor()
+        return dict(
+            sensor_data=sensor_data.to_dict(orient='records') if isinstance(sensor_data, pd.DataFrame) else sensor_data,
+            prediction=prediction
+        )
+
+    try:
+        sensor_buffer.refresh(sensor_store)
+    except Exception:
+        pass  # build() reports the error in the body
+    # Error strings are not cached, so a failed poll is retried
+    return index_cache.respond("index", sensor_buffer.version, build,
+                               cacheable=lambda payload: not isinstance(payload["prediction"], str))
+
+@app.route('/trend')
+def trend():
+    # Clients send the last version they have and extend their series with the delta
+    try:
+        sensor_buffer.refresh(sensor_store)
+        since = request.args.get("since", type=int)
+        return jsonify(trend_cache.delta(since))
+    except Exception as e:
+        return jsonify(error=str(e)), 500
 
 if __name__ == '__main__':
+    startup()
     app.run(debug=True, port=5002)
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+DATA_PATH = "data/processed/emissions_data.csv"
+CHUNK_ROWS = 100000
+HOLDOUT_FRACTION = 0.2
+MAX_HOLDOUT_ROWS = 50000
+
+# Auto-generated target: sum of major gas emissions
+TARGET_GAS_COLUMNS = ["NO2 (ug/m3)", "CO (mg/m3)", "SO2 (ug/m3)", "PM10 (ug/m3)"]
+
+
+def make_target(df):
+    """
+    Compute the auto-generated training target (sum of major gas emissions).
+
+    Args:
+        df (pd.DataFrame): Numeric sensor frame.
+
+    Returns:
+        pd.Series: Target values.
+    """
+    missing_gases = [col for col in TARGET_GAS_COLUMNS if col not in df.columns]
+    if missing_gases:
+        raise ValueError(f"❌ Cannot generate 'target'. Missing columns: {missing_gases}")
+    return df[TARGET_GAS_COLUMNS].sum(axis=1)
+
+
+def plan_dtypes(path, sample_rows=1000):
+    """
+    Decide a float32 dtype for every column that parses as numeric in the
+    first rows; other columns (e.g. dates) are read as text and coerced.
+
+    Args:
+        path (str): Path of the training CSV.
+        sample_rows (int): Rows inspected.
+
+    Returns:
+        tuple: (stripped column names, {raw column name: dtype}).
+    """
+    sample = pd.read_csv(path, nrows=sample_rows)
+    dtypes = {
+        column: (np.float32 if pd.api.types.is_numeric_dtype(sample[column]) else object)
+        for column in sample.columns
+    }
+    return [c.strip() for c in sample.columns], dtypes
+
+
+def iter_training_chunks(path=DATA_PATH, chunk_rows=CHUNK_ROWS):
+    """
+    Stream the training CSV as cleaned float32 chunks.
+
+    Each chunk is forward-filled, and the last valid value of every column is
+    carried into the next chunk, so the result matches a whole-file ffill.
+    Backward fill only covers gaps before the first value inside the first
+    chunk. Columns that are not numeric in the first rows are coerced to NaN.
+
+    Args:
+        path (str): Path of the training CSV.
+        chunk_rows (int): Rows per chunk.
+
+    Yields:
+        pd.DataFrame: float32 chunk with a "target" column.
+    """
+    columns, dtypes = plan_dtypes(path)
+    carry = None
+    first = True
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=dtypes):
+        chunk.columns = columns
+        for column in chunk.columns[chunk.dtypes == object]:
+            chunk[column] = pd.to_numeric(chunk[column], errors="coerce")
+        chunk = chunk.astype(np.float32)
+
+        # ✅ Forward fill, seeded with the values carried over from the previous chunk
+        if carry is not None:
+            chunk.iloc[0] = chunk.iloc[0].fillna(carry)
+        chunk.ffill(inplace=True)
+        if first:
+            chunk.bfill(inplace=True)
+            first = False
+        last = chunk.iloc[-1]
+        carry = last if carry is None else last.fillna(carry)
+
+        if "target" not in chunk.columns:
+            chunk["target"] = make_target(chunk).astype(np.float32)
+        yield chunk
+
+
+def count_rows(path=DATA_PATH, block_size=1 << 20):
+    """
+    Count data rows by scanning newlines in fixed-size blocks.
+
+    Args:
+        path (str): Path of the training CSV.
+        block_size (int): Bytes read at a time.
+
+    Returns:
+        int: Number of rows after the header.
+    """
+    lines = 0
+    last = b"\n"
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def train_out_of_core(model, path=DATA_PATH, chunk_rows=CHUNK_ROWS, n_estimators=100,
+                      holdout_fraction=HOLDOUT_FRACTION, max_holdout_rows=MAX_HOLDOUT_ROWS):
+    """
+    Grow a warm-start forest chunk by chunk, so only one chunk is in memory.
+
+    The tree budget is spread over the chunks: each chunk fits its share of
+    new trees. When there are more chunks than trees, evenly spaced chunks
+    are used. The tail of every chunk is held out for evaluation, up to
+    max_holdout_rows rows.
+
+    Args:
+        model (RandomForestRegressor | ExtraTreesRegressor): Unfitted forest.
+        path (str): Path of the training CSV.
+        chunk_rows (int): Rows per chunk.
+        n_estimators (int): Total trees to grow.
+        holdout_fraction (float): Share of each chunk held out.
+        max_holdout_rows (int): Cap on held-out rows kept in memory.
+
+    Returns:
+        tuple: (fitted model, holdout X, holdout y).
+    """
+    n_chunks = max(-(-count_rows(path) // chunk_rows), 1)
+    stride = max(-(-n_chunks // n_estimators), 1)
+    used_chunks = -(-n_chunks // stride)
+    model.set_params(warm_start=True, n_estimators=0)
+
+    holdout = []
+    holdout_rows = 0
+    grown = 0
+    for i, chunk in enumerate(iter_training_chunks(path, chunk_rows)):
+        split = int(len(chunk) * (1 - holdout_fraction))
+        if holdout_rows < max_holdout_rows:
+            tail = chunk.iloc[split:].iloc[:max_holdout_rows - holdout_rows]
+            holdout.append(tail)
+            holdout_rows += len(tail)
+        if i % stride:
+            continue
+
+        # ✅ Trees for this chunk: an even share of what is left of the budget
+        remaining_chunks = max(used_chunks - i // stride, 1)
+        trees = max(-(-(n_estimators - grown) // remaining_chunks), 1)
+        train = chunk.iloc[:split]
+        model.set_params(n_estimators=grown + trees)
+        model.fit(train.drop(columns=["target"]), train["target"])
+        grown += trees
+        print(f"🌲 Chunk {i + 1}/{n_chunks}: {len(train)} rows, {grown} trees")
+
+    model.set_params(warm_start=False)
+    holdout = pd.concat(holdout) if holdout else pd.DataFrame()
+    return model, holdout.drop(columns=["target"]), holdout["target"]
@@ -0,0 +1,220 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.sensor_buffer import SENSOR_FEATURES
+
+# ✅ (mean, standard deviation) per sensor, shared with app.generate_sensor_data
+BASE_VALUES = {
+    "PM2.5 (ug/m3)": (30, 10),
+    "PM10 (ug/m3)": (70, 20),
+    "NO (ug/m3)": (20, 5),
+    "NO2 (ug/m3)": (15, 4),
+    "NOx (ppb)": (25, 8),
+    "NH3 (ug/m3)": (5, 1.5),
+    "SO2 (ug/m3)": (30, 6),
+    "CO (mg/m3)": (2.5, 0.5),
+    "Ozone (ug/m3)": (25, 5),
+    "Benzene (ug/m3)": (0.2, 0.05),
+    "Toluene (ug/m3)": (0.3, 0.07),
+    "Temp (degree C)": (32, 2),
+    "RH (%)": (60, 5),
+    "WS (m/s)": (3, 0.5),
+    "WD (deg)": (270, 10),
+    "SR (W/mt2)": (150, 20),
+    "BP (mmHg)": (1015, 10),
+    "VWS (m/s)": (2, 0.5),
+    "Xylene (ug/m3)": (0.4, 0.1),
+    "RF (mm)": (1, 0.2),
+    "AT (degree C)": (33, 2),
+}
+
+# Gases driven by the same combustion process move together
+COMBUSTION_GASES = [
+    "PM2.5 (ug/m3)", "PM10 (ug/m3)", "NO (ug/m3)", "NO2 (ug/m3)", "NOx (ppb)",
+    "SO2 (ug/m3)", "CO (mg/m3)", "Benzene (ug/m3)", "Toluene (ug/m3)", "Xylene (ug/m3)",
+]
+GAS_CORRELATION = 0.6
+PERSISTENCE = 0.8  # AR(1) coefficient of each plant's deviation between steps
+
+# What-if controls: which sensors each control input scales
+CONTROL_EFFECTS = {
+    "production_rate": COMBUSTION_GASES,
+    "scrubber_efficiency": ["PM2.5 (ug/m3)", "PM10 (ug/m3)", "SO2 (ug/m3)"],
+    "combustion_efficiency": ["NO (ug/m3)", "NO2 (ug/m3)", "NOx (ppb)", "CO (mg/m3)"],
+}
+
+
+def hour_multiplier(hours):
+    """
+    Time-of-day load multiplier used by the simulators.
+
+    Args:
+        hours (int | np.ndarray): Hour of day, 0-23.
+
+    Returns:
+        float | np.ndarray: 1.3 in the morning peak, 0.8 midday, 1.5 in the
+        evening peak and 0.7 overnight.
+    """
+    hours = np.asarray(hours)
+    multiplier = np.select(
+        [(6 <= hours) & (hours < 10), (10 <= hours) & (hours < 16), (16 <= hours) & (hours < 20)],
+        [1.3, 0.8, 1.5],
+        default=0.7,
+    )
+    return multiplier if multiplier.ndim else float(multiplier)
+
+
+class DigitalTwin:
+    """
+    Vectorized simulator of a fleet of plants.
+
+    Every step produces an (n_plants, features) array in one shot. Each plant
+    has its own size factor and time zone offset (in hours); combustion gases
+    share a correlated noise factor with AR(1) persistence between steps.
+    Control inputs (arrays of length n_plants) change plant behaviour for
+    what-if runs:
+
+    - production_rate: scales combustion gases (1.0 = nominal)
+    - scrubber_efficiency: fraction of particulates and SO2 removed
+    - combustion_efficiency: fraction of NOx and CO removed
+    """
+
+    def __init__(self, n_plants, seed=None, hour_offsets=None, **controls):
+        self.n_plants = n_plants
+        self.features = list(SENSOR_FEATURES)
+        self.rng = np.random.default_rng(seed)
+
+        self.mu = np.array([BASE_VALUES[f][0] for f in self.features], dtype=np.float64)
+        self.sigma = np.array([BASE_VALUES[f][1] for f in self.features], dtype=np.float64)
+        self.gas_mask = np.isin(self.features, COMBUSTION_GASES)
+
+        # Plant heterogeneity: bigger plants emit more
+        self.plant_scale = np.ones((n_plants, len(self.features)))
+        self.plant_scale[:, self.gas_mask] = self.rng.lognormal(0, 0.25, size=(n_plants, 1))
+        self.hour_offsets = np.zeros(n_plants) if hour_offsets is None else np.asarray(hour_offsets)
+
+        corr = np.eye(len(self.features))
+        gas_idx = np.flatnonzero(self.gas_mask)
+        corr[np.ix_(gas_idx, gas_idx)] = GAS_CORRELATION
+        corr[gas_idx, gas_idx] = 1.0
+        self._cholesky = np.linalg.cholesky(corr)
+        self._deviation = self.rng.standard_normal((n_plants, len(self.features))) @ self._cholesky.T
+
+        self.controls = {name: np.full(n_plants, 1.0 if name == "production_rate" else 0.0)
+                         for name in CONTROL_EFFECTS}
+        self.set_controls(**controls)
+
+    def set_controls(self, **controls):
+        """
+        Update what-if control inputs for every plant (scalars broadcast).
+
+        Args:
+            **controls: Any of production_rate, scrubber_efficiency, combustion_efficiency.
+        """
+        for name, value in controls.items():
+            if name not in CONTROL_EFFECTS:
+                raise ValueError(f"❌ Unknown control '{name}'. Use one of {list(CONTROL_EFFECTS)}")
+            self.controls[name] = np.broadcast_to(np.asarray(value, dtype=np.float64), (self.n_plants,)).copy()
+
+    def _control_factor(self):
+        factor = np.ones((self.n_plants, len(self.features)))
+        for name, sensors in CONTROL_EFFECTS.items():
+            mask = np.isin(self.features, sensors)
+            value = self.controls[name][:, None]
+            factor[:, mask] *= value if name == "production_rate" else (1 - value)
+        return factor
+
+    def step(self, when):
+        """
+        Simulate one reading for every plant.
+
+        Args:
+            when (datetime): Simulated wall-clock time of the step.
+
+        Returns:
+            np.ndarray: (n_plants, features) non-negative readings.
+        """
+        shock = self.rng.standard_normal((self.n_plants, len(self.features))) @ self._cholesky.T
+        self._deviation = PERSISTENCE * self._deviation + np.sqrt(1 - PERSISTENCE ** 2) * shock
+
+        hours = (when.hour + self.hour_offsets).astype(int) % 24
+        mean = self.mu * hour_multiplier(hours)[:, None] * self.plant_scale * self._control_factor()
+        return np.maximum(0, mean + self.sigma * self._deviation)
+
+    def run(self, steps, start=None, interval=5, predict=None, sink=None):
+        """
+        Simulate `steps` ticks and score each with one batched prediction.
+
+        Args:
+            steps (int): Number of ticks.
+            start (datetime | None): Time of the first tick; defaults to now.
+            interval (int): Seconds between ticks.
+            predict (callable | None): Batched predictor (defaults to
+                predict.predict_emissions_batch).
+            sink (callable | None): Called as sink(timestamp, values, emissions)
+                per tick, e.g. to drive the ingest or alerting path.
+
+        Returns:
+            dict: "timestamps" (steps,), "emissions" (steps, n_plants) and
+            throughput statistics.
+        """
+        if predict is None:
+            from src.predict import predict_emissions_batch as predict
+
+        start = start or datetime.now()
+        start_epoch = int(start.timestamp())
+        timestamps = start_epoch + interval * np.arange(steps)
+        emissions = np.empty((steps, self.n_plants))
+
+        simulate_seconds = score_seconds = 0.0
+        for i, epoch in enumerate(timestamps):
+            t0 = time.perf_counter()
+            values = self.step(datetime.fromtimestamp(int(epoch)))
+            t1 = time.perf_counter()
+            emissions[i] = predict(values)
+            t2 = time.perf_counter()
+            simulate_seconds += t1 - t0
+            score_seconds += t2 - t1
+            if sink is not None:
+                sink(int(epoch), values, emissions[i])
+
+        rows = steps * self.n_plants
+        return {
+            "timestamps": timestamps,
+            "emissions": emissions,
+            "rows": rows,
+            "simulate_rows_per_second": rows / simulate_seconds if simulate_seconds else float("inf"),
+            "score_rows_per_second": rows / score_seconds if score_seconds else float("inf"),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate a fleet of plants and score every step.")
+    parser.add_argument("--plants", type=int, default=1000)
+    parser.add_argument("--steps", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--production-rate", type=float, default=1.0)
+    parser.add_argument("--scrubber-efficiency", type=float, default=0.0)
+    parser.add_argument("--combustion-efficiency", type=float, default=0.0)
+    parser.add_argument("--threshold", type=float, default=45, help="SOS emission threshold")
+    args = parser.parse_args()
+
+    twin = DigitalTwin(
+        args.plants, seed=args.seed,
+        production_rate=args.production_rate,
+        scrubber_efficiency=args.scrubber_efficiency,
+        combustion_efficiency=args.combustion_efficiency,
+    )
+    result = twin.run(args.steps)
+    exceeded = (result["emissions"] >= args.threshold).mean()
+    print(f"🏭 Simulated {result['rows']} readings ({args.plants} plants x {args.steps} steps)")
+    print(f"⚡ Simulation: {result['simulate_rows_per_second']:,.0f} rows/s, "
+          f"scoring: {result['score_rows_per_second']:,.0f} rows/s")
+    print(f"🌿 Mean emission {result['emissions'].mean():.2f}, "
+          f"{exceeded:.1%} of readings at or above {args.threshold}")
@@ -0,0 +1,248 @@
+import os
+import sys
+import threading
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.rules import DEFAULT_STATION
+from src.sensor_buffer import SENSOR_FEATURES, utc_offset
+
+READING_INTERVAL = 5  # Seconds between readings; windows below are counted in readings
+READINGS_PER_MINUTE = 60 // READING_INTERVAL
+
+# Sensors that get temporal features: the gases behind the emission target and SOS alerts
+TEMPORAL_FEATURES = [
+    "PM2.5 (ug/m3)", "PM10 (ug/m3)", "NO2 (ug/m3)", "NOx (ppb)", "SO2 (ug/m3)", "CO (mg/m3)"
+]
+LAGS = (1, 12, 60)  # Value 5s, 1 minute and 5 minutes ago
+ROLLING_WINDOWS = (12, 60, 180)  # Mean and slope over the last 1, 5 and 15 minutes
+HISTORY_ROWS = max(max(LAGS) + 1, max(ROLLING_WINDOWS))  # Readings of history a row depends on
+FEATURE_BLOCK_ROWS = 4096  # Rows per vectorized block; bounds the window views in memory
+
+
+def feature_names(features=SENSOR_FEATURES, temporal=TEMPORAL_FEATURES):
+    """
+    Model input columns, in order: the raw readings, time of day, then lags,
+    rolling means and slopes (per minute) of each temporal sensor.
+
+    Returns:
+        list[str]: Column names.
+    """
+    names = list(features) + ["hour_sin", "hour_cos"]
+    for feature in temporal:
+        names += [f"{feature} lag {k}" for k in LAGS]
+        names += [f"{feature} mean {w}" for w in ROLLING_WINDOWS]
+        names += [f"{feature} slope {w}" for w in ROLLING_WINDOWS]
+    return names
+
+
+FEATURE_NAMES = feature_names()
+
+
+def _slope_denominator(window):
+    # Sum of squared deviations of the positions 0..window-1 from their mean
+    return window * (window ** 2 - 1) / 12
+
+
+def _slope_weights(window):
+    # Least-squares slope over positions 0..window-1, per reading
+    return (np.arange(window) - (window - 1) / 2) / _slope_denominator(window)
+
+
+def _time_of_day(timestamps):
+    # Local time of day replaces the placeholder "From Date"
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    angle = 2 * np.pi * ((timestamps + utc_offset(timestamps)) % 86400) / 86400
+    return np.sin(angle), np.cos(angle)
+
+
+def build_features(values, timestamps, history=None, features=SENSOR_FEATURES, temporal=TEMPORAL_FEATURES):
+    """
+    Compute model features for a series of readings with vectorized NumPy.
+
+    This is the offline form used for training; FeaturePipeline produces the
+    same values one reading at a time. Readings before the start of the
+    series repeat the first reading, unless `history` provides them.
+
+    Args:
+        values (np.ndarray): (rows, features) sensor values, oldest first.
+        timestamps (np.ndarray): Epoch seconds, one per row.
+        history (np.ndarray | None): (HISTORY_ROWS, temporal) values of the
+            temporal sensors just before the series, oldest first.
+        features (list[str]): Column order of `values`.
+        temporal (list[str]): Sensors that get lags, rolling means and slopes.
+
+    Returns:
+        np.ndarray: (rows, len(FEATURE_NAMES)) float64 features.
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(-1, len(features))
+    n = len(values)
+    series = values[:, [features.index(f) for f in temporal]]
+    if history is None:
+        history = np.repeat(series[:1], HISTORY_ROWS, axis=0)
+    series = np.concatenate([np.asarray(history, dtype=np.float64)[-HISTORY_ROWS:], series])
+
+    per_feature = len(LAGS) + 2 * len(ROLLING_WINDOWS)
+    out = np.empty((n, len(features) + 2 + len(temporal) * per_feature))
+    out[:, :len(features)] = values
+    out[:, len(features)], out[:, len(features) + 1] = _time_of_day(timestamps)
+
+    # Column j of the temporal block belongs to sensor j // per_feature
+    temporal_out = out[:, len(features) + 2:].reshape(n, len(temporal), per_feature)
+    weights = {w: _slope_weights(w) * READINGS_PER_MINUTE for w in ROLLING_WINDOWS}
+    for start in range(0, n, FEATURE_BLOCK_ROWS):
+        stop = min(start + FEATURE_BLOCK_ROWS, n)
+        rows = np.arange(start, stop) + HISTORY_ROWS  # Positions in `series`
+        block = temporal_out[start:stop]
+        for i, k in enumerate(LAGS):
+            block[:, :, i] = series[rows - k]
+        for i, w in enumerate(ROLLING_WINDOWS):
+            # windows[r, f] holds the w readings ending at row r, oldest first
+            windows = sliding_window_view(series[rows[0] - w + 1:rows[-1] + 1], w, axis=0)
+            block[:, :, len(LAGS) + i] = windows.mean(axis=-1)
+            block[:, :, len(LAGS) + len(ROLLING_WINDOWS) + i] = windows @ weights[w]
+    return out
+
+
+class FeaturePipeline:
+    """
+    Streaming form of build_features, with state per station.
+
+    Each station keeps a ring of its last HISTORY_ROWS temporal readings and,
+    per rolling window, the running sum and position-weighted sum of the
+    readings inside it. A new reading updates both sums in place (the oldest
+    reading leaves, the others shift one position), so a reading costs the
+    same however long the windows are. The sums are recomputed from the ring
+    every time it wraps, which keeps rounding error from accumulating.
+    Batches go through build_features seeded with the ring, so a batch and
+    the same readings one at a time give the same features.
+    """
+
+    def __init__(self, features=SENSOR_FEATURES, temporal=TEMPORAL_FEATURES):
+        self.features = list(features)
+        self.temporal = list(temporal)
+        self.columns = [self.features.index(f) for f in self.temporal]
+        self.names = feature_names(self.features, self.temporal)
+        self._states = {}
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def _state(self, ring, count):
+        # Sums of every window over the ring, oldest slot at index 0
+        state = {"ring": ring, "next": 0, "count": count, "sum": {}, "weighted": {}}
+        for w in ROLLING_WINDOWS:
+            window = ring[-w:]
+            state["sum"][w] = window.sum(axis=0)
+            state["weighted"][w] = np.arange(w) @ window
+        return state
+
+    def _step(self, values, epoch, state):
+        # One reading: O(1) updates of the running sums and the ring
+        series = values[self.columns]
+        if state is None:
+            state = self._state(np.repeat(series[None], HISTORY_ROWS, axis=0), 0)
+        ring, position = state["ring"], state["next"]
+        row = np.empty(len(self.names))
+        row[:len(self.features)] = values
+        row[len(self.features)], row[len(self.features) + 1] = _time_of_day(epoch)
+
+        block = row[len(self.features) + 2:].reshape(len(self.temporal), -1)
+        for i, k in enumerate(LAGS):
+            block[:, i] = ring[(position - k) % HISTORY_ROWS]
+        for i, w in enumerate(ROLLING_WINDOWS):
+            leaving = ring[(position - w) % HISTORY_ROWS]
+            total = state["sum"][w]
+            # Every reading moves one position towards the start of the window
+            state["weighted"][w] = state["weighted"][w] - (total - leaving) + (w - 1) * series
+            state["sum"][w] = total - leaving + series
+            block[:, len(LAGS) + i] = state["sum"][w] / w
+            block[:, len(LAGS) + len(ROLLING_WINDOWS) + i] = (
+                (state["weighted"][w] - (w - 1) / 2 * state["sum"][w])
+                / _slope_denominator(w) * READINGS_PER_MINUTE
+            )
+        ring[position] = series
+        state["next"] = (position + 1) % HISTORY_ROWS
+        state["count"] += 1
+        if state["next"] == 0:
+            state = self._state(ring, state["count"])
+        return row[None], state
+
+    def _block(self, values, timestamps, state):
+        history = None if state is None else np.roll(state["ring"], -state["next"], axis=0)
+        rows = build_features(values, timestamps, history, self.features, self.temporal)
+        tail = np.concatenate([
+            np.repeat(values[:1, self.columns], HISTORY_ROWS, axis=0) if history is None else history,
+            values[:, self.columns],
+        ])[-HISTORY_ROWS:]
+        return rows, self._state(tail.copy(), (0 if state is None else state["count"]) + len(values))
+
+    def update(self, values, timestamps, station_id=DEFAULT_STATION):
+        """
+        Feed a station's next readings and return their features.
+
+        Batches of one station must be fed in order; different stations can
+        be fed from different threads.
+
+        Args:
+            values (np.ndarray): (rows, features) sensor values, oldest first.
+            timestamps (np.ndarray): Epoch seconds, one per row.
+            station_id (str): Station the readings came from.
+
+        Returns:
+            np.ndarray: (rows, len(names)) features, one row per reading.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.features))
+        timestamps = np.asarray(timestamps, dtype=np.int64).reshape(-1)
+        if len(values) == 0:
+            return np.empty((0, len(self.names)))
+        state = self._states.get(station_id)
+        if len(values) == 1:
+            rows, state = self._step(values[0], timestamps[0], state)
+        else:
+            rows, state = self._block(values, timestamps, state)
+        with self._lock:
+            self._states[station_id] = state
+            self._latest[station_id] = rows[-1]
+        return rows
+
+    def warm_start(self, store, station_id=DEFAULT_STATION, rows=HISTORY_ROWS):
+        """
+        Rebuild a station's history from the tail of its SensorStore, so
+        lags and windows are filled right after a restart.
+
+        Args:
+            store (SensorStore): Store the station's readings are persisted to.
+            station_id (str): Station the store belongs to.
+            rows (int): Number of most recent readings to replay.
+        """
+        timestamps, values = store.read_rows(max(len(store) - rows, 0))
+        if len(values):
+            self.update(values, timestamps, station_id)
+
+    def latest(self, station_id=DEFAULT_STATION):
+        """
+        Features of a station's most recent reading.
+
+        Returns:
+            np.ndarray | None: (len(names),) features, or None before the
+            first reading.
+        """
+        with self._lock:
+            return self._latest.get(station_id)
+
+    def warmed_up(self, station_id=DEFAULT_STATION):
+        """Whether a station has seen enough readings to fill every lag and window."""
+        state = self._states.get(station_id)
+        return state is not None and state["count"] >= HISTORY_ROWS
+
+    def reset(self, station_id=None):
+        """Forget the history of one station, or of every station."""
+        with self._lock:
+            if station_id is None:
+                self._states.clear()
+                self._latest.clear()
+            else:
+                self._states.pop(station_id, None)
+                self._latest.pop(station_id, None)
@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+
+FLAT_MODEL_PATH = "models/emissions_model_flat.npy"
+
+
+def flatten_forest(model):
+    """
+    Flatten a fitted sklearn tree ensemble into contiguous node arrays.
+
+    All trees are concatenated; child indices are made global. Leaves point
+    to themselves with a +inf threshold, so a fixed number of traversal steps
+    leaves every row parked on its leaf. Multi-output forests keep one value
+    per output in each node.
+
+    Args:
+        model (RandomForestRegressor): Fitted regressor.
+
+    Returns:
+        dict: Arrays feature, threshold, left, right, value (nodes, or nodes
+        by outputs), roots, plus depth and feature_names.
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    depth = 0
+    single_output = getattr(model, "n_outputs_", 1) == 1
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        n = tree.node_count
+        node_ids = np.arange(n)
+        leaf = tree.children_left == -1
+
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold).astype(np.float64))
+        lefts.append(np.where(leaf, node_ids, tree.children_left).astype(np.int32) + offset)
+        rights.append(np.where(leaf, node_ids, tree.children_right).astype(np.int32) + offset)
+        values.append((tree.value[:, 0, 0] if single_output else tree.value[:, :, 0]).astype(np.float64))
+        roots.append(offset)
+
+        offset += n
+        depth = max(depth, tree.max_depth)
+
+    names = getattr(model, "feature_names_in_", None)
+    return {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "roots": np.array(roots, dtype=np.int32),
+        "depth": np.array(depth, dtype=np.int32),
+        "feature_names": np.array([] if names is None else list(names), dtype=str),
+    }
+
+
+def save_flat_forest(model, path=FLAT_MODEL_PATH):
+    """
+    Export a fitted forest as a single .npy record whose fields are the flat
+    node arrays, so np.load(..., mmap_mode="r") maps each one contiguously.
+    The file is written to a temporary name and renamed into place, so
+    processes still mapping the previous version are unaffected.
+
+    Args:
+        model (RandomForestRegressor): Fitted regressor.
+        path (str): Destination file.
+    """
+    arrays = flatten_forest(model)
+    n_nodes = len(arrays["feature"])
+    names = arrays["feature_names"]
+    dtype = np.dtype([
+        ("feature", "<i4", (n_nodes,)),
+        ("threshold", "<f8", (n_nodes,)),
+        ("left", "<i4", (n_nodes,)),
+        ("right", "<i4", (n_nodes,)),
+        ("value", "<f8", arrays["value"].shape),
+        ("roots", "<i4", (len(arrays["roots"]),)),
+        ("depth", "<i4"),
+        ("feature_names", f"<U{max([len(n) for n in names] + [1])}", (len(names),)),
+    ])
+    record = np.zeros(1, dtype=dtype)
+    for key in dtype.names:
+        record[key] = arrays[key]
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        np.save(f, record)
+    os.replace(tmp_path, path)
+
+
+class FlatForest:
+    """
+    Pure-NumPy forest predictor. Every row walks every tree at once: one
+    gather-compare-select step per tree level, then a mean over tree leaves.
+    """
+
+    def __init__(self, arrays):
+        self.feature = np.ascontiguousarray(arrays["feature"])
+        self.threshold = np.ascontiguousarray(arrays["threshold"])
+        self.left = np.ascontiguousarray(arrays["left"])
+        self.right = np.ascontiguousarray(arrays["right"])
+        self.value = np.ascontiguousarray(arrays["value"])
+        self.roots = np.ascontiguousarray(arrays["roots"])
+        self.depth = int(arrays["depth"])
+        self.feature_names_in_ = np.asarray(arrays["feature_names"])
+        self.n_features_in_ = len(self.feature_names_in_) or int(self.feature.max()) + 1
+
+    def predict(self, X):
+        """
+        Predict like RandomForestRegressor.predict.
+
+        Args:
+            X (np.ndarray | pd.DataFrame): (rows, features) inputs in training column order.
+
+        Returns:
+            np.ndarray: One prediction per row, or (rows, outputs) for a
+            multi-output forest.
+        """
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return self.value[node].mean(axis=1)
+
+
+def load_flat_forest(path=FLAT_MODEL_PATH, mmap_mode=None):
+    """
+    Load a forest exported by save_flat_forest.
+
+    Args:
+        path (str): Path of the .npy file.
+        mmap_mode (str | None): Pass "r" to map the node arrays read-only, so
+            forked workers share the same physical pages.
+
+    Returns:
+        FlatForest: The predictor.
+    """
+    record = np.load(path, mmap_mode=mmap_mode)
+    return FlatForest({key: record[key][0] for key in record.dtype.names})
@@ -0,0 +1,195 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.features import FeaturePipeline, build_features
+from src.flat_forest import FlatForest
+from src.model_registry import ModelRegistry
+from src.rules import DEFAULT_STATION, SOS_THRESHOLD
+from src.sensor_buffer import SENSOR_FEATURES
+from src.telemetry import PREDICT_ROWS, PREDICT_SECONDS, get_logger
+
+logger = get_logger(__name__)
+
+HORIZONS_MINUTES = (5, 15, 60)
+HORIZON_TOLERANCE = 30  # Seconds a reading may miss its horizon by and still be its target
+FORECAST_MODEL_PATH = "models/forecast_model.pkl"
+FORECAST_FLAT_PATH = "models/forecast_model_flat.npy"
+FORECAST_TRAINING_ROWS = 500000  # Most recent store rows used by `train.py --forecast`
+
+
+def horizon_labels(horizons=HORIZONS_MINUTES):
+    """Output names of the forecast model, e.g. "5m"."""
+    return [f"{h}m" for h in horizons]
+
+
+def horizon_targets(timestamps, target, horizons=HORIZONS_MINUTES, tolerance=HORIZON_TOLERANCE):
+    """
+    Target value `h` minutes after each reading, for every horizon.
+
+    The target of a row is the first reading at or after its timestamp plus
+    the horizon, if that reading is within `tolerance` seconds of it, so
+    gaps in the series leave NaN instead of a wrong target.
+
+    Args:
+        timestamps (np.ndarray): Epoch seconds, one per row, ascending.
+        target (np.ndarray): Target value of each row.
+        horizons (tuple[int]): Minutes ahead.
+        tolerance (int): Seconds.
+
+    Returns:
+        np.ndarray: (rows, horizons) targets, NaN where none is known.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    target = np.asarray(target, dtype=np.float64)
+    targets = np.full((len(timestamps), len(horizons)), np.nan)
+    if len(timestamps) == 0:
+        return targets
+    for i, minutes in enumerate(horizons):
+        due = timestamps + minutes * 60
+        found = np.minimum(np.searchsorted(timestamps, due), len(timestamps) - 1)
+        known = np.abs(timestamps[found] - due) <= tolerance
+        targets[known, i] = target[found[known]]
+    return targets
+
+
+def forecast_training_set(store, max_rows=FORECAST_TRAINING_ROWS, horizons=HORIZONS_MINUTES):
+    """
+    Features and future targets from the most recent rows of a SensorStore.
+
+    Features come from build_features, the vectorized form of the streaming
+    pipeline used at serving time. Rows whose horizons are not all known
+    (the end of the series, gaps) are dropped.
+
+    Args:
+        store (SensorStore): Store to learn from.
+        max_rows (int): Most recent rows read.
+        horizons (tuple[int]): Minutes ahead.
+
+    Returns:
+        tuple: (X DataFrame of features, y DataFrame with one column per horizon).
+    """
+    import pandas as pd
+
+    from src.data_loader import make_target
+
+    timestamps, values = store.read_rows(max(len(store) - max_rows, 0))
+    pipeline = FeaturePipeline(store.features)
+    X = build_features(values, timestamps, features=pipeline.features, temporal=pipeline.temporal)
+    target = make_target(pd.DataFrame(values, columns=store.features)).to_numpy()
+    y = horizon_targets(timestamps, target, horizons)
+    known = ~np.isnan(y).any(axis=1)
+    return (pd.DataFrame(X[known], columns=pipeline.names),
+            pd.DataFrame(y[known], columns=horizon_labels(horizons)))
+
+
+class Forecaster:
+    """
+    Emission forecasts several horizons ahead, per station.
+
+    Readings feed a FeaturePipeline, which keeps each station's lags,
+    rolling means and slopes current in constant time per reading. A single
+    multi-output model predicts every horizon at once, and the latest rows
+    of many stations are scored in the same call, so one model call serves
+    every horizon of every station asked for.
+    """
+
+    def __init__(self, features=SENSOR_FEATURES, horizons=HORIZONS_MINUTES, registry=None,
+                 threshold=SOS_THRESHOLD):
+        self.pipeline = FeaturePipeline(features)
+        self.horizons = tuple(horizons)
+        self.labels = horizon_labels(self.horizons)
+        self.registry = registry or forecast_registry
+        self.threshold = threshold
+
+    def update(self, values, timestamps, station_id=DEFAULT_STATION):
+        """
+        Feed a station's next readings, oldest first.
+
+        Args:
+            values (np.ndarray): (rows, features) sensor values.
+            timestamps (np.ndarray): Epoch seconds, one per row.
+            station_id (str): Station the readings came from.
+        """
+        self.pipeline.update(values, timestamps, station_id)
+
+    def warm_start(self, store, station_id=DEFAULT_STATION):
+        """Fill a station's lags and windows from the tail of its SensorStore."""
+        self.pipeline.warm_start(store, station_id)
+
+    def predict(self, X):
+        """
+        Forecast every horizon for feature rows with one model call.
+
+        Args:
+            X (np.ndarray): (rows, features) rows from the pipeline.
+
+        Returns:
+            np.ndarray: (rows, horizons) forecasts.
+        """
+        model = self.registry.get()
+        names = list(getattr(model, "feature_names_in_", []))
+        if names and names != self.pipeline.names:
+            raise ValueError("❌ Forecast model was trained on other features. "
+                             "Retrain it with `python src/train.py --forecast`.")
+        if not isinstance(model, FlatForest):
+            import pandas as pd  # sklearn checks the column names it was fitted with
+
+            X = pd.DataFrame(X, columns=self.pipeline.names)
+        with PREDICT_SECONDS.time(mode="forecast"):
+            predictions = np.asarray(model.predict(X), dtype=np.float64).reshape(len(X), -1)
+        PREDICT_ROWS.inc(len(X))
+        if predictions.shape[1] != len(self.horizons):
+            raise ValueError(f"❌ Forecast model has {predictions.shape[1]} outputs, "
+                             f"expected {len(self.horizons)}")
+        return predictions
+
+    def forecast(self, station_ids=(DEFAULT_STATION,)):
+        """
+        Forecasts for the latest reading of each station, in one batched call.
+
+        Args:
+            station_ids (list[str]): Stations to forecast.
+
+        Returns:
+            dict: {station_id: {"horizons": {"5m": value, ...},
+            "breach_in_minutes": first horizon at or over the SOS threshold
+            (or None), "warming_up": bool}}. Stations without readings are
+            left out, and every station is while no forecast model is
+            available.
+        """
+        rows = {s: self.pipeline.latest(s) for s in station_ids}
+        rows = {s: row for s, row in rows.items() if row is not None}
+        if not rows:
+            return {}
+        try:
+            predictions = self.predict(np.vstack(list(rows.values())))
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning("⚠️ Forecast unavailable: %s", e)
+            return {}
+
+        forecasts = {}
+        for station_id, values in zip(rows, predictions):
+            breach = [h for h, v in zip(self.horizons, values) if v >= self.threshold]
+            forecasts[station_id] = {
+                "horizons": {label: round(float(v), 2) for label, v in zip(self.labels, values)},
+                "breach_in_minutes": breach[0] if breach else None,
+                "warming_up": not self.pipeline.warmed_up(station_id),
+            }
+        return forecasts
+
+    def latest(self, station_id=DEFAULT_STATION):
+        """
+        Forecast for a station's latest reading.
+
+        Returns:
+            dict | None: As one entry of forecast(), or None if there is no
+            reading or no forecast model yet.
+        """
+        return self.forecast([station_id]).get(station_id)
+
+
+# ✅ Shared process-wide registry of the forecast model, hot-reloaded like the emission model
+forecast_registry = ModelRegistry(FORECAST_MODEL_PATH, FORECAST_FLAT_PATH)
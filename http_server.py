@@ -9,14 +9,19 @@ import os
 # Add parent path for importing predict_emissions
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.predict import predict_emissions
+from src.broadcast import Broadcaster, sse_response
+from src.telemetry import get_logger, instrument_flask
 
 # Explicit path to dashboard/templates
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'dashboard', 'templates')
 
 app = Flask(__name__, template_folder=TEMPLATES_DIR)
+instrument_flask(app)
+logger = get_logger(__name__)
 
 latest_data = {}
+broadcaster = Broadcaster()
 
 def generate_fake_sensor_data():
     """Mock function to simulate real-time sensor data updates."""
@@ -53,10 +58,11 @@ def generate_fake_sensor_data():
             prediction = predict_emissions(latest_data)
             latest_data["Predicted Emissions"] = round(prediction, 2)
         except Exception as e:
-            print("⚠️ Prediction failed:", e)
+            logger.warning("⚠️ Prediction failed: %s", e)
             latest_data["Predicted Emissions"] = "N/A"
 
-        print("✅ Updated data:", latest_data)
+        broadcaster.publish(latest_data)
+        logger.debug("✅ Updated data: %s", latest_data)
         time.sleep(5)
 
 @app.route("/")
@@ -67,6 +73,10 @@ def index():
 def live_data():
     return jsonify(latest_data)
 
+@app.route("/stream")
+def stream():
+    return sse_response(broadcaster)
+
 if __name__ == "__main__":
     thread = Thread(target=generate_fake_sensor_data)
     thread.daemon = True
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+
+from src.flat_forest import FLAT_MODEL_PATH, load_flat_forest
+from src.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+MODEL_PATH = "models/emissions_model.pkl"
+RELOAD_CHECK_INTERVAL = 5  # Seconds between model file modification checks
+
+
+class ModelRegistry:
+    """
+    Lazily loaded, hot-reloadable emissions model.
+
+    Nothing is read at import time. The first get() loads the model; the
+    flat NumPy export is preferred and memory-mapped read-only so forked
+    workers share its pages. Later calls notice a newer model file and load
+    it on a background thread, swapping the reference once it is ready, so
+    in-flight predictions keep the model they started with.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, flat_path=FLAT_MODEL_PATH,
+                 check_interval=RELOAD_CHECK_INTERVAL):
+        self.model_path = model_path
+        self.flat_path = flat_path
+        self.check_interval = check_interval
+        self._model = None
+        self._version = None
+        self._next_check = 0
+        self._loading = False
+        self._lock = threading.Lock()
+
+    def _source(self):
+        """Return (path, mtime) of the file that should be served."""
+        flat_mtime = os.path.getmtime(self.flat_path) if os.path.exists(self.flat_path) else None
+        pkl_mtime = os.path.getmtime(self.model_path) if os.path.exists(self.model_path) else None
+        if flat_mtime is not None and (pkl_mtime is None or flat_mtime >= pkl_mtime):
+            return self.flat_path, flat_mtime
+        if pkl_mtime is not None:
+            return self.model_path, pkl_mtime
+        raise FileNotFoundError(f"❌ Model file not found at: {self.model_path}. Train the model first.")
+
+    def _load(self, path):
+        if path == self.flat_path:
+            return load_flat_forest(path, mmap_mode="r")
+        import joblib  # Only needed when no flat export exists
+
+        return joblib.load(path, mmap_mode="r")
+
+    def _reload(self, path, version):
+        try:
+            model = self._load(path)
+            with self._lock:
+                self._model, self._version = model, version
+            logger.info("🔄 Reloaded model from %s", path)
+        except Exception as e:
+            # A file caught mid-write is retried on the next check
+            logger.warning("⚠️ Model reload failed: %s", e)
+        finally:
+            self._loading = False
+
+    def get(self):
+        """
+        Return the current model, loading it on first use.
+
+        Returns:
+            object: A fitted model exposing predict().
+        """
+        model = self._model
+        now = time.monotonic()
+        if model is not None and now < self._next_check:
+            return model
+
+        with self._lock:
+            if self._model is None:
+                path, version = self._source()
+                self._model, self._version = self._load(path), (path, version)
+                self._next_check = now + self.check_interval
+                return self._model
+
+            self._next_check = now + self.check_interval
+            try:
+                path, version = self._source()
+            except FileNotFoundError:
+                return self._model
+            if (path, version) != self._version and not self._loading:
+                self._loading = True
+                threading.Thread(target=self._reload, args=(path, (path, version)), daemon=True).start()
+            return self._model
+
+    def load(self):
+        """Load the model now, e.g. in a gunicorn master before workers fork."""
+        return self.get()
+
+
+# ✅ Shared process-wide registry used by predict.py
+registry = ModelRegistry()
@@ -0,0 +1,204 @@
+import time
+
+import numpy as np
+import yaml
+
+from src.flat_forest import FlatForest, flatten_forest
+
+# scikit-learn is imported inside the functions that train, so the servers,
+# which import this module only for load_config, never load it
+
+CONFIG_PATH = "config.yaml"
+
+# model.type -> estimator class in sklearn.ensemble
+MODEL_TYPES = {
+    "RandomForest": "RandomForestRegressor",
+    "ExtraTrees": "ExtraTreesRegressor",
+}
+
+DEFAULT_SEARCH = {
+    "strategy": "halving",
+    "n_iter": 20,
+    "cv_splits": 5,
+    "n_jobs": -1,
+    "max_latency_ms": None,
+    "space": {
+        "n_estimators": [25, 50, 100, 200],
+        "max_depth": [None, 8, 12, 16, 24],
+        "min_samples_leaf": [1, 2, 5, 10],
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+}
+
+
+def load_config(path=CONFIG_PATH):
+    """
+    Read config.yaml, returning an empty config if it is missing.
+
+    Args:
+        path (str): Path of the YAML config.
+
+    Returns:
+        dict: Parsed configuration.
+    """
+    try:
+        with open(path) as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+
+
+def build_model(config):
+    """
+    Build the estimator described by the `model` section of config.yaml.
+
+    Args:
+        config (dict): Parsed configuration.
+
+    Returns:
+        Estimator: Unfitted regressor.
+    """
+    model_config = dict(config.get("model") or {})
+    model_type = model_config.pop("type", "RandomForest")
+    if model_type not in MODEL_TYPES:
+        raise ValueError(f"❌ Unsupported model.type '{model_type}'. Use one of {list(MODEL_TYPES)}")
+    model_config.setdefault("random_state", 42)
+    from sklearn import ensemble
+
+    return getattr(ensemble, MODEL_TYPES[model_type])(**model_config)
+
+
+def single_row_latency(model, X, repeats=50):
+    """
+    Median single-row latency of the flat serving predictor for a fitted forest.
+
+    Args:
+        model (Estimator): Fitted forest.
+        X (np.ndarray): Rows to sample inputs from.
+        repeats (int): Timed predictions.
+
+    Returns:
+        float: Median latency in milliseconds.
+    """
+    flat = FlatForest(flatten_forest(model))
+    rows = np.asarray(X, dtype=np.float64)[:repeats]
+    timings = []
+    for row in rows:
+        start = time.perf_counter()
+        flat.predict(row[None, :])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def pareto_front(candidates):
+    """
+    Mark candidates no other candidate beats on both R² and latency.
+
+    Args:
+        candidates (list[dict]): Each with "r2" and "latency_ms".
+
+    Returns:
+        list[dict]: The same candidates, each with a "pareto" flag.
+    """
+    best_r2 = -np.inf
+    for candidate in sorted(candidates, key=lambda c: (c["latency_ms"], -c["r2"])):
+        candidate["pareto"] = candidate["r2"] > best_r2
+        best_r2 = max(best_r2, candidate["r2"])
+    return candidates
+
+
+def _fit(estimator, params, X, y):
+    from sklearn.base import clone
+
+    model = clone(estimator).set_params(**params, n_jobs=1)
+    start = time.perf_counter()
+    model.fit(X, y)
+    return model, time.perf_counter() - start
+
+
+def run_search(X, y, config):
+    """
+    Parallel hyperparameter search with time-ordered CV folds.
+
+    Candidates are drawn from `search.space` in config.yaml and scored with
+    TimeSeriesSplit, so every fold validates on rows later than it trains on.
+    Each distinct candidate is then refit on all of X to measure the
+    single-row latency of its flat serving form.
+
+    Args:
+        X (pd.DataFrame): Training features in time order.
+        y (pd.Series): Training target.
+        config (dict): Parsed configuration.
+
+    Returns:
+        tuple: (selected fitted model, report dict).
+    """
+    from joblib import Parallel, delayed
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingRandomSearchCV, RandomizedSearchCV, TimeSeriesSplit
+
+    search_config = {**DEFAULT_SEARCH, **(config.get("search") or {})}
+    estimator = build_model(config)
+    cv = TimeSeriesSplit(n_splits=search_config["cv_splits"])
+    n_jobs = search_config["n_jobs"]
+
+    if search_config["strategy"] == "halving":
+        search = HalvingRandomSearchCV(
+            estimator, search_config["space"], n_candidates=search_config["n_iter"],
+            cv=cv, scoring="r2", n_jobs=n_jobs, random_state=42, refit=False,
+        )
+    elif search_config["strategy"] == "random":
+        search = RandomizedSearchCV(
+            estimator, search_config["space"], n_iter=search_config["n_iter"],
+            cv=cv, scoring="r2", n_jobs=n_jobs, random_state=42, refit=False,
+        )
+    else:
+        raise ValueError(f"❌ Unknown search strategy '{search_config['strategy']}'")
+
+    start = time.perf_counter()
+    search.fit(X, y)
+    search_seconds = time.perf_counter() - start
+
+    # Keep each candidate's last (largest-resource) evaluation
+    results = search.cv_results_
+    candidates = {}
+    for i, params in enumerate(results["params"]):
+        candidates[repr(sorted(params.items()))] = {
+            "params": params,
+            "r2": float(results["mean_test_score"][i]),
+            "cv_fit_seconds": float(results["mean_fit_time"][i]),
+        }
+    candidates = [c for c in candidates.values() if np.isfinite(c["r2"])]
+
+    fitted = Parallel(n_jobs=n_jobs)(delayed(_fit)(estimator, c["params"], X, y) for c in candidates)
+    for candidate, (model, fit_seconds) in zip(candidates, fitted):
+        candidate["refit_seconds"] = fit_seconds
+        candidate["latency_ms"] = single_row_latency(model, X)
+    pareto_front(candidates)
+
+    budget = search_config["max_latency_ms"]
+    eligible = [i for i, c in enumerate(candidates) if budget is None or c["latency_ms"] <= budget]
+    if not eligible:
+        print(f"⚠️ No candidate meets max_latency_ms={budget}; using the fastest instead.")
+        eligible = [min(range(len(candidates)), key=lambda i: candidates[i]["latency_ms"])]
+    chosen = max(eligible, key=lambda i: candidates[i]["r2"])
+
+    report = {
+        "strategy": search_config["strategy"],
+        "search_seconds": search_seconds,
+        "wall_seconds": time.perf_counter() - start,
+        "selected": candidates[chosen],
+        "candidates": sorted(candidates, key=lambda c: -c["r2"]),
+    }
+    return fitted[chosen][0], report
+
+
+def print_report(report):
+    """Print the search summary and the R²/latency Pareto front."""
+    print(f"⏱️ Search wall-clock: {report['wall_seconds']:.1f}s "
+          f"(CV search {report['search_seconds']:.1f}s, strategy={report['strategy']})")
+    print(f"{'R²':>8} {'latency ms':>11} {'fit s':>7}  params")
+    for c in report["candidates"]:
+        marker = "★" if c["pareto"] else " "
+        print(f"{marker}{c['r2']:>7.4f} {c['latency_ms']:>11.3f} {c['cv_fit_seconds']:>7.2f}  {c['params']}")
+    print(f"✅ Selected: {report['selected']['params']}")
@@ -1,13 +1,14 @@
-import joblib
-import pandas as pd
+import numpy as np
 import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-# ✅ Load the trained model
-model_path = "models/emissions_model.pkl"
-if not os.path.exists(model_path):
-    raise FileNotFoundError(f"❌ Model file not found at: {model_path}. Train the model first.")
+from src.flat_forest import FlatForest
+from src.model_registry import registry
+from src.telemetry import PREDICT_ROWS, PREDICT_SECONDS
 
-model = joblib.load(model_path)
+# ✅ The trained model is loaded lazily on first prediction and hot-reloaded
+# when models/emissions_model.pkl (or its flat export) changes
 
 # ✅ Define expected features (including 'From Date' used during training)
 EXPECTED_FEATURES = [
@@ -18,45 +19,133 @@ EXPECTED_FEATURES = [
     "SR (W/mt2)", "BP (mmHg)", "VWS (m/s)", "Xylene (ug/m3)", "RF (mm)", "AT (degree C)"
 ]
 
-def predict_emissions(data):
+PLACEHOLDER_DATE = "2025-04-03"  # Placeholder date to match training
+
+
+def predict_emissions_batch(data):
     """
-    Predict emissions based on sensor input.
+    Predict emissions for many sensor readings with a single model call.
 
     Args:
-        data (dict): Dictionary containing sensor values.
+        data (pd.DataFrame | np.ndarray | list[dict]): Sensor readings. A 2-D
+            array must hold its columns in EXPECTED_FEATURES order, with or
+            without the leading "From Date" column.
 
     Returns:
-        float: Predicted emissions value.
+        np.ndarray: Predicted emissions, one value per input row.
     """
 
-    # ✅ Ensure "From Date" exists
-    data["From Date"] = "2025-04-03"  # Placeholder date to match training
-
-    # ✅ Ensure all required features exist
-    missing_features = [feature for feature in EXPECTED_FEATURES if feature not in data]
+    # ✅ Fast path: numeric arrays go straight to the flat forest, without pandas
+    if isinstance(data, np.ndarray) and data.dtype.kind in "biuf":
+        model = registry.get()
+        if isinstance(model, FlatForest):
+            return _predict_array(model, data)
+
+    import pandas as pd  # Deferred: only dict and mixed-type inputs need coercion
+
+    # ✅ Normalise every supported input into a DataFrame
+    if isinstance(data, pd.DataFrame):
+        df = data
+    elif isinstance(data, np.ndarray):
+        if data.ndim != 2:
+            raise ValueError(f"❌ Expected a 2-D array, got {data.ndim} dimension(s)")
+        if data.shape[1] == len(EXPECTED_FEATURES) - 1:
+            df = pd.DataFrame(data, columns=EXPECTED_FEATURES[1:])
+        elif data.shape[1] == len(EXPECTED_FEATURES):
+            df = pd.DataFrame(data, columns=EXPECTED_FEATURES)
+        else:
+            raise ValueError(
+                f"❌ Expected {len(EXPECTED_FEATURES)} columns, got {data.shape[1]}"
+            )
+    else:
+        df = pd.DataFrame(list(data))
+
+    if df.empty:
+        return np.empty(0, dtype=float)
+
+    # ✅ Ensure all required features exist (validated once for the batch)
+    missing_features = [
+        feature for feature in EXPECTED_FEATURES
+        if feature != "From Date" and feature not in df.columns
+    ]
     if missing_features:
         raise ValueError(f"❌ Missing features: {missing_features}")
 
-    # ✅ Convert input to DataFrame
-    df = pd.DataFrame([data])
-
-    # ✅ Ensure correct column order
-    df = df[EXPECTED_FEATURES]
+    # ✅ Ensure correct column order and the training placeholder date
+    df = df.reindex(columns=EXPECTED_FEATURES)
+    df["From Date"] = PLACEHOLDER_DATE
 
-    # ✅ Convert to numeric where possible
+    # ✅ Convert to numeric where possible; rows are scored independently,
+    # so gaps are filled per row rather than carried across readings
     df = df.apply(pd.to_numeric, errors='coerce')
-
-    # ✅ Fill missing values correctly
-    df.ffill(inplace=True)
-    df.bfill(inplace=True)
     df.fillna(0, inplace=True)
 
     # ✅ Make prediction
+    model = registry.get()
     try:
-        prediction = model.predict(df)[0]
-        return prediction
+        with PREDICT_SECONDS.time(mode="batch"):
+            predictions = model.predict(df)
     except Exception as e:
         raise RuntimeError(f"❌ Prediction failed: {str(e)}")
+    PREDICT_ROWS.inc(len(df))
+    return predictions
+
+
+def predict_emissions(data):
+    """
+    Predict emissions based on sensor input.
+
+    Args:
+        data (dict): Dictionary containing sensor values.
+
+    Returns:
+        float: Predicted emissions value.
+    """
+
+    # ✅ Ensure "From Date" exists
+    data["From Date"] = PLACEHOLDER_DATE
+
+    # ✅ Fast path: score one plain numeric row without building a DataFrame
+    model = registry.get()
+    if isinstance(model, FlatForest):
+        row = _numeric_row(data)
+        if row is not None:
+            with PREDICT_SECONDS.time(mode="single"):
+                prediction = model.predict(row)[0]
+            PREDICT_ROWS.inc()
+            return prediction
+
+    return predict_emissions_batch([data])[0]
+
+
+def _predict_array(model, data):
+    """Score a numeric 2-D array as predict_emissions_batch would, without a DataFrame."""
+    if data.ndim != 2:
+        raise ValueError(f"❌ Expected a 2-D array, got {data.ndim} dimension(s)")
+    if data.shape[1] not in (len(EXPECTED_FEATURES) - 1, len(EXPECTED_FEATURES)):
+        raise ValueError(f"❌ Expected {len(EXPECTED_FEATURES)} columns, got {data.shape[1]}")
+    if len(data) == 0:
+        return np.empty(0, dtype=float)
+    X = np.zeros((len(data), len(EXPECTED_FEATURES)))
+    X[:, 1:] = data[:, -(len(EXPECTED_FEATURES) - 1):]  # "From Date" is a placeholder scored as 0
+    X[np.isnan(X)] = 0
+    with PREDICT_SECONDS.time(mode="batch"):
+        predictions = model.predict(X)
+    PREDICT_ROWS.inc(len(X))
+    return predictions
+
+
+def _numeric_row(data):
+    """Build the model input row directly, or None if any value needs pandas coercion."""
+    row = np.zeros((1, len(EXPECTED_FEATURES)))
+    for i, feature in enumerate(EXPECTED_FEATURES[1:], start=1):
+        if feature not in data:
+            return None
+        value = data[feature]
+        if not isinstance(value, (int, float, np.number)) or isinstance(value, bool):
+            return None
+        row[0, i] = value if value == value else 0  # NaN is filled with 0
+    return row
 
 
 # ✅ Test if script runs directly
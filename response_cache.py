@@ -0,0 +1,61 @@
+import threading
+import zlib
+
+from flask import current_app, request
+
+
+class ResponseCache:
+    """
+    JSON responses cached per key and data version.
+
+    The version is the sequence number of the latest reading (a buffer's
+    `version`), so the entry is invalidated as soon as the ingest loop
+    appends a reading, and polls in between reuse the serialized body. Each
+    body carries an ETag built from the version and a checksum of the body;
+    polls that send it back in If-None-Match get a 304 with no body.
+    """
+
+    def __init__(self):
+        self._entries = {}  # key -> (version, etag, body)
+        self._lock = threading.Lock()
+
+    def respond(self, key, version, build, cacheable=None):
+        """
+        Serve the response for `key` at `version`, building it only on a miss.
+
+        Must be called inside a Flask request.
+
+        Args:
+            key (str): What the response describes, e.g. a station id.
+            version (int): Sequence number of the latest reading behind it.
+            build (callable): Returns the JSON payload; exceptions propagate
+                and nothing is cached.
+            cacheable (callable | None): Given the payload, returns False
+                for responses that should be rebuilt on the next poll
+                (e.g. ones still waiting on a background result).
+
+        Returns:
+            flask.Response: 200 with the body, or 304 if the client has it.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            payload = build()
+            body = current_app.json.dumps(payload).encode("utf-8")
+            entry = (version, f"{version}-{zlib.crc32(body):08x}", body)
+            if cacheable is None or cacheable(payload):
+                with self._lock:
+                    self._entries[key] = entry
+
+        response = current_app.response_class(entry[2], mimetype="application/json")
+        response.set_etag(entry[1])
+        response.headers["Cache-Control"] = "no-cache"  # Revalidate on every poll
+        return response.make_conditional(request)
+
+    def invalidate(self, key=None):
+        """Drop the entry for one key, or every entry."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
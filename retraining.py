@@ -0,0 +1,180 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from src.flat_forest import FLAT_MODEL_PATH, save_flat_forest
+from src.model_registry import MODEL_PATH
+from src.model_search import build_model, load_config
+from src.sensor_store import STORE_DIR, SensorStore
+from src.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+RETRAIN_INTERVAL = 3600  # Seconds between retraining checks
+MIN_NEW_ROWS = 720  # One hour of readings at one every 5 seconds
+MAX_TRAINING_ROWS = 200000  # Most recent rows used per refit
+HOLDOUT_FRACTION = 0.2
+R2_TOLERANCE = 0.01  # New model may trail the current one by this much on the holdout
+RETRAIN_LOG_PATH = "models/retrain_log.jsonl"
+
+
+def _training_frame(store, max_rows):
+    """Most recent store rows as model features in serving form, plus the target."""
+    import pandas as pd
+
+    from src.data_loader import make_target
+
+    end = len(store)
+    timestamps, values = store.read_rows(max(end - max_rows, 0), end)
+    X = pd.DataFrame(values, columns=store.features)
+    y = make_target(X)
+    # Serving scores "From Date" as a placeholder that coerces to 0
+    X.insert(0, "From Date", 0.0)
+    return X, y, end
+
+
+def refit_and_validate(store_root=STORE_DIR, model_path=MODEL_PATH, flat_path=FLAT_MODEL_PATH,
+                       max_rows=MAX_TRAINING_ROWS, holdout_fraction=HOLDOUT_FRACTION,
+                       tolerance=R2_TOLERANCE):
+    """
+    Refit the model on recent stored readings and publish it if it validates.
+
+    Runs in a child process. The most recent holdout_fraction of rows is held
+    out; the candidate is published only if its holdout R² is within
+    `tolerance` of the currently served model. Publishing writes both model
+    files atomically, and the serving registry hot-reloads them.
+
+    Returns:
+        dict: Outcome with row counts, R² scores and whether the model was swapped.
+    """
+    # Training libraries are imported here, in the child process, so the
+    # serving process that only schedules refits never loads them
+    import joblib
+    from sklearn.metrics import r2_score
+
+    try:
+        os.nice(10)  # Keep the refit from competing with request handling
+    except (AttributeError, OSError):
+        pass
+
+    started = time.time()
+    store = SensorStore(store_root)
+    X, y, position = _training_frame(store, max_rows)
+    split = int(len(X) * (1 - holdout_fraction))
+    X_train, X_test, y_train, y_test = X.iloc[:split], X.iloc[split:], y.iloc[:split], y.iloc[split:]
+
+    candidate = build_model(load_config())
+    candidate.fit(X_train, y_train)
+    candidate_r2 = float(r2_score(y_test, candidate.predict(X_test)))
+
+    current_r2 = None
+    if os.path.exists(model_path):
+        try:
+            current = joblib.load(model_path)
+            columns = list(getattr(current, "feature_names_in_", X_test.columns))
+            current_r2 = float(r2_score(y_test, current.predict(X_test.reindex(columns=columns, fill_value=0.0))))
+        except Exception as e:
+            logger.warning("⚠️ Could not score the current model: %s", e)
+
+    swapped = current_r2 is None or candidate_r2 >= current_r2 - tolerance
+    if swapped:
+        os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+        os.makedirs(os.path.dirname(flat_path) or ".", exist_ok=True)
+        tmp_path = f"{model_path}.tmp{os.getpid()}"
+        joblib.dump(candidate, tmp_path)
+        os.replace(tmp_path, model_path)
+        # Flat export last so it is the newest file and the registry serves it
+        save_flat_forest(candidate, flat_path)
+
+    return {
+        "finished_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "seconds": round(time.time() - started, 2),
+        "position": position,
+        "train_rows": len(X_train),
+        "holdout_rows": len(X_test),
+        "candidate_r2": candidate_r2,
+        "current_r2": current_r2,
+        "swapped": swapped,
+    }
+
+
+class RetrainScheduler:
+    """
+    Background scheduler that refits the model from the live sensor store.
+
+    Every `interval` seconds it checks how many rows have been stored since
+    the last refit. Once at least `min_new_rows` have arrived, it runs
+    refit_and_validate in a separate Python process (`python -m src.retraining`),
+    so training never shares the interpreter or the GIL with serving threads.
+    """
+
+    def __init__(self, store, interval=RETRAIN_INTERVAL, min_new_rows=MIN_NEW_ROWS,
+                 log_path=RETRAIN_LOG_PATH):
+        self.store = store
+        self.interval = interval
+        self.min_new_rows = min_new_rows
+        self.log_path = log_path
+        self.last_position = None  # Store length at start(); read lazily so construction is free
+        self.last_result = None
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler thread (idempotent)."""
+        if self.last_position is None:
+            self.last_position = len(self.store)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("❌ Retraining error: %s", e)
+
+    def run_once(self, force=False):
+        """
+        Refit now if enough new rows have arrived (or `force` is set).
+
+        Returns:
+            dict | None: Outcome of the refit, or None if it was skipped.
+        """
+        if self.last_position is None:
+            self.last_position = len(self.store)
+        new_rows = len(self.store) - self.last_position
+        if not force and new_rows < self.min_new_rows:
+            return None
+
+        logger.info("🔁 Retraining on the sensor store (%s new rows)...", new_rows)
+        package_parent = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_parent, os.getenv("PYTHONPATH")])))
+        completed = subprocess.run(
+            [sys.executable, "-m", "src.retraining", self.store.root],
+            capture_output=True, text=True, env=env
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "refit failed")
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        self.last_position = result["position"]
+        self.last_result = result
+        if result["swapped"]:
+            logger.info("✅ Retrained model published (holdout R² %.4f)", result["candidate_r2"])
+        else:
+            logger.warning("⚠️ Retrained model rejected: R² %.4f vs current %.4f",
+                           result["candidate_r2"], result["current_r2"])
+
+        os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+        with open(self.log_path, "a") as f:
+            f.write(json.dumps(result) + "\n")
+        return result
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.retraining [store_root]
+    print(json.dumps(refit_and_validate(sys.argv[1] if len(sys.argv) > 1 else STORE_DIR)))
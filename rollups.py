@@ -0,0 +1,278 @@
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from src.sensor_buffer import SENSOR_FEATURES, parse_timestamp, format_timestamp, utc_offset
+from src.telemetry import get_logger
+
+logger = get_logger(__name__)
+
+ROLLUP_DIR = "data/rollups"
+BUCKETS = {"1m": 60, "1h": 3600, "1d": 86400}
+RESERVOIR_SIZE = 512  # Samples kept per open bucket for the p95 estimate
+
+
+def bucket_start(timestamps, width):
+    """
+    Return the local-time aligned start of the bucket each timestamp falls in.
+
+    Each timestamp uses the UTC offset in effect at that time, so day buckets
+    are 23 or 25 hours long across DST changes.
+
+    Args:
+        timestamps (np.ndarray | int): Epoch seconds.
+        width (int): Bucket width in seconds.
+
+    Returns:
+        np.ndarray | int: Bucket start in epoch seconds.
+    """
+    offset = utc_offset(timestamps)
+    local_start = (timestamps + offset) // width * width
+    return local_start - utc_offset(local_start - offset)
+
+
+def record_dtype(n_features):
+    """Fixed-width on-disk layout of one closed bucket."""
+    return np.dtype([
+        ("start", "<i8"),
+        ("count", "<i8"),
+        ("min", "<f8", (n_features,)),
+        ("max", "<f8", (n_features,)),
+        ("mean", "<f8", (n_features,)),
+        ("p95", "<f8", (n_features,)),
+        ("emission", "<f8"),
+        ("emission_count", "<i8"),
+    ])
+
+
+class OpenBucket:
+    """
+    Running aggregates for the bucket currently being filled: count, sum,
+    min and max per feature, a bounded reservoir sample for p95, and the
+    running predicted-emission sum.
+    """
+
+    def __init__(self, start, n_features, rng):
+        self.start = start
+        self.count = 0
+        self.sum = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+        self.samples = np.empty((0, n_features))
+        self.emission_sum = 0.0
+        self.emission_count = 0
+        self._rng = rng
+
+    def merge(self, values, emissions):
+        """Fold a block of rows that all fall in this bucket into the aggregates."""
+        self.sum += values.sum(axis=0)
+        np.minimum(self.min, values.min(axis=0), out=self.min)
+        np.maximum(self.max, values.max(axis=0), out=self.max)
+
+        known = emissions[~np.isnan(emissions)]
+        self.emission_sum += float(known.sum())
+        self.emission_count += len(known)
+
+        # Reservoir sampling keeps p95 memory bounded for long buckets
+        room = RESERVOIR_SIZE - len(self.samples)
+        if room > 0:
+            self.samples = np.concatenate([self.samples, values[:room]])
+        rest = values[max(room, 0):]
+        if len(rest):
+            seen = self.count + max(room, 0) + np.arange(1, len(rest) + 1)
+            keep = self._rng.random(len(rest)) < RESERVOIR_SIZE / seen
+            slots = self._rng.integers(0, RESERVOIR_SIZE, size=int(keep.sum()))
+            self.samples[slots] = rest[keep]
+        self.count += len(values)
+
+    def record(self, dtype):
+        """Freeze the aggregates into a single structured record."""
+        rec = np.zeros(1, dtype=dtype)
+        rec["start"] = self.start
+        rec["count"] = self.count
+        rec["min"] = self.min
+        rec["max"] = self.max
+        rec["mean"] = self.sum / max(self.count, 1)
+        rec["p95"] = np.percentile(self.samples, 95, axis=0)
+        rec["emission"] = self.emission_sum / self.emission_count if self.emission_count else np.nan
+        rec["emission_count"] = self.emission_count
+        return rec
+
+
+class Rollups:
+    """
+    Incremental 1-minute, 1-hour and 1-day rollups of the sensor stream.
+
+    Closed buckets are appended to one fixed-width binary file per bucket
+    size, so a range query is a binary search over bucket start times.
+    """
+
+    def __init__(self, root=ROLLUP_DIR, features=SENSOR_FEATURES, buckets=BUCKETS):
+        self.root = root
+        self.features = list(features)
+        self.buckets = dict(buckets)
+        self.dtype = record_dtype(len(self.features))
+        self._open = {name: None for name in self.buckets}
+        self._last_closed = {name: self._last_closed_start(name) for name in self.buckets}
+        self._lock = threading.Lock()
+        self._rng = np.random.default_rng()
+
+    def _path(self, name):
+        return os.path.join(self.root, f"{name}.bin")
+
+    def _closed(self, name):
+        path = self._path(name)
+        if not os.path.exists(path) or os.path.getsize(path) < self.dtype.itemsize:
+            return np.empty(0, dtype=self.dtype)
+        rows = os.path.getsize(path) // self.dtype.itemsize
+        return np.memmap(path, dtype=self.dtype, mode="r", shape=(rows,))
+
+    def _persist(self, name, bucket):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path(name), "ab") as f:
+            f.write(bucket.record(self.dtype).tobytes())
+        self._last_closed[name] = bucket.start
+
+    def _last_closed_start(self, name):
+        # Bucket lengths vary across DST changes, so track starts rather than ends
+        closed = self._closed(name)
+        if not len(closed):
+            return None
+        return int(closed["start"][-1])
+
+    # ----- Ingest -------------------------------------------------------
+
+    def extend(self, timestamps, values, emissions=None):
+        """
+        Fold a time-ordered block of readings into every bucket size.
+
+        Args:
+            timestamps (np.ndarray): Epoch seconds, non-decreasing.
+            values (np.ndarray): (rows, features) sensor values.
+            emissions (np.ndarray | None): Predicted emission per row, NaN if unknown.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(timestamps), len(self.features))
+        if emissions is None:
+            emissions = np.full(len(timestamps), np.nan)
+        emissions = np.asarray(emissions, dtype=np.float64)
+
+        with self._lock:
+            for name, width in self.buckets.items():
+                starts = bucket_start(timestamps, width)
+                keys, first = np.unique(starts, return_index=True)
+                bounds = list(first[1:]) + [len(starts)]
+                for key, lo, hi in zip(keys, first, bounds):
+                    bucket = self._open[name]
+                    if bucket is not None:
+                        late = key < bucket.start
+                    else:
+                        late = self._last_closed[name] is not None and key <= self._last_closed[name]
+                    if late:
+                        continue  # Late reading for a bucket that is already closed
+                    if bucket is None or key != bucket.start:
+                        if bucket is not None:
+                            self._persist(name, bucket)
+                        bucket = self._open[name] = OpenBucket(int(key), len(self.features), self._rng)
+                    bucket.merge(values[lo:hi], emissions[lo:hi])
+
+    def add(self, reading, emission=None):
+        """
+        Fold one reading from the ingest loop into every bucket size.
+
+        Args:
+            reading (dict): Sensor values keyed by feature name, plus "Timestamp".
+            emission (float | None): Predicted emission for this reading.
+        """
+        values = [[float(reading.get(f, 0)) for f in self.features]]
+        epoch = parse_timestamp(reading.get("Timestamp", datetime.now()))
+        self.extend([epoch], values, [np.nan if emission is None else emission])
+
+    def catch_up(self, store, predict=None, chunk_rows=50000):
+        """
+        Fold in store rows that are not yet in a closed bucket, e.g. history
+        imported before rollups existed or buckets left open by a restart.
+
+        Live readings must not be added until this returns, since buckets
+        older than the open one are treated as closed.
+
+        Args:
+            store (SensorStore): Persisted sensor readings.
+            predict (callable | None): Batched predictor for the emission mean.
+                If no model is trained yet, rows are folded with an unknown
+                emission instead.
+            chunk_rows (int): Rows predicted per call.
+        """
+        closed = list(self._last_closed.values())
+        since = None if None in closed else min(closed)
+        timestamps, values = store.read(since, None)
+        if not len(timestamps):
+            return
+
+        for i in range(0, len(timestamps), chunk_rows):
+            block = slice(i, i + chunk_rows)
+            emissions = None
+            if predict is not None:
+                try:
+                    emissions = predict(values[block])
+                except FileNotFoundError as e:
+                    logger.warning("⚠️ Rolling up history without emissions: %s", e)
+                    predict = None
+            self.extend(timestamps[block], values[block], emissions)
+
+    # ----- Queries ------------------------------------------------------
+
+    def query(self, feature, bucket="1h", start=None, end=None):
+        """
+        Return precomputed points for one feature, including the open bucket.
+
+        Args:
+            feature (str): Sensor feature name, or "emission" for predicted emissions.
+            bucket (str): One of BUCKETS.
+            start (str | datetime | int | None): Inclusive lower bound on bucket start.
+            end (str | datetime | int | None): Exclusive upper bound on bucket start.
+
+        Returns:
+            list[dict]: One point per bucket, oldest first.
+        """
+        if bucket not in self.buckets:
+            raise ValueError(f"❌ Unknown bucket '{bucket}'. Use one of {list(self.buckets)}")
+        if feature != "emission" and feature not in self.features:
+            raise ValueError(f"❌ Unknown feature '{feature}'")
+
+        start = None if start is None else parse_timestamp(start)
+        end = None if end is None else parse_timestamp(end)
+
+        closed = self._closed(bucket)
+        lo = 0 if start is None else int(np.searchsorted(closed["start"], start, side="left"))
+        hi = len(closed) if end is None else int(np.searchsorted(closed["start"], end, side="left"))
+        records = closed[lo:hi]
+
+        with self._lock:
+            open_bucket = self._open[bucket]
+            if (open_bucket is not None
+                    and (start is None or open_bucket.start >= start)
+                    and (end is None or open_bucket.start < end)):
+                records = np.concatenate([records, open_bucket.record(self.dtype)])
+
+        if feature == "emission":
+            return [
+                {"start": format_timestamp(r["start"]), "count": int(r["emission_count"]),
+                 "mean": None if np.isnan(r["emission"]) else float(r["emission"])}
+                for r in records
+            ]
+
+        i = self.features.index(feature)
+        return [
+            {"start": format_timestamp(r["start"]), "count": int(r["count"]),
+             "min": float(r["min"][i]), "max": float(r["max"][i]),
+             "mean": float(r["mean"][i]), "p95": float(r["p95"][i]),
+             "emission": None if np.isnan(r["emission"]) else float(r["emission"])}
+            for r in records
+        ]
+
+
+# ✅ Shared process-wide rollups fed by the ingest loop
+rollups = Rollups()
@@ -0,0 +1,299 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.sensor_buffer import SENSOR_FEATURES
+
+DEFAULT_STATION = "default"
+EMISSION_SIGNAL = "emission"
+
+OPERATORS = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+}
+RULE_KINDS = ("consecutive", "n_of_m", "rolling_mean")
+
+# SOS: predicted emission at or over the threshold this many readings in a row
+SOS_THRESHOLD = 45
+SOS_CONSECUTIVE = 5
+
+# Regulatory limits per gas, flagged after this many readings in a row over the limit
+GOV_LIMITS = {
+    "PM2.5 (ug/m3)": 60,
+    "PM10 (ug/m3)": 100,
+    "NOx (ppb)": 40,
+    "SO2 (ug/m3)": 50,
+    "CO (mg/m3)": 4
+}
+GOV_CONSECUTIVE = 5
+
+
+def signals_from(values, emissions=None, features=SENSOR_FEATURES):
+    """
+    Build the signal mapping rules read from: one column per feature, plus
+    "emission" when predictions are given.
+
+    Args:
+        values (np.ndarray): (rows, features) sensor values.
+        emissions (np.ndarray | None): Predicted emission per row.
+        features (list[str]): Column names of `values`.
+
+    Returns:
+        dict: {signal name: 1-D array}.
+    """
+    values = np.asarray(values, dtype=np.float64).reshape(-1, len(features))
+    signals = {feature: values[:, i] for i, feature in enumerate(features)}
+    if emissions is not None:
+        signals[EMISSION_SIGNAL] = np.asarray(emissions, dtype=np.float64).reshape(-1)
+    return signals
+
+
+class Rule:
+    """
+    A limit on one signal, checked over batches of readings.
+
+    Kinds:
+    - consecutive: fires once `n` readings in a row exceed the limit. With
+      `reset`, the run restarts after firing (fires every n-th reading of a
+      run, like the SOS counter); otherwise it keeps firing while the run lasts.
+    - n_of_m: fires while at least `n` of the last `m` readings exceed the limit.
+    - rolling_mean: fires while the mean of the last `window` readings exceeds it.
+
+    State carried between batches is only the current run length and the
+    last few values, so evaluating a stream in batches gives the same result
+    as evaluating it in one go.
+    """
+
+    def __init__(self, name, signal, limit, kind="consecutive", n=1, m=None, window=None,
+                 op=">", reset=False):
+        if kind not in RULE_KINDS:
+            raise ValueError(f"❌ Unknown rule kind '{kind}'. Use one of {list(RULE_KINDS)}")
+        if op not in OPERATORS:
+            raise ValueError(f"❌ Unknown operator '{op}'. Use one of {list(OPERATORS)}")
+        if kind == "n_of_m" and (m is None or not 1 <= n <= m):
+            raise ValueError(f"❌ Rule '{name}' needs 1 <= n <= m")
+        if kind == "rolling_mean" and (window is None or window < 1):
+            raise ValueError(f"❌ Rule '{name}' needs a window of at least 1")
+        if n < 1:
+            raise ValueError(f"❌ Rule '{name}' needs n >= 1")
+        self.name = name
+        self.signal = signal
+        self.limit = float(limit)
+        self.kind = kind
+        self.n = int(n)
+        self.m = None if m is None else int(m)
+        self.window = None if window is None else int(window)
+        self.op = op
+        self.reset = bool(reset)
+
+    @classmethod
+    def from_dict(cls, spec):
+        """Build a rule from a config.yaml entry."""
+        return cls(**spec)
+
+    def to_dict(self):
+        spec = {"name": self.name, "signal": self.signal, "limit": self.limit,
+                "kind": self.kind, "n": self.n, "op": self.op}
+        if self.m is not None:
+            spec["m"] = self.m
+        if self.window is not None:
+            spec["window"] = self.window
+        if self.reset:
+            spec["reset"] = True
+        return spec
+
+    def initial_state(self):
+        return {"run": 0, "tail": np.empty(0, dtype=np.float64)}
+
+    def _windowed_sums(self, tail, batch, width):
+        # Sum over the last `width` values ending at each batch row, with the
+        # previous batch's tail in front so windows span batch boundaries
+        series = np.concatenate([tail, batch])
+        csum = np.concatenate([[0.0], np.cumsum(series)])
+        ends = len(tail) + np.arange(1, len(batch) + 1)
+        starts = np.maximum(ends - width, 0)
+        keep = width - 1
+        return csum[ends] - csum[starts], ends - starts, (series[-keep:] if keep else series[:0])
+
+    def evaluate(self, values, state):
+        """
+        Check a batch of readings.
+
+        Args:
+            values (np.ndarray): The rule's signal, oldest first.
+            state (dict): State from initial_state() or the previous batch.
+
+        Returns:
+            tuple: (fired bool array, metric array, exceeded bool array, new state).
+            The metric is the run length, the count in the window, or the
+            rolling mean, depending on the kind.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        compare = OPERATORS[self.op]
+        if len(values) == 0:
+            empty = np.zeros(0, dtype=bool)
+            return empty, np.zeros(0), empty, state
+
+        if self.kind == "rolling_mean":
+            sums, counts, tail = self._windowed_sums(state["tail"], values, self.window)
+            metric = sums / counts
+            exceeded = compare(metric, self.limit) & (counts == self.window)
+            return exceeded, metric, exceeded, {"run": 0, "tail": tail}
+
+        exceeded = compare(values, self.limit)
+        if self.kind == "n_of_m":
+            counts, _, tail = self._windowed_sums(state["tail"], exceeded.astype(np.float64), self.m)
+            fired = counts >= self.n
+            return fired, counts, exceeded, {"run": 0, "tail": tail}
+
+        # consecutive: run length = distance to the last reading that did not exceed
+        index = np.arange(len(values))
+        last_break = np.maximum.accumulate(np.where(exceeded, -1, index))
+        run = np.where(last_break >= 0, index - last_break, index + 1 + state["run"])
+        if self.reset:
+            fired = exceeded & (run % self.n == 0)
+            run = run % self.n
+        else:
+            fired = run >= self.n
+        return fired, run, exceeded, {"run": int(run[-1]), "tail": state["tail"]}
+
+
+# ✅ Built-in rules shared by the ingest loop, the dashboard and backfills
+SOS_RULE = Rule("sos", EMISSION_SIGNAL, SOS_THRESHOLD, n=SOS_CONSECUTIVE, op=">=", reset=True)
+GOV_LIMIT_RULES = [Rule(gas, gas, limit, n=GOV_CONSECUTIVE) for gas, limit in GOV_LIMITS.items()]
+
+
+class RuleEngine:
+    """
+    Evaluates a set of rules per station over batches of readings.
+
+    Stations use the default rules unless they have a rule with the same
+    name in `station_rules`, which replaces it. Each station keeps its own
+    carried state. Different stations can be evaluated from different
+    threads; the batches of any one station must be evaluated in order.
+    """
+
+    def __init__(self, rules, station_rules=None):
+        self.rules = [r if isinstance(r, Rule) else Rule.from_dict(r) for r in rules]
+        self.station_rules = {
+            station_id: [r if isinstance(r, Rule) else Rule.from_dict(r) for r in overrides]
+            for station_id, overrides in (station_rules or {}).items()
+        }
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, rules, config):
+        """
+        Combine built-in rules with the `rules` section of config.yaml.
+
+        Args:
+            rules (list[Rule | dict]): Built-in default rules.
+            config (dict): Parsed configuration; `rules.default` adds or
+                replaces default rules by name, `rules.stations` holds
+                per-station overrides.
+
+        Returns:
+            RuleEngine: The configured engine.
+        """
+        section = config.get("rules") or {}
+        defaults = {r.name: r for r in (x if isinstance(x, Rule) else Rule.from_dict(x) for x in rules)}
+        for spec in section.get("default") or []:
+            rule = Rule.from_dict(spec)
+            defaults[rule.name] = rule
+        return cls(list(defaults.values()), section.get("stations") or {})
+
+    def rules_for(self, station_id=DEFAULT_STATION):
+        """Return the rules that apply to a station."""
+        overrides = {r.name: r for r in self.station_rules.get(station_id, [])}
+        merged = [overrides.pop(r.name, r) for r in self.rules]
+        return merged + list(overrides.values())
+
+    def _station_state(self, station_id):
+        states = self._states.get(station_id)
+        if states is None:
+            with self._lock:
+                states = self._states.setdefault(
+                    station_id, {r.name: r.initial_state() for r in self.rules_for(station_id)}
+                )
+        return states
+
+    def evaluate(self, signals, station_id=DEFAULT_STATION):
+        """
+        Evaluate a station's rules over the next batch of its readings.
+
+        Args:
+            signals (dict | pd.DataFrame): Signal name -> 1-D values, oldest first.
+            station_id (str): Station the readings came from.
+
+        Returns:
+            dict: {rule name: {"signal", "fired", "value", "exceeded"}} with
+            one array entry per reading.
+        """
+        states = self._station_state(station_id)
+        results = {}
+        for rule in self.rules_for(station_id):
+            if rule.signal not in signals:
+                raise ValueError(f"❌ Rule '{rule.name}' needs missing signal '{rule.signal}'")
+            fired, value, exceeded, states[rule.name] = rule.evaluate(
+                np.asarray(signals[rule.signal]), states.get(rule.name) or rule.initial_state()
+            )
+            results[rule.name] = {"signal": rule.signal, "fired": fired, "value": value, "exceeded": exceeded}
+        return results
+
+    def replay(self, signals, station_id=DEFAULT_STATION):
+        """
+        Evaluate a station's rules over historical readings from a clean state,
+        without touching the live state.
+
+        Args:
+            signals (dict | pd.DataFrame): Signal name -> 1-D values, oldest first.
+            station_id (str): Station whose rules apply.
+
+        Returns:
+            dict: {rule name: {"signal", "fired", "value", "exceeded"}}.
+        """
+        replay_engine = RuleEngine(self.rules, self.station_rules)
+        return replay_engine.evaluate(signals, station_id)
+
+    def reset(self, station_id=None):
+        """Forget the carried state of one station, or of every station."""
+        with self._lock:
+            if station_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(station_id, None)
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.rules [--from ...] [--to ...]
+    from src.model_search import load_config
+    from src.predict import predict_emissions_batch
+    from src.sensor_store import sensor_store
+
+    parser = argparse.ArgumentParser(description="Replay the alert rules over stored readings.")
+    parser.add_argument("--from", dest="start")
+    parser.add_argument("--to", dest="end")
+    parser.add_argument("--station", default=DEFAULT_STATION, help="Station whose rule overrides apply")
+    args = parser.parse_args()
+
+    engine = RuleEngine.from_config([SOS_RULE, *GOV_LIMIT_RULES], load_config())
+    timestamps, values = sensor_store.read(args.start, args.end)
+    emissions = None
+    if any(r.signal == EMISSION_SIGNAL for r in engine.rules_for(args.station)):
+        emissions = predict_emissions_batch(np.column_stack([np.zeros(len(values)), values]))
+
+    start = time.perf_counter()
+    results = engine.replay(signals_from(values, emissions), args.station)
+    elapsed = time.perf_counter() - start
+    print(f"🔁 Replayed {len(values)} readings in {elapsed:.3f}s "
+          f"({len(values) / elapsed if elapsed else float('inf'):,.0f} rows/s)")
+    for name, result in results.items():
+        print(f"  {name}: exceeded {int(result['exceeded'].sum())}, fired {int(result['fired'].sum())}")
@@ -0,0 +1,236 @@
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+# ✅ Sensor columns in the order generate_sensor_data writes them to the raw CSV
+SENSOR_FEATURES = [
+    "PM2.5 (ug/m3)", "PM10 (ug/m3)", "NO (ug/m3)", "NO2 (ug/m3)", "NOx (ppb)",
+    "NH3 (ug/m3)", "SO2 (ug/m3)", "CO (mg/m3)", "Ozone (ug/m3)", "Benzene (ug/m3)",
+    "Toluene (ug/m3)", "Temp (degree C)", "RH (%)", "WS (m/s)", "WD (deg)",
+    "SR (W/mt2)", "BP (mmHg)", "VWS (m/s)", "Xylene (ug/m3)", "RF (mm)", "AT (degree C)"
+]
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+BUFFER_CAPACITY = 720  # One hour of readings at one every 5 seconds
+OFFSET_STEP = 900  # UTC offsets only change on quarter-hour boundaries
+
+
+def parse_timestamp(value):
+    """
+    Convert a reading timestamp into epoch seconds.
+
+    Args:
+        value (str | int | float | datetime): Timestamp to convert.
+
+    Returns:
+        int: Seconds since the epoch.
+    """
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    return int(datetime.fromisoformat(str(value)).timestamp())
+
+
+def format_timestamp(epoch):
+    """
+    Format epoch seconds the way the raw CSV stores timestamps.
+
+    Args:
+        epoch (int): Seconds since the epoch.
+
+    Returns:
+        str: Timestamp formatted as TIMESTAMP_FORMAT.
+    """
+    return datetime.fromtimestamp(int(epoch)).strftime(TIMESTAMP_FORMAT)
+
+
+def utc_offset(timestamps):
+    """
+    Local UTC offset in effect at each timestamp, so DST changes are honoured.
+
+    Arrays are converted once per distinct quarter-hour rather than per row.
+
+    Args:
+        timestamps (np.ndarray | int): Epoch seconds.
+
+    Returns:
+        np.ndarray | int: Offset in seconds to add to get local time.
+    """
+    if np.ndim(timestamps) == 0:
+        return time.localtime(int(timestamps)).tm_gmtoff
+    steps, inverse = np.unique(np.asarray(timestamps, dtype=np.int64) // OFFSET_STEP, return_inverse=True)
+    offsets = np.array([time.localtime(int(s) * OFFSET_STEP).tm_gmtoff for s in steps], dtype=np.int64)
+    return offsets[inverse].reshape(np.shape(timestamps))
+
+
+class SensorBuffer:
+    """
+    Thread-safe, fixed-capacity ring buffer of the most recent sensor readings.
+
+    Readings are stored in a preallocated (capacity, features) float64 array
+    plus an int64 timestamp array, so appends and lookups never touch disk.
+    """
+
+    def __init__(self, capacity=BUFFER_CAPACITY, features=SENSOR_FEATURES):
+        self.capacity = capacity
+        self.features = list(features)
+        self._values = np.zeros((capacity, len(self.features)), dtype=np.float64)
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._position = 0
+        self._version = 0  # Total rows ever appended; identifies the buffer contents
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def version(self):
+        """Total number of readings ever appended; changes whenever the contents do."""
+        return self._version
+
+    def _append_row(self, values, epoch):
+        self._values[self._next] = values
+        self._timestamps[self._next] = epoch
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self._version += 1
+
+    def _extend_rows(self, values, timestamps):
+        values = values[-self.capacity:]
+        timestamps = timestamps[-self.capacity:]
+        indices = (self._next + np.arange(len(values))) % self.capacity
+        self._values[indices] = values
+        self._timestamps[indices] = timestamps
+        self._next = (self._next + len(values)) % self.capacity
+        self._size = min(self._size + len(values), self.capacity)
+        self._version += len(values)
+
+    def _ordered_indices(self, n):
+        n = min(n, self._size)
+        return (self._next - n + np.arange(n)) % self.capacity
+
+    def append(self, reading):
+        """
+        Add a reading to the buffer, overwriting the oldest one when full.
+
+        Args:
+            reading (dict): Sensor values keyed by feature name, plus "Timestamp".
+        """
+        values = [float(reading.get(f, 0)) for f in self.features]
+        epoch = parse_timestamp(reading.get("Timestamp", datetime.now()))
+        with self._lock:
+            self._append_row(values, epoch)
+
+    def extend(self, values, timestamps):
+        """
+        Add many readings at once, oldest first.
+
+        Args:
+            values (np.ndarray): (rows, features) array of sensor values.
+            timestamps (np.ndarray): Epoch seconds, one per row.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.features))
+        timestamps = np.asarray(timestamps, dtype=np.int64).reshape(-1)
+        with self._lock:
+            self._extend_rows(values, timestamps)
+
+    def warm_start(self, store):
+        """
+        Fill the buffer with the last `capacity` readings of a SensorStore.
+
+        Args:
+            store (SensorStore): Store the ingest loop persists readings to.
+        """
+        with self._lock:
+            self._position = max(len(store) - self.capacity, 0)
+        self.refresh(store)
+
+    def refresh(self, store):
+        """
+        Append readings persisted by another process since the last refresh,
+        reading only the newly appended rows of the store.
+
+        Args:
+            store (SensorStore): Store the ingest loop persists readings to.
+        """
+        with self._lock:
+            timestamps, values = store.read_rows(self._position)
+            self._position += len(timestamps)
+            if len(timestamps):
+                self._extend_rows(values, timestamps)
+
+    def latest(self):
+        """
+        Return the most recent reading.
+
+        Returns:
+            dict | None: Sensor values plus "Timestamp" and "From Date", or
+            None if the buffer is empty.
+        """
+        with self._lock:
+            if self._size == 0:
+                return None
+            index = (self._next - 1) % self.capacity
+            values = self._values[index].tolist()
+            epoch = self._timestamps[index]
+
+        reading = dict(zip(self.features, values))
+        reading["Timestamp"] = format_timestamp(epoch)
+        reading["From Date"] = reading["Timestamp"][:10]
+        return reading
+
+    def tail(self, n):
+        """
+        Return the n most recent readings, oldest first.
+
+        Args:
+            n (int): Number of readings to return.
+
+        Returns:
+            pd.DataFrame: Sensor values plus "Timestamp" and "From Date" columns.
+        """
+        with self._lock:
+            indices = self._ordered_indices(n)
+            values = self._values[indices]
+            timestamps = self._timestamps[indices]
+
+        return self._frame(values, timestamps)
+
+    def since(self, version, limit=None):
+        """
+        Return the readings appended after `version`, oldest first.
+
+        Args:
+            version (int): A value previously read from `version`.
+            limit (int | None): Return at most this many of the newest rows.
+
+        Returns:
+            tuple: (pd.DataFrame like tail(), current version).
+        """
+        with self._lock:
+            n = max(self._version - version, 0)
+            if limit is not None:
+                n = min(n, limit)
+            indices = self._ordered_indices(n)
+            values = self._values[indices]
+            timestamps = self._timestamps[indices]
+            current = self._version
+        return self._frame(values, timestamps), current
+
+    def _frame(self, values, timestamps):
+        import pandas as pd  # Deferred: the ingest and /live-data paths never build frames
+
+        df = pd.DataFrame(values, columns=self.features)
+        stamps = [format_timestamp(t) for t in timestamps]
+        df["Timestamp"] = stamps
+        df["From Date"] = [stamp[:10] for stamp in stamps]
+        return df
+
+
+# ✅ Shared process-wide buffer used by the ingest loop and HTTP handlers
+sensor_buffer = SensorBuffer()
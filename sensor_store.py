@@ -0,0 +1,630 @@
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import numpy as np
+
+from src.sensor_buffer import SENSOR_FEATURES, parse_timestamp, format_timestamp
+from src.telemetry import STORE_ROWS, STORE_SECONDS, get_logger
+
+logger = get_logger(__name__)
+
+STORE_DIR = "data/store"
+SEGMENT_ROWS = 17280  # One day of readings at one every 5 seconds
+INDEX_STRIDE = 256  # One sparse index entry per 256 rows
+ARCHIVE_DIR = "archive"  # Compressed closed segments, under the store root
+ARCHIVE_CACHE = 4  # Decompressed archived segments kept in memory
+COMPACT_INTERVAL = 3600  # Seconds between background compaction runs
+
+
+def parse_csv_line(line, features=SENSOR_FEATURES):
+    """
+    Parse one raw sensor CSV line into a feature vector and timestamp.
+
+    Lines that do not match the current feature layout (headers, legacy
+    short rows, truncated writes) are rejected.
+
+    Args:
+        line (str): A single line from the raw sensor CSV.
+        features (list): Feature columns expected at the start of the line.
+
+    Returns:
+        tuple | None: (list of float values, epoch seconds) or None if invalid.
+    """
+    fields = line.strip().split(",")
+    if len(fields) < len(features) + 1:
+        return None
+    try:
+        values = [float(v) for v in fields[:len(features)]]
+        epoch = parse_timestamp(fields[len(features)])
+    except ValueError:
+        return None
+    return values, epoch
+
+
+class Segment:
+    """
+    One fixed-capacity block of the store: an int64 timestamp file, one
+    float64 file per feature and a sparse index of every INDEX_STRIDE-th
+    timestamp. Files are append-only and read through memory maps.
+    """
+
+    def __init__(self, path, number, n_features):
+        self.path = path
+        self.number = number
+        self.n_features = n_features
+        self.timestamp_path = os.path.join(path, "timestamps.i64")
+        self.index_path = os.path.join(path, "index.i64")
+        self.column_paths = [os.path.join(path, f"col_{i:02d}.f64") for i in range(n_features)]
+
+    @property
+    def rows(self):
+        """Rows fully written to every column file."""
+        paths = [self.timestamp_path] + self.column_paths
+        try:
+            return min(os.path.getsize(p) for p in paths) // 8
+        except OSError:
+            return 0
+
+    def repair(self):
+        """Drop any partially written trailing row left by an interrupted append."""
+        rows = self.rows
+        for path in [self.timestamp_path] + self.column_paths:
+            if os.path.exists(path) and os.path.getsize(path) > rows * 8:
+                os.truncate(path, rows * 8)
+        entries = (rows + INDEX_STRIDE - 1) // INDEX_STRIDE
+        if os.path.exists(self.index_path) and os.path.getsize(self.index_path) > entries * 8:
+            os.truncate(self.index_path, entries * 8)
+
+    def _map(self, path, dtype, rows):
+        if rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(rows,))
+
+    def timestamps(self, rows=None):
+        rows = self.rows if rows is None else rows
+        return self._map(self.timestamp_path, np.int64, rows)
+
+    def time_range(self, rows=None):
+        """(first, last) timestamp of the segment, or None if it is empty."""
+        timestamps = self.timestamps(rows)
+        return (int(timestamps[0]), int(timestamps[-1])) if len(timestamps) else None
+
+    def columns(self, start, stop):
+        """Return rows [start, stop) of every feature as a (rows, features) array."""
+        values = np.empty((stop - start, self.n_features), dtype=np.float64)
+        for i, path in enumerate(self.column_paths):
+            values[:, i] = self._map(path, np.float64, stop)[start:stop]
+        return values
+
+    def search(self, epoch, side="left", rows=None):
+        """
+        Locate a timestamp in this segment in O(log n) using the sparse index
+        to pick a block, then a binary search within that block.
+        """
+        rows = self.rows if rows is None else rows
+        if rows == 0:
+            return 0
+        sparse = self._map(self.index_path, np.int64, min(
+            os.path.getsize(self.index_path) // 8 if os.path.exists(self.index_path) else 0,
+            (rows + INDEX_STRIDE - 1) // INDEX_STRIDE,
+        ))
+        block = max(int(np.searchsorted(sparse, epoch, side=side)) - 1, 0)
+        lo = block * INDEX_STRIDE
+        hi = min(lo + 2 * INDEX_STRIDE, rows) if len(sparse) else rows
+        timestamps = self.timestamps(rows)
+        return lo + int(np.searchsorted(timestamps[lo:hi], epoch, side=side))
+
+
+@lru_cache(maxsize=ARCHIVE_CACHE)
+def _load_archive(path, mtime_ns):
+    # mtime_ns is part of the key so a rewritten archive is never served stale
+    with np.load(path) as archive:
+        timestamps = np.cumsum(archive["timestamp_deltas"]) + int(archive["first_timestamp"])
+        columns = [archive[name] for name in sorted(n for n in archive.files if n.startswith("col_"))]
+    return timestamps, np.column_stack(columns) if columns else np.empty((len(timestamps), 0))
+
+
+class ArchivedSegment:
+    """
+    A closed segment compacted into one compressed .npz file: delta-encoded
+    timestamps plus one array per feature. Rows and the time range come from
+    the archive index, so range reads skip archives outside the query
+    window without decompressing them. Decompressed archives are cached.
+    """
+
+    def __init__(self, path, number, meta):
+        self.path = path
+        self.number = number
+        self.rows = meta["rows"]
+        self.min_timestamp = meta["min_timestamp"]
+        self.max_timestamp = meta["max_timestamp"]
+
+    def _arrays(self):
+        return _load_archive(self.path, os.stat(self.path).st_mtime_ns)
+
+    def timestamps(self, rows=None):
+        timestamps = self._arrays()[0]
+        return timestamps if rows is None else timestamps[:rows]
+
+    def time_range(self, rows=None):
+        return (self.min_timestamp, self.max_timestamp) if self.rows else None
+
+    def columns(self, start, stop):
+        return self._arrays()[1][start:stop]
+
+    def search(self, epoch, side="left", rows=None):
+        return int(np.searchsorted(self.timestamps(rows), epoch, side=side))
+
+
+class SensorStore:
+    """
+    Append-only columnar store for sensor readings.
+
+    Readings are split into segments of SEGMENT_ROWS rows. Within a segment
+    every feature lives in its own fixed-width float64 file next to an int64
+    timestamp file, so range queries binary-search the timestamps and only
+    map the rows they return.
+    """
+
+    def __init__(self, root=STORE_DIR, features=SENSOR_FEATURES, segment_rows=SEGMENT_ROWS):
+        self.root = root
+        self.features = list(features)
+        self.segment_rows = segment_rows
+        self._lock = threading.Lock()
+        self._handles = None
+        self._active = None
+        self._last_epoch = None
+        self._index_cache = (None, {})
+
+    # ----- Layout -------------------------------------------------------
+
+    def _segment(self, number):
+        path = os.path.join(self.root, f"seg_{number:06d}")
+        return Segment(path, number, len(self.features))
+
+    def _archive_index(self):
+        # Re-read only when the compactor (possibly in another process) rewrote it
+        path = os.path.join(self.root, ARCHIVE_DIR, "index.json")
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if self._index_cache[0] != mtime:
+            with open(path) as f:
+                self._index_cache = (mtime, {int(number): meta for number, meta in json.load(f).items()})
+        return self._index_cache[1]
+
+    def _write_archive_index(self, index):
+        path = os.path.join(self.root, ARCHIVE_DIR, "index.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({str(number): meta for number, meta in sorted(index.items())}, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def segments(self):
+        """
+        Return every segment on disk, oldest first: archived segments plus
+        the uncompressed ones. A segment that has been archived but whose
+        directory was not removed yet is served from the archive.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        archived = {
+            number: ArchivedSegment(os.path.join(self.root, ARCHIVE_DIR, f"seg_{number:06d}.npz"), number, meta)
+            for number, meta in self._archive_index().items()
+        }
+        live = {
+            int(name[4:]): self._segment(int(name[4:])) for name in os.listdir(self.root)
+            if name.startswith("seg_") and name[4:].isdigit()
+        }
+        live.update(archived)
+        return [live[n] for n in sorted(live)]
+
+    def _check_columns(self):
+        columns_path = os.path.join(self.root, "columns.json")
+        if os.path.exists(columns_path):
+            with open(columns_path) as f:
+                stored = json.load(f)
+            if stored != self.features:
+                raise ValueError(f"❌ Store at {self.root} holds different columns: {stored}")
+        else:
+            os.makedirs(self.root, exist_ok=True)
+            with open(columns_path, "w") as f:
+                json.dump(self.features, f)
+
+    def __len__(self):
+        segments = self.segments()
+        if not segments:
+            return 0
+        return segments[-1].number * self.segment_rows + segments[-1].rows
+
+    # ----- Writes -------------------------------------------------------
+
+    def _open_active(self):
+        if self._handles is not None and self._active.rows < self.segment_rows:
+            return
+        self.close()
+        self._check_columns()
+        segments = self.segments()
+        if segments and segments[-1].rows < self.segment_rows and isinstance(segments[-1], Segment):
+            segment = segments[-1]
+            segment.repair()
+        else:
+            segment = self._segment(segments[-1].number + 1 if segments else 0)
+            os.makedirs(segment.path, exist_ok=True)
+        if self._last_epoch is None and segments and segments[-1].rows:
+            self._last_epoch = int(segments[-1].timestamps()[-1])
+        self._active = segment
+        self._handles = [open(p, "ab") for p in segment.column_paths]
+        self._handles.append(open(segment.index_path, "ab"))
+        self._handles.append(open(segment.timestamp_path, "ab"))
+
+    def _write_block(self, values, timestamps):
+        *column_handles, index_handle, timestamp_handle = self._handles
+        start = self._active.rows
+        for i, handle in enumerate(column_handles):
+            handle.write(np.ascontiguousarray(values[:, i]).tobytes())
+            handle.flush()
+        # Sparse index entries for every INDEX_STRIDE-th row in this block
+        first = (-start) % INDEX_STRIDE
+        index_handle.write(timestamps[first::INDEX_STRIDE].tobytes())
+        index_handle.flush()
+        # Timestamps go last so readers never see a partially written row
+        timestamp_handle.write(timestamps.tobytes())
+        timestamp_handle.flush()
+
+    def extend(self, values, timestamps):
+        """
+        Append many readings at once.
+
+        Timestamps must be non-decreasing; earlier ones are clamped to the last
+        stored timestamp so every segment stays sorted for binary search, and
+        a warning reports how many were.
+
+        Args:
+            values (np.ndarray): (rows, features) array of sensor values.
+            timestamps (np.ndarray): Epoch seconds, one per row.
+
+        Returns:
+            int: Number of timestamps that were clamped.
+        """
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.features))
+        timestamps = np.array(timestamps, dtype=np.int64).reshape(-1)
+        if len(values) != len(timestamps):
+            raise ValueError("❌ values and timestamps must have the same length")
+        if len(values) == 0:
+            return 0
+
+        started = time.perf_counter()
+        with self._lock:
+            self._open_active()
+            received = timestamps
+            if self._last_epoch is not None:
+                timestamps = np.maximum(timestamps, self._last_epoch)
+            timestamps = np.maximum.accumulate(timestamps)
+            clamped = int(np.count_nonzero(timestamps != received))
+
+            offset = 0
+            while offset < len(values):
+                self._open_active()
+                room = self.segment_rows - self._active.rows
+                block = slice(offset, offset + room)
+                self._write_block(values[block], timestamps[block])
+                offset += room
+            self._last_epoch = int(timestamps[-1])
+        STORE_SECONDS.observe(time.perf_counter() - started, op="write")
+        STORE_ROWS.inc(len(values), op="write")
+        if clamped:
+            logger.warning("⚠️ Clamped %s out-of-order timestamps in %s to the last stored one", clamped, self.root)
+        return clamped
+
+    def append(self, reading):
+        """
+        Append a single reading.
+
+        Args:
+            reading (dict): Sensor values keyed by feature name, plus "Timestamp".
+        """
+        values = [[float(reading.get(f, 0)) for f in self.features]]
+        epoch = parse_timestamp(reading.get("Timestamp", datetime.now()))
+        self.extend(values, [epoch])
+
+    def close(self):
+        """Close the file handles of the active segment."""
+        for handle in self._handles or []:
+            handle.close()
+        self._handles = None
+        self._active = None
+
+    # ----- Reads --------------------------------------------------------
+
+    def _empty(self):
+        return np.empty(0, dtype=np.int64), np.empty((0, len(self.features)), dtype=np.float64)
+
+    def _concat(self, parts, started=None):
+        timestamps, values = self._empty() if not parts else (
+            np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+        )
+        if started is not None:
+            STORE_SECONDS.observe(time.perf_counter() - started, op="read")
+            STORE_ROWS.inc(len(timestamps), op="read")
+        return timestamps, values
+
+    def read(self, start=None, end=None):
+        """
+        Read every reading with start <= timestamp < end.
+
+        Args:
+            start (str | datetime | int | None): Inclusive lower bound.
+            end (str | datetime | int | None): Exclusive upper bound.
+
+        Returns:
+            tuple: (int64 epoch timestamps, (rows, features) float64 values).
+        """
+        started = time.perf_counter()
+        start = None if start is None else parse_timestamp(start)
+        end = None if end is None else parse_timestamp(end)
+
+        parts = []
+        for segment in self.segments():
+            rows = segment.rows
+            time_range = segment.time_range(rows) if rows else None
+            # Skip whole segments outside the window; archived ones are never decompressed
+            if time_range is None or (start is not None and time_range[1] < start) \
+                    or (end is not None and time_range[0] >= end):
+                continue
+            first = 0 if start is None else segment.search(start, "left", rows)
+            last = rows if end is None else segment.search(end, "left", rows)
+            if last > first:
+                parts.append((np.array(segment.timestamps(rows)[first:last]), segment.columns(first, last)))
+        return self._concat(parts, started)
+
+    def read_rows(self, start_row, end_row=None):
+        """
+        Read readings by their global append position.
+
+        Args:
+            start_row (int): First row to return.
+            end_row (int | None): Row to stop before; defaults to the end.
+
+        Returns:
+            tuple: (int64 epoch timestamps, (rows, features) float64 values).
+        """
+        started = time.perf_counter()
+        parts = []
+        for segment in self.segments():
+            rows = segment.rows
+            base = segment.number * self.segment_rows
+            first = max(start_row - base, 0)
+            last = rows if end_row is None else min(end_row - base, rows)
+            if last > first:
+                parts.append((np.array(segment.timestamps(rows)[first:last]), segment.columns(first, last)))
+        return self._concat(parts, started)
+
+    def last(self, seconds):
+        """
+        Read the readings from the final `seconds` of the store.
+
+        Args:
+            seconds (int | float): Width of the trailing window.
+        """
+        segments = [s for s in self.segments() if s.rows]
+        if not segments:
+            return self._empty()
+        latest = int(segments[-1].timestamps()[-1])
+        return self.read(latest - int(seconds), None)
+
+    def to_frame(self, timestamps, values):
+        """Wrap read() output in a DataFrame with "Timestamp" and "From Date" columns."""
+        import pandas as pd
+
+        df = pd.DataFrame(values, columns=self.features)
+        stamps = [format_timestamp(t) for t in timestamps]
+        df["Timestamp"] = stamps
+        df["From Date"] = [stamp[:10] for stamp in stamps]
+        return df
+
+    def query(self, start=None, end=None):
+        """
+        Read a time range as a DataFrame, e.g. query("2025-04-05 18:00", "2025-04-05 19:00").
+        """
+        return self.to_frame(*self.read(start, end))
+
+    # ----- Retention ----------------------------------------------------
+
+    def _archive_segment(self, segment, index):
+        rows = segment.rows
+        timestamps = np.array(segment.timestamps(rows))
+        path = os.path.join(self.root, ARCHIVE_DIR, f"seg_{segment.number:06d}.npz")
+        tmp_path = f"{path[:-4]}.tmp.npz"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        values = segment.columns(0, rows)
+        columns = {f"col_{i:02d}": values[:, i] for i in range(len(self.features))}
+        np.savez_compressed(
+            tmp_path, first_timestamp=timestamps[0],
+            timestamp_deltas=np.diff(timestamps, prepend=timestamps[0]), **columns
+        )
+        os.replace(tmp_path, path)
+        index[segment.number] = {
+            "rows": rows,
+            "min_timestamp": int(timestamps[0]),
+            "max_timestamp": int(timestamps[-1]),
+            "bytes": os.path.getsize(path),
+        }
+        # Publish the archive before removing the segment, so readers always find the rows
+        self._write_archive_index(index)
+        shutil.rmtree(segment.path)
+        return rows
+
+    def compact(self, keep_days=None, archive=True, now=None):
+        """
+        Apply the retention policy: delete segments whose newest reading is
+        older than `keep_days` and archive the remaining closed segments as
+        compressed column files.
+
+        Only full segments before the active one are touched and the newest
+        segment is never deleted, so appends and global row positions are
+        unaffected.
+
+        Args:
+            keep_days (float | None): Age after which segments are deleted;
+                None keeps everything.
+            archive (bool): Compress closed segments.
+            now (int | None): Current epoch seconds (defaults to the clock).
+
+        Returns:
+            dict: Segments archived and deleted, and bytes before and after.
+        """
+        segments = [s for s in self.segments() if s.rows]
+        cutoff = None if keep_days is None else (now or time.time()) - keep_days * 86400
+        index = dict(self._archive_index())
+        summary = {"archived": 0, "deleted": 0, "archived_rows": 0, "deleted_rows": 0,
+                   "bytes_before": 0, "bytes_after": 0}
+
+        for segment in segments[:-1]:
+            if cutoff is not None and segment.time_range()[1] < cutoff:
+                summary["deleted"] += 1
+                summary["deleted_rows"] += segment.rows
+                if isinstance(segment, ArchivedSegment):
+                    index.pop(segment.number)
+                    self._write_archive_index(index)
+                    os.remove(segment.path)
+                else:
+                    shutil.rmtree(segment.path)
+            elif archive and isinstance(segment, Segment) and segment.rows >= self.segment_rows:
+                size = sum(os.path.getsize(p) for p in [segment.timestamp_path, segment.index_path]
+                           + segment.column_paths if os.path.exists(p))
+                summary["archived_rows"] += self._archive_segment(segment, index)
+                summary["archived"] += 1
+                summary["bytes_before"] += size
+                summary["bytes_after"] += index[segment.number]["bytes"]
+        return summary
+
+
+class Compactor:
+    """
+    Background thread that applies the `retention` section of config.yaml to
+    one or more stores every `interval` seconds.
+
+    `stores` is a callable returning the stores to compact, so station stores
+    created after startup are picked up.
+    """
+
+    def __init__(self, stores, policy=None, interval=COMPACT_INTERVAL):
+        policy = policy or {}
+        self.stores = stores
+        self.keep_days = policy.get("keep_days")
+        self.archive = policy.get("compact", True)
+        self.interval = policy.get("interval_minutes", interval / 60) * 60
+        self.last_result = None
+        self._thread = None
+
+    def start(self):
+        """Start the compaction thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("❌ Compaction error: %s", e)
+            time.sleep(self.interval)
+
+    def run_once(self):
+        """
+        Compact every store now.
+
+        Returns:
+            dict: {store root: compact() summary}.
+        """
+        results = {}
+        for store in self.stores():
+            result = store.compact(self.keep_days, self.archive)
+            if result["archived"] or result["deleted"]:
+                logger.info("🗜️ %s: archived %s segments (%s -> %s bytes), deleted %s",
+                            store.root, result["archived"], result["bytes_before"],
+                            result["bytes_after"], result["deleted"])
+            results[store.root] = result
+        self.last_result = results
+        return results
+
+
+def import_csv(csv_path, store, chunk_rows=50000):
+    """
+    One-shot import of the legacy raw sensor CSV into a SensorStore.
+
+    Rows that do not match the current feature layout (e.g. legacy
+    6-column rows) are skipped, and rows are sorted by timestamp before they
+    are written. Rows older than the last one already stored are clamped to
+    its timestamp. Both are counted and logged.
+
+    Args:
+        csv_path (str): Path of the raw sensor CSV.
+        store (SensorStore): Destination store.
+        chunk_rows (int): Rows parsed per write.
+
+    Returns:
+        dict: {"imported", "skipped", "clamped"} row counts.
+    """
+    values, timestamps = [], []
+    skipped = 0
+    with open(csv_path, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            parsed = parse_csv_line(line, store.features)
+            if parsed:
+                values.append(parsed[0])
+                timestamps.append(parsed[1])
+            elif line.strip():
+                skipped += 1
+
+    clamped = 0
+    if values:
+        values = np.array(values, dtype=np.float64)
+        timestamps = np.array(timestamps, dtype=np.int64)
+        order = np.argsort(timestamps, kind="stable")
+        for i in range(0, len(order), chunk_rows):
+            block = order[i:i + chunk_rows]
+            clamped += store.extend(values[block], timestamps[block])
+    if skipped:
+        logger.warning("⚠️ Skipped %s rows of %s that do not match the current feature layout", skipped, csv_path)
+    return {"imported": len(values), "skipped": skipped, "clamped": clamped}
+
+
+# ✅ Shared process-wide store used by the ingest loop and HTTP handlers
+sensor_store = SensorStore()
+
+
+if __name__ == "__main__":
+    # Usage: python -m src.sensor_store import [csv_path]
+    #        python -m src.sensor_store query START END
+    #        python -m src.sensor_store last MINUTES
+    #        python -m src.sensor_store compact [KEEP_DAYS]
+    command = sys.argv[1] if len(sys.argv) > 1 else "import"
+    if command == "import":
+        csv_path = sys.argv[2] if len(sys.argv) > 2 else "data/raw/sensor_data.csv"
+        result = import_csv(csv_path, sensor_store)
+        sensor_store.close()
+        print(f"✅ Imported {result['imported']} rows from {csv_path} into {sensor_store.root} "
+              f"({result['skipped']} skipped, {result['clamped']} clamped)")
+    elif command == "query":
+        print(sensor_store.query(sys.argv[2], sys.argv[3]))
+    elif command == "last":
+        print(sensor_store.to_frame(*sensor_store.last(timedelta(minutes=float(sys.argv[2])).total_seconds())))
+    elif command == "compact":
+        from src.model_search import load_config
+        policy = load_config().get("retention") or {}
+        keep_days = float(sys.argv[2]) if len(sys.argv) > 2 else policy.get("keep_days")
+        result = sensor_store.compact(keep_days, policy.get("compact", True))
+        print(f"🗜️ Archived {result['archived']} segments ({result['bytes_before']} -> "
+              f"{result['bytes_after']} bytes), deleted {result['deleted']}")
+    else:
+        print(f"❌ Unknown command: {command}")
@@ -0,0 +1,334 @@
+import json
+import os
+import queue
+import re
+import threading
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from src.sensor_buffer import SENSOR_FEATURES, SensorBuffer, parse_timestamp
+from src.rules import DEFAULT_STATION, signals_from
+from src.sensor_store import SensorStore
+from src.telemetry import INGEST_ROWS, INGEST_SECONDS, get_logger
+
+logger = get_logger(__name__)
+
+STATIONS_DIR = "data/stations"
+INGEST_WORKERS = 8
+MAX_PENDING_BATCHES = 1000  # Per worker; further batches are rejected until it catches up
+# At least one letter or digit, so "." and ".." cannot name a directory outside STATIONS_DIR
+STATION_ID_PATTERN = re.compile(r"^(?=.*[A-Za-z0-9])[A-Za-z0-9_.-]{1,64}$")
+
+
+def valid_station_id(station_id):
+    """
+    Whether a remote station may use this id.
+
+    DEFAULT_STATION is reserved for the local stream, whose rule, anomaly
+    and forecast state and /live-data cache are keyed by it.
+
+    Args:
+        station_id (str): Id sent by the station.
+
+    Returns:
+        bool: True if the id is safe as a directory name and not reserved.
+    """
+    return bool(STATION_ID_PATTERN.match(station_id)) and station_id != DEFAULT_STATION
+
+
+def readings_to_arrays(readings, features=SENSOR_FEATURES):
+    """
+    Convert reading dicts into the (values, timestamps) arrays the store takes.
+
+    Missing features default to 0, as in the simulated ingest loop; readings
+    without a "Timestamp" are stamped with the current time.
+
+    Args:
+        readings (list[dict]): Sensor values keyed by feature name.
+        features (list[str]): Column order.
+
+    Returns:
+        tuple: ((rows, features) float64 array, (rows,) int64 epoch seconds).
+    """
+    now = datetime.now()
+    try:
+        values = np.array(
+            [[float(r.get(f) or 0) for f in features] for r in readings], dtype=np.float64
+        ).reshape(-1, len(features))
+        timestamps = np.array([parse_timestamp(r.get("Timestamp", now)) for r in readings], dtype=np.int64)
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"❌ Invalid reading: {e}")
+    return values, timestamps
+
+
+def parse_ingest_body(body, content_type="", default_station=None):
+    """
+    Group the readings of an ingest request by station.
+
+    Accepted bodies:
+    - NDJSON (one reading object per line)
+    - a JSON list of reading objects
+    - a JSON object {"station_id": ..., "readings": [...]}
+    - a single JSON reading object
+
+    Each reading names its station with "station_id"; readings without one
+    fall back to the batch's station_id, then to `default_station`.
+
+    Args:
+        body (bytes | str): Raw request body.
+        content_type (str): Request Content-Type.
+        default_station (str | None): Station for readings that name none.
+
+    Returns:
+        dict: {station_id: [reading dicts]}.
+    """
+    text = body.decode("utf-8") if isinstance(body, bytes) else body
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        try:
+            readings = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            raise ValueError(f"❌ Invalid NDJSON: {e}")
+    else:
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"❌ Invalid JSON: {e}")
+        if isinstance(payload, dict) and "readings" in payload:
+            default_station = payload.get("station_id", default_station)
+            readings = payload["readings"]
+        elif isinstance(payload, dict):
+            readings = [payload]
+        else:
+            readings = payload
+    if not isinstance(readings, list) or not all(isinstance(r, dict) for r in readings):
+        raise ValueError("❌ Readings must be JSON objects")
+
+    batches = {}
+    for reading in readings:
+        station_id = str(reading.get("station_id") or default_station or "")
+        if not valid_station_id(station_id):
+            raise ValueError(f"❌ Invalid, reserved or missing station_id: '{station_id}'")
+        batches.setdefault(station_id, []).append(reading)
+    return batches
+
+
+class StationShard:
+    """
+    State of one station: its own store directory and ring buffer; its rule
+    and anomaly baselines and forecast features live in the shared
+    RuleEngine, AnomalyDetector and Forecaster under its station id.
+
+    A shard is only ever written by the one ingest worker its station hashes
+    to, so its batches are applied in order without a shared lock.
+    """
+
+    def __init__(self, station_id, root=STATIONS_DIR, rule_engine=None, anomaly_detector=None,
+                 forecaster=None):
+        self.station_id = station_id
+        self.store = SensorStore(os.path.join(root, station_id))
+        self.buffer = SensorBuffer()
+        self.buffer.warm_start(self.store)
+        self.rule_engine = rule_engine
+        self.anomaly_detector = anomaly_detector
+        if anomaly_detector is not None:
+            anomaly_detector.warm_start(self.store, station_id)
+        self.forecaster = forecaster
+        if forecaster is not None:
+            forecaster.warm_start(self.store, station_id)
+        self.rows_ingested = 0
+        self.alerts_raised = 0
+        self.last_emission = None
+
+    def process(self, values, timestamps, predict=None, on_alert=None):
+        """
+        Persist a batch, check it for sensor anomalies, update its forecast
+        features, score it in one call and evaluate the station's rules.
+
+        Args:
+            values (np.ndarray): (rows, features) sensor values.
+            timestamps (np.ndarray): Epoch seconds, one per row.
+            predict (callable | None): Batched predictor.
+            on_alert (callable | None): Called as on_alert(station_id, rule name,
+                signal value) at most once per rule per batch, for the last
+                reading that fired it.
+        """
+        self.store.extend(values, timestamps)
+        if self.anomaly_detector is not None:
+            self.anomaly_detector.evaluate(values, self.station_id)
+        if self.forecaster is not None:
+            self.forecaster.update(values, timestamps, self.station_id)
+        # Last, since it bumps the version /live-data caches the state above under
+        self.buffer.extend(values, timestamps)
+        self.rows_ingested += len(values)
+        if predict is None:
+            return
+
+        features = np.column_stack([np.zeros(len(values)), values])  # "From Date" placeholder
+        emissions = np.asarray(predict(features), dtype=np.float64)
+        self.last_emission = float(emissions[-1])
+        if self.rule_engine is None:
+            return
+        signals = signals_from(values, emissions)
+        for name, result in self.rule_engine.evaluate(signals, self.station_id).items():
+            fired = np.flatnonzero(result["fired"])
+            if len(fired):
+                self.alerts_raised += 1
+                if on_alert is not None:
+                    on_alert(self.station_id, name, float(signals[result["signal"]][fired[-1]]))
+
+    def summary(self):
+        latest = self.buffer.latest()
+        return {
+            "station_id": self.station_id,
+            "rows_ingested": self.rows_ingested,
+            "stored_rows": len(self.store),
+            "last_timestamp": latest["Timestamp"] if latest else None,
+            "last_emission": None if self.last_emission is None else round(self.last_emission, 2),
+            "alerts_raised": self.alerts_raised,
+            "sensor_health": (None if self.anomaly_detector is None
+                              else self.anomaly_detector.latest(self.station_id)),
+        }
+
+
+class IngestRouter:
+    """
+    Routes ingest batches to station shards processed by a worker pool.
+
+    Each station hashes to one worker queue, so batches from one station are
+    applied in order while different stations are written, scored and
+    checked in parallel. Shards are created lazily by their worker. submit()
+    only parses and enqueues, so request threads never wait on disk or the
+    model; a full queue raises queue.Full so callers can push back, and
+    submit_batches() reports which stations of a request were not queued.
+    """
+
+    def __init__(self, root=STATIONS_DIR, workers=INGEST_WORKERS, predict=None, on_alert=None,
+                 rule_engine=None, max_pending=MAX_PENDING_BATCHES, anomaly_detector=None,
+                 forecaster=None):
+        self.root = root
+        self.predict = predict
+        self.on_alert = on_alert
+        self.rule_engine = rule_engine
+        self.anomaly_detector = anomaly_detector
+        self.forecaster = forecaster
+        self._queues = [queue.Queue(maxsize=max_pending) for _ in range(workers)]
+        self._shards = {}
+        self._shards_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Start the worker pool (idempotent)."""
+        with self._shards_lock:
+            if self._threads:
+                return
+            for index in range(len(self._queues)):
+                thread = threading.Thread(target=self._run, args=(index,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker_index(self, station_id):
+        return zlib.crc32(station_id.encode("utf-8")) % len(self._queues)
+
+    def submit(self, station_id, readings):
+        """
+        Queue readings for a station.
+
+        Args:
+            station_id (str): Station the readings belong to.
+            readings (list[dict]): Sensor readings.
+
+        Returns:
+            int: Number of readings accepted.
+        """
+        if not valid_station_id(station_id):
+            raise ValueError(f"❌ Invalid or reserved station_id: '{station_id}'")
+        values, timestamps = readings_to_arrays(readings)
+        if len(values):
+            self._queues[self._worker_index(station_id)].put_nowait((station_id, values, timestamps))
+        return len(values)
+
+    def submit_batches(self, batches):
+        """
+        Queue the readings of several stations, e.g. one ingest request.
+
+        Every batch is validated before any is queued, so an invalid reading
+        rejects the whole request. A station whose worker queue is full is
+        rejected on its own; the others are still queued, so clients retry
+        only the rejected stations.
+
+        Args:
+            batches (dict): {station_id: [reading dicts]}.
+
+        Returns:
+            tuple: ({station_id: rows accepted}, {station_id: rows rejected}).
+        """
+        arrays = {}
+        for station_id, readings in batches.items():
+            if not valid_station_id(station_id):
+                raise ValueError(f"❌ Invalid or reserved station_id: '{station_id}'")
+            arrays[station_id] = readings_to_arrays(readings)
+
+        accepted, rejected = {}, {}
+        for station_id, (values, timestamps) in arrays.items():
+            if not len(values):
+                continue
+            try:
+                self._queues[self._worker_index(station_id)].put_nowait((station_id, values, timestamps))
+                accepted[station_id] = len(values)
+            except queue.Full:
+                rejected[station_id] = len(values)
+        return accepted, rejected
+
+    def shard(self, station_id):
+        """Return the shard of a station, or None if it has not ingested yet."""
+        if not valid_station_id(station_id):
+            return None
+        shard = self._shards.get(station_id)
+        if shard is None and os.path.isdir(os.path.join(self.root, station_id)):
+            shard = self._create(station_id)
+        return shard
+
+    def _create(self, station_id):
+        with self._shards_lock:
+            shard = self._shards.get(station_id)
+            if shard is None:
+                shard = StationShard(station_id, self.root, self.rule_engine, self.anomaly_detector,
+                                     self.forecaster)
+                self._shards[station_id] = shard
+            return shard
+
+    def stations(self):
+        """Summaries of every station seen since startup, sorted by id."""
+        station_ids = sorted(self._shards)
+        summaries = [self._shards[s].summary() for s in station_ids]
+        if self.forecaster is not None:
+            # Every station's forecast comes from one batched model call
+            forecasts = self.forecaster.forecast(station_ids)
+            for summary in summaries:
+                summary["forecast"] = forecasts.get(summary["station_id"])
+        return summaries
+
+    def pending(self):
+        """Batches waiting across all worker queues."""
+        return sum(q.qsize() for q in self._queues)
+
+    def join(self):
+        """Block until every queued batch has been processed."""
+        for q in self._queues:
+            q.join()
+
+    def _run(self, index):
+        batches = self._queues[index]
+        while True:
+            station_id, values, timestamps = batches.get()
+            try:
+                shard = self._shards.get(station_id) or self._create(station_id)
+                with INGEST_SECONDS.time(source="stations"):
+                    shard.process(values, timestamps, self.predict, self.on_alert)
+                INGEST_ROWS.inc(len(values), source="stations")
+            except Exception as e:
+                logger.error("❌ Ingest error for station %s: %s", station_id, e)
+            finally:
+                batches.task_done()
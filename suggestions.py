@@ -0,0 +1,178 @@
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.telemetry import OUTBOUND_ERRORS, OUTBOUND_SECONDS, get_logger
+
+logger = get_logger(__name__)
+
+# The endpoint can be pointed at the local stub below for testing
+SUGGESTION_API_URL = os.getenv(
+    "SUGGESTION_API_URL",
+    "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.1"
+)
+SUGGESTION_TIMEOUT = 30
+BUCKET_SIZE = 5  # Emission levels within the same 5-unit band share a suggestion
+CACHE_SIZE = 64
+CACHE_TTL = 600  # Seconds a generated suggestion is reused
+ERROR_TTL = 60  # Seconds a failed lookup is reused before retrying
+QUEUE_SIZE = 16
+
+SUGGESTION_PENDING = "pending"
+SUGGESTION_READY = "ready"
+
+
+def fetch_suggestion(emission_value, threshold, url=None):
+    """
+    Ask the remote language model for an emission-reduction suggestion.
+
+    Args:
+        emission_value (float): Predicted carbon emission.
+        threshold (float): Threshold the emission exceeded.
+        url (str | None): Inference endpoint; defaults to SUGGESTION_API_URL.
+
+    Returns:
+        tuple: (suggestion text, True if the call succeeded).
+    """
+    prompt = (
+        f"The predicted carbon emission is {emission_value:.2f}, which exceeds the threshold of {threshold}. "
+        "Suggest a practical strategy for reducing emissions specifically in the tyre manufacturing industry."
+    )
+
+    try:
+        import requests  # Deferred: only needed once a suggestion is requested
+
+        with OUTBOUND_SECONDS.time(target="suggestion"):
+            response = requests.post(
+                url or SUGGESTION_API_URL,
+                json={"inputs": prompt},
+                timeout=SUGGESTION_TIMEOUT
+            )
+
+        if response.status_code == 200:
+            result = response.json()
+            if isinstance(result, list):
+                return result[0]["generated_text"].split(prompt)[-1].strip(), True
+            return result.get("generated_text", "No suggestion found."), True
+        else:
+            OUTBOUND_ERRORS.inc(target="suggestion")
+            logger.warning("🛑 Hugging Face API error: %s %s", response.status_code, response.text)
+            return "No suggestion available at the moment.", False
+
+    except Exception as e:
+        OUTBOUND_ERRORS.inc(target="suggestion")
+        logger.error("❌ Suggestion fetch error: %s", e)
+        return "No suggestion available due to an error.", False
+
+
+class SuggestionService:
+    """
+    Generates suggestions on a background worker so request handlers never
+    wait on the remote model.
+
+    Results are kept in an LRU cache with a TTL, keyed on the emission level
+    rounded down to BUCKET_SIZE. Lookups that miss enqueue a job on a bounded
+    queue and return immediately.
+    """
+
+    def __init__(self, threshold, fetch=fetch_suggestion, cache_size=CACHE_SIZE,
+                 ttl=CACHE_TTL, error_ttl=ERROR_TTL, queue_size=QUEUE_SIZE):
+        self.threshold = threshold
+        self.fetch = fetch
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._cache = OrderedDict()
+        self._pending = set()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _key(self, emission_value):
+        return int(emission_value // BUCKET_SIZE) * BUCKET_SIZE
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            key, emission_value = self._queue.get()
+            try:
+                text, ok = self.fetch(emission_value, self.threshold)
+            except Exception as e:
+                logger.error("❌ Suggestion worker error: %s", e)
+                text, ok = "No suggestion available due to an error.", False
+            with self._lock:
+                ttl = self.ttl if ok else self.error_ttl
+                self._cache[key] = (text, time.monotonic() + ttl)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                self._pending.discard(key)
+            self._queue.task_done()
+
+    def get(self, emission_value):
+        """
+        Return a cached suggestion for this emission level, scheduling one if needed.
+
+        Args:
+            emission_value (float): Predicted carbon emission.
+
+        Returns:
+            tuple: (suggestion text or None, SUGGESTION_READY or SUGGESTION_PENDING).
+        """
+        key = self._key(emission_value)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[1] > time.monotonic():
+                self._cache.move_to_end(key)
+                return entry[0], SUGGESTION_READY
+            if key not in self._pending:
+                try:
+                    self._queue.put_nowait((key, emission_value))
+                    self._pending.add(key)
+                except queue.Full:
+                    pass  # Retried on a later poll once the worker catches up
+            self._start_worker()
+        return None, SUGGESTION_PENDING
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        prompt = json.loads(body or b"{}").get("inputs", "")
+        payload = json.dumps([{
+            "generated_text": prompt + " Switch curing presses to waste-heat recovery and schedule them off-peak."
+        }]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_stub_server(port=8765):
+    """
+    Serve a local stand-in for the inference endpoint. Point the app at it with
+    SUGGESTION_API_URL=http://127.0.0.1:<port>/.
+
+    Args:
+        port (int): Port to listen on.
+    """
+    print(f"🧪 Suggestion stub listening on http://127.0.0.1:{port}/")
+    HTTPServer(("127.0.0.1", port), _StubHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    run_stub_server(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
@@ -0,0 +1,382 @@
+import bisect
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+from contextlib import contextmanager
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_RATE_LIMIT = 5  # Records per message per LOG_RATE_WINDOW before suppressing
+LOG_RATE_WINDOW = 60  # Seconds
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROFILE_INTERVAL = 0.005  # Seconds between profiler samples
+PROFILE_MAX_DEPTH = 64
+PROFILER_ENV = "ENABLE_PROFILER"  # Set to 1 to add the /profile route
+PROFILER_TOKEN_ENV = "PROFILER_TOKEN"  # If set, /profile requires "Authorization: Bearer <token>"
+
+
+# ----- Logging --------------------------------------------------------------
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let through at most `limit` records per message template per `window`
+    seconds. The first record after a window with suppressed records notes
+    how many were dropped.
+    """
+
+    def __init__(self, limit=LOG_RATE_LIMIT, window=LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._seen.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+            count += 1
+            if count > self.limit:
+                self._seen[key] = (started, count, suppressed + 1)
+                return False
+            self._seen[key] = (started, count, 0)
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+_log_setup_lock = threading.Lock()
+
+
+def get_logger(name):
+    """
+    Logger under the shared "carbon" namespace, leveled by LOG_LEVEL and
+    rate limited per message template.
+
+    Pass values as logging arguments (logger.info("x=%s", x)) rather than
+    pre-formatting, so repeated messages share a template and are limited.
+
+    Args:
+        name (str): Module name, e.g. __name__.
+
+    Returns:
+        logging.Logger: The configured logger.
+    """
+    root = logging.getLogger("carbon")
+    with _log_setup_lock:
+        if not root.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+            handler.addFilter(RateLimitFilter())
+            root.addHandler(handler)
+            root.setLevel(LOG_LEVEL)
+            root.propagate = False
+    return root.getChild(name.rsplit(".", 1)[-1])
+
+
+# ----- Metrics --------------------------------------------------------------
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter, one series per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that can go up and down, or is read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, callback=None):
+        super().__init__(name, help_text)
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def samples(self):
+        if self.callback is not None:
+            try:
+                return [(self.name, (), float(self.callback()))]
+            except Exception:
+                return []
+        return super().samples()
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, one series per label set. observe() is a
+    bisect plus three increments under a lock.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of the with-block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        samples = []
+        for key, (counts, total, count) in series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                samples.append((f"{self.name}_bucket", key + (("le", le),), cumulative))
+            samples.append((f"{self.name}_sum", key, total))
+            samples.append((f"{self.name}_count", key, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Process-wide collection of metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"❌ Metric '{name}' is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name, help_text, callback=None):
+        return self._get(Gauge, name, help_text, callback=callback)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# ✅ Shared process-wide registry and the metrics used across modules
+metrics = MetricsRegistry()
+
+INGEST_SECONDS = metrics.histogram("ingest_seconds", "Time to persist, score and publish one ingest batch.")
+INGEST_ROWS = metrics.counter("ingest_rows_total", "Readings ingested.")
+PREDICT_SECONDS = metrics.histogram("predict_seconds", "Model inference time per call.")
+PREDICT_ROWS = metrics.counter("predict_rows_total", "Rows scored by the model.")
+STORE_SECONDS = metrics.histogram("store_io_seconds", "Sensor store read and write time per call.")
+STORE_ROWS = metrics.counter("store_rows_total", "Rows read from or written to the sensor store.")
+OUTBOUND_SECONDS = metrics.histogram("outbound_seconds", "Outbound call time (suggestion API, SMS provider).")
+OUTBOUND_ERRORS = metrics.counter("outbound_errors_total", "Failed outbound calls.")
+HTTP_SECONDS = metrics.histogram("http_request_seconds", "HTTP request handling time.")
+STAGE_SECONDS = metrics.histogram("request_stage_seconds", "Time spent in each stage of a request.")
+SENSOR_ANOMALIES = metrics.counter("sensor_anomalies_total", "Sensor readings flagged by the anomaly detector.")
+
+
+# ----- Sampling profiler ----------------------------------------------------
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples every thread's stack on a timer.
+
+    It costs nothing while stopped and one stack walk per thread per sample
+    while running, so it can be switched on in production for a while and
+    dumped as collapsed stacks (one "frame;frame;frame count" line per
+    stack, the input format of flame graph tools).
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._stacks = _StackCounter()
+        self._samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start sampling (idempotent)."""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop sampling; collected stacks are kept until reset()."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+                    code = frame.f_code
+                    names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(names)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self._samples += 1
+
+    def collapsed(self, limit=None):
+        """
+        Collected stacks, most frequent first.
+
+        Args:
+            limit (int | None): Return only the most frequent stacks.
+
+        Returns:
+            str: Collapsed stack lines.
+        """
+        with self._lock:
+            stacks = self._stacks.most_common(limit)
+        return "\n".join(f"{stack} {count}" for stack, count in stacks) + "\n"
+
+    def status(self):
+        with self._lock:
+            return {"running": self.running, "samples": self._samples,
+                    "stacks": len(self._stacks), "interval": self.interval}
+
+
+profiler = SamplingProfiler()
+
+
+def instrument_flask(app):
+    """
+    Time every request of a Flask app and add the observability routes:
+
+    - GET /metrics: Prometheus metrics
+    - GET /profile: collapsed stacks (?limit=N)
+    - POST /profile?action=start|stop|reset: toggle the sampling profiler
+
+    /profile exposes code paths and controls a process-wide profiler, so it
+    is only added when ENABLE_PROFILER=1, and requires PROFILER_TOKEN as a
+    bearer token when that is set.
+
+    Args:
+        app (Flask): Application to instrument.
+    """
+    from flask import Response, g, jsonify, request
+
+    @app.before_request
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        started = g.pop("request_started", None)
+        if started is not None:
+            HTTP_SECONDS.observe(time.perf_counter() - started,
+                                 endpoint=request.endpoint or "unknown", status=response.status_code)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    if os.getenv(PROFILER_ENV) != "1":
+        return
+    token = os.getenv(PROFILER_TOKEN_ENV)
+
+    @app.route("/profile", methods=["GET", "POST"])
+    def sampling_profile():
+        if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+            return jsonify({"status": "error", "message": "Unauthorized"}), 401
+        if request.method == "GET":
+            return Response(profiler.collapsed(request.args.get("limit", type=int)), mimetype="text/plain")
+        action = request.args.get("action", "start")
+        if action == "start":
+            profiler.start()
+        elif action == "stop":
+            profiler.stop()
+        elif action == "reset":
+            profiler.reset()
+        else:
+            return jsonify({"status": "error", "message": f"Unknown action '{action}'"}), 400
+        return jsonify({"status": "success", **profiler.status()})
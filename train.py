@@ -1,70 +1,137 @@
 import pandas as pd
 import numpy as np
 import os
-from sklearn.ensemble import RandomForestRegressor
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import r2_score
 import joblib
+from src.flat_forest import FLAT_MODEL_PATH, save_flat_forest
+from src.model_search import load_config, build_model, run_search, print_report
+from src.data_loader import DATA_PATH, CHUNK_ROWS, make_target, train_out_of_core
+from src.forecast import FORECAST_FLAT_PATH, FORECAST_MODEL_PATH, forecast_training_set
+from src.sensor_store import STORE_DIR, SensorStore
+
+# 📌 Training mode: `python src/train.py --search` (or search.enabled in config.yaml),
+# `python src/train.py --stream` for out-of-core training (or training.stream),
+# or `python src/train.py --forecast` for the 5/15/60-minute forecast model
+config = load_config()
+training_config = config.get("training") or {}
+forecast_mode = "--forecast" in sys.argv
+stream_mode = not forecast_mode and ("--stream" in sys.argv or bool(training_config.get("stream")))
+search_mode = not stream_mode and not forecast_mode and (
+    "--search" in sys.argv or bool((config.get("search") or {}).get("enabled"))
+)
 
 # 📌 Load preprocessed dataset
-data_path = "data/processed/emissions_data.csv"
-
-try:
-    df = pd.read_csv(data_path)
-    print(f"✅ Successfully loaded dataset from: {data_path}")
-except FileNotFoundError:
-    print(f"❌ ERROR: File not found at {data_path}. Ensure preprocessing is complete.")
-    exit()
-
-# ✅ Trim column names (remove extra spaces)
-df.columns = df.columns.str.strip()
-
-# ✅ Display dataset info
-print(f"📊 Dataset Shape: {df.shape}")
-print(f"🔍 Columns in dataset: {df.columns.tolist()}")
-
-# ✅ Ensure numeric data types
-df = df.apply(pd.to_numeric, errors='coerce')
-
-# ✅ Handle missing values (forward & backward fill)
-df.fillna(method="ffill", inplace=True)
-df.fillna(method="bfill", inplace=True)
-
-# ✅ Ensure 'target' column exists
-if "target" not in df.columns:
-    print("⚠️ WARNING: 'target' column not found! Attempting to auto-generate...")
-    # Auto-generate target as sum of major gas emissions
-    gas_columns = ["NO2 (ug/m3)", "CO (mg/m3)", "SO2 (ug/m3)", "PM10 (ug/m3)"]
-    missing_gases = [col for col in gas_columns if col not in df.columns]
-
-    if missing_gases:
-        print(f"❌ ERROR: Cannot generate 'target'. Missing columns: {missing_gases}")
+data_path = DATA_PATH
+
+if forecast_mode:
+    # ✅ Lag, rolling-mean and slope features of the stored 5-second readings, computed
+    # offline exactly as the serving pipeline computes them, with targets 5/15/60 minutes ahead
+    store = SensorStore(STORE_DIR)
+    X, y = forecast_training_set(store)
+    if X.empty:
+        print(f"❌ ERROR: No readings with known future targets in {store.root}. "
+              f"Run the app or `python -m src.sensor_store import` first.")
         exit()
-    
-    df["target"] = df[gas_columns].sum(axis=1)
-    print("✅ 'target' column generated successfully!")
+    print(f"📊 Forecast dataset: {X.shape[0]} rows, {X.shape[1]} features, horizons {y.columns.tolist()}")
+
+    # 📌 Hold out the most recent 20%; a shuffled split would leak the future through the lags
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+
+    # ✅ One multi-output model predicts every horizon in a single call
+    model = build_model(config)
+    model.fit(X_train, y_train)
+elif stream_mode:
+    # ✅ Stream float32 chunks and grow a warm-start forest one chunk at a time
+    if not os.path.exists(data_path):
+        print(f"❌ ERROR: File not found at {data_path}. Ensure preprocessing is complete.")
+        exit()
+    chunk_rows = int(training_config.get("chunk_rows", CHUNK_ROWS))
+    n_estimators = int((config.get("model") or {}).get("n_estimators", 100))
+    print(f"📦 Streaming {data_path} in chunks of {chunk_rows} rows")
+    model, X_test, y_test = train_out_of_core(build_model(config), data_path, chunk_rows, n_estimators)
+else:
+    try:
+        df = pd.read_csv(data_path)
+        print(f"✅ Successfully loaded dataset from: {data_path}")
+    except FileNotFoundError:
+        print(f"❌ ERROR: File not found at {data_path}. Ensure preprocessing is complete.")
+        exit()
+
+    # ✅ Trim column names (remove extra spaces)
+    df.columns = df.columns.str.strip()
 
-# 📌 Define Features (X) and Target (y)
-X = df.drop(columns=["target"])
-y = df["target"]
+    # ✅ Display dataset info
+    print(f"📊 Dataset Shape: {df.shape}")
+    print(f"🔍 Columns in dataset: {df.columns.tolist()}")
 
-# 📌 Split into training and test sets (80% train, 20% test)
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # ✅ Ensure numeric data types
+    df = df.apply(pd.to_numeric, errors='coerce')
 
-# ✅ Train the model
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+    # ✅ Handle missing values (forward & backward fill)
+    df.ffill(inplace=True)
+    df.bfill(inplace=True)
+
+    # ✅ Ensure 'target' column exists
+    if "target" not in df.columns:
+        print("⚠️ WARNING: 'target' column not found! Attempting to auto-generate...")
+        # Auto-generate target as sum of major gas emissions
+        try:
+            df["target"] = make_target(df)
+        except ValueError as e:
+            print(f"❌ ERROR: {e}")
+            exit()
+        print("✅ 'target' column generated successfully!")
+
+    # 📌 Define Features (X) and Target (y)
+    X = df.drop(columns=["target"])
+    y = df["target"]
+
+    if search_mode:
+        # 📌 Hold out the most recent 20% so validation never sees the past through the future
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+
+        # ✅ Parallel search over config.yaml's search space with time-ordered CV folds
+        model, report = run_search(X_train, y_train, config)
+        print_report(report)
+    else:
+        # 📌 Split into training and test sets (80% train, 20% test)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+        # ✅ Train the model described by config.yaml
+        model = build_model(config)
+        model.fit(X_train, y_train)
 
 # 📌 Evaluate model performance
 y_pred = model.predict(X_test)
 r2 = r2_score(y_test, y_pred)
 
 print(f"✅ Model Training Complete! R² Score: {r2:.4f}")
+if forecast_mode:
+    for i, horizon in enumerate(y_test.columns):
+        print(f"   ⏱️ {horizon} ahead: R² {r2_score(y_test.iloc[:, i], y_pred[:, i]):.4f}")
 
 # 📌 Save the trained model
 model_dir = "models"
 os.makedirs(model_dir, exist_ok=True)
-model_path = os.path.join(model_dir, "emissions_model.pkl")
-joblib.dump(model, model_path)
+model_path = FORECAST_MODEL_PATH if forecast_mode else os.path.join(model_dir, "emissions_model.pkl")
+flat_path = FORECAST_FLAT_PATH if forecast_mode else FLAT_MODEL_PATH
+tmp_path = f"{model_path}.tmp"
+joblib.dump(model, tmp_path)
+os.replace(tmp_path, model_path)  # Atomic swap so serving processes never read a partial file
 
 print(f"✅ Model saved at: {model_path}")
+
+# 📌 Export the flat NumPy form used for low-latency serving
+save_flat_forest(model, flat_path)
+print(f"✅ Flat model exported at: {flat_path}")
+
+if search_mode:
+    report["holdout_r2"] = r2
+    report_path = os.path.join(model_dir, "search_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"📊 Search report saved at: {report_path}")